@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+程序配置与延迟导入。
+
+配置来源 (后者覆盖前者):
+  1. 内置默认值 (DEFAULT_*)
+  2. 配置文件: 环境变量 HALCON_TOOL_CONFIG 指定，否则为程序目录下的 halcon_config.json
+  3. 环境变量: HALCONROOT / HALCON_DOTNET / TEMPLATE_ENGINE_DLL / TEMPLATE_ENGINE / TEMPLATE_ENGINE_ADDRESS /
+              TEMPLATE_CACHE / TEMPLATE_CACHE_MB / HALCON_PROFILE / HALCON_PROFILE_TRACE /
+              TEMPLATE_SIMPLIFY / TEMPLATE_SIMPLIFY_METHOD
+
+导入本模块没有副作用：不修改 PATH，不检查 DLL，不加载重量级模块。
+"""
+import os
+import sys
+import json
+import types
+import importlib.util
+
+DEFAULT_HALCON_ROOT = r"C:\Program Files\MVTec\HALCON-24.11-Progress-Steady"
+DEFAULT_HALCON_DOTNET = DEFAULT_HALCON_ROOT + r"\bin\dotnet35\halcondotnetxl.dll"
+DEFAULT_ENGINE_DLL = r"C:\Users\USERA\source\repos\TemplateEngineProj\TemplateEngineProj\bin\Debug\TemplateEngineProj.dll"
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "halcon_config.json")
+DEFAULT_TEMPLATE_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "template_cache")
+
+# 配置键 -> 覆盖它的环境变量
+_ENV_KEYS = {
+    "halcon_root": "HALCONROOT",
+    "halcon_dotnet": "HALCON_DOTNET",
+    "engine_dll": "TEMPLATE_ENGINE_DLL",
+    "engine": "TEMPLATE_ENGINE",
+    "service_address": "TEMPLATE_ENGINE_ADDRESS",
+    "template_cache": "TEMPLATE_CACHE",
+    "template_cache_mb": "TEMPLATE_CACHE_MB",
+    "profile": "HALCON_PROFILE",
+    "profile_trace": "HALCON_PROFILE_TRACE",
+    "simplify_tolerance": "TEMPLATE_SIMPLIFY",
+    "simplify_method": "TEMPLATE_SIMPLIFY_METHOD",
+}
+
+
+class AppConfig:
+    """
+    engine 取值:
+      auto   —— 常驻服务可用时使用服务，否则在本进程加载 .NET 引擎
+      remote —— 只使用常驻服务
+      dotnet —— 只在本进程加载 .NET 引擎
+      opencv —— OpenCV 替代引擎 (无 HALCON 的开发环境)
+    template_cache 为模板结果缓存目录 (空字符串表示不缓存)，template_cache_mb 为缓存容量上限。
+    profile 为真时开启性能计时 (profiling.py)；profile_trace 不为空时退出程序时把计时写到该文件。
+    simplify_tolerance > 0 时生成模板前按该容差 (像素) 简化多边形，simplify_method 为 vw (默认) / dp
+    (polygon_simplify.py)。
+    """
+
+    def __init__(self, halcon_root=DEFAULT_HALCON_ROOT, halcon_dotnet=DEFAULT_HALCON_DOTNET,
+                 engine_dll=DEFAULT_ENGINE_DLL, engine="auto", service_address=None,
+                 template_cache=DEFAULT_TEMPLATE_CACHE, template_cache_mb=2048,
+                 profile=False, profile_trace=None, simplify_tolerance=0.0, simplify_method="vw"):
+        self.halcon_root = halcon_root
+        self.halcon_dotnet = halcon_dotnet
+        self.engine_dll = engine_dll
+        self.engine = engine
+        self.service_address = service_address
+        self.template_cache = template_cache
+        self.template_cache_mb = float(template_cache_mb)
+        # 环境变量的值为字符串: 1 / true / yes / on 表示开启
+        self.profile = str(profile).lower() in ("1", "true", "yes", "on")
+        self.profile_trace = profile_trace
+        self.simplify_tolerance = float(simplify_tolerance)
+        self.simplify_method = simplify_method
+
+    def missing_dlls(self):
+        """返回不存在的 DLL 列表 [(说明, 路径), ...]"""
+        dlls = [("HALCON DLL", self.halcon_dotnet), ("自定义引擎DLL", self.engine_dll)]
+        return [(name, path) for name, path in dlls if not os.path.exists(path)]
+
+
+def load_config(path=None):
+    """读取配置文件与环境变量；文件不存在时使用默认值"""
+    path = path or os.environ.get("HALCON_TOOL_CONFIG") or CONFIG_FILE
+    values = {}
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            values.update(json.load(f))
+    for key, env in _ENV_KEYS.items():
+        if os.environ.get(env):
+            values[key] = os.environ[env]
+    # 只指定了 HALCON 根目录时，由它推导 .NET DLL 路径
+    if "halcon_root" in values and "halcon_dotnet" not in values:
+        values["halcon_dotnet"] = os.path.join(values["halcon_root"], "bin", "dotnet35", "halcondotnetxl.dll")
+    unknown = set(values) - set(_ENV_KEYS)
+    if unknown:
+        raise ValueError(f"配置文件中有未知的键: {', '.join(sorted(unknown))}")
+    return AppConfig(**values)
+
+
+class _MissingModule(types.ModuleType):
+    """未安装的模块：访问任何属性时才报错，使不依赖它的功能仍可使用"""
+
+    def __getattr__(self, attr):
+        raise ImportError(f"找不到模块 {self.__name__}，请先安装")
+
+
+def lazy_import(name):
+    """
+    返回延迟加载的模块：首次访问属性时才真正执行导入。
+    模块已导入时直接返回已有模块。
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        return _MissingModule(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
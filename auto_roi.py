@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+区域自动提议：由图像内容生成候选的多边形与圆形区域，操作员确认或调整后使用。
+
+检测在缩小的金字塔层 (最长边不超过 MAX_SIDE，缩小倍数为 2 的幂) 上进行:
+  - Otsu 阈值分割 (前景取与图像边框相反的一类)，开闭运算去噪后提取轮廓；
+    外轮廓经 approxPolyDP 简化为模板多边形，较大的孔洞作为排除多边形
+  - Hough 圆检测；与某个圆吻合的近圆形轮廓只保留圆
+再回到原始分辨率细化:
+  - 多边形顶点用 EdgeSnapper 吸附到附近的边缘 / 角点 (亚像素)
+  - 圆用圆周附近的 Canny 边缘点做最小二乘拟合
+结果为 GeometryStore.to_list 格式的列表，可直接逐项加入区域存储。
+只接受 CreateTemplate 固定参数的引擎 (.NET) 用 fixed_limits 限制各类区域的数量。
+"""
+import math
+
+from app_config import lazy_import
+from contour_snap import EdgeSnapper
+from geometry import POLYGON, CIRCLE, INCLUDE, EXCLUDE
+from template_engine import DEFAULT_RADIUS
+
+# 延迟导入：首次使用时才加载 OpenCV / NumPy
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+
+# 检测所用金字塔层的最长边上限
+MAX_SIDE = 1024
+# 候选轮廓的最小面积 (占图像面积的比例)
+MIN_AREA = 0.002
+# 多边形简化容差 (原图像素)；检测层上至少为 EPSILON_MIN 像素，以去掉轮廓的阶梯
+EPSILON = 2.0
+EPSILON_MIN = 1.5
+# 孔洞面积超过所在轮廓面积的该比例时提议为排除区域
+HOLE_AREA = 0.05
+MAX_POLYGONS = 6
+# CreateTemplate 只能表达两个排除多边形
+MAX_HOLES = 2
+MAX_CIRCLES = 4
+# CreateTemplate 固定参数能表达的区域数：一个模板多边形、一个圆、两个排除多边形
+FIXED_LIMITS = {"max_polygons": 1, "max_holes": MAX_HOLES, "max_circles": 1}
+# 圆心距离与半径差都小于半径的该比例时认为轮廓与圆吻合
+CIRCLE_MATCH = 0.15
+# 轮廓的圆度 (4πA / P²) 超过该值时才与圆比较
+CIRCULARITY = 0.8
+
+
+def _gray(img):
+    return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+
+
+def detection_level(gray, max_side=MAX_SIDE):
+    """(缩小后的图像, 缩小倍数 s)；缩小层像素 i 的中心对应原图坐标 i * s + (s - 1) / 2"""
+    s = 1
+    while max(gray.shape) > max_side * s:
+        s *= 2
+    if s == 1:
+        return gray, 1
+    h, w = gray.shape
+    return cv2.resize(gray, (w // s, h // s), interpolation=cv2.INTER_AREA), s
+
+
+def _to_full(pts, s):
+    return np.asarray(pts, np.float64).reshape(-1, 2) * s + (s - 1) / 2
+
+
+def foreground(small):
+    """Otsu 二值化，前景 (255) 为与图像边框像素多数相反的一类"""
+    blur = cv2.GaussianBlur(small, (5, 5), 0)
+    _, binary = cv2.threshold(blur, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    border = np.concatenate([binary[0], binary[-1], binary[:, 0], binary[:, -1]])
+    if np.count_nonzero(border) * 2 > len(border):
+        binary = cv2.bitwise_not(binary)
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+    binary = cv2.morphologyEx(binary, cv2.MORPH_OPEN, kernel)
+    return cv2.morphologyEx(binary, cv2.MORPH_CLOSE, kernel), blur
+
+
+def fixed_limits(geometry):
+    """已有区域之外，CreateTemplate 固定参数还能容纳的各类区域数 (propose 的参数)"""
+    used = {"max_polygons": len(geometry.indices(POLYGON, INCLUDE)),
+            "max_holes": len(geometry.indices(POLYGON, EXCLUDE)),
+            "max_circles": len(geometry.indices(CIRCLE))}
+    return {key: max(0, limit - used[key]) for key, limit in FIXED_LIMITS.items()}
+
+
+def find_contours(binary, min_area):
+    """
+    [(外轮廓, 面积, [(孔洞轮廓, 面积), ...])]：外轮廓与各自的孔洞都按面积从大到小，
+    只保留面积超过外轮廓 HOLE_AREA 的孔洞；坐标为检测层坐标
+    """
+    contours, hierarchy = cv2.findContours(binary, cv2.RETR_CCOMP, cv2.CHAIN_APPROX_SIMPLE)
+    if hierarchy is None:
+        return []
+    parents = hierarchy[0][:, 3]
+    areas = np.array([cv2.contourArea(c) for c in contours])
+    order = np.argsort(-areas).tolist()
+    return [(contours[i], areas[i], [(contours[j], areas[j]) for j in order
+                                     if parents[j] == i and areas[j] >= HOLE_AREA * areas[i]])
+            for i in order if parents[i] < 0 and areas[i] >= min_area]
+
+
+def find_circles(blur, max_circles):
+    """Hough 圆检测，返回检测层坐标的 [(cx, cy, r)]"""
+    h, w = blur.shape
+    side = min(h, w)
+    found = cv2.HoughCircles(blur, cv2.HOUGH_GRADIENT, dp=1.2, minDist=max(8, side / 8),
+                             param1=120, param2=40, minRadius=max(4, side // 64), maxRadius=side // 2)
+    if found is None:
+        return []
+    return [tuple(c) for c in found[0, :max_circles].tolist()]
+
+
+def _matches_circle(contour, area, circles):
+    perimeter = cv2.arcLength(contour, True)
+    if perimeter <= 0 or 4 * math.pi * area / perimeter ** 2 < CIRCULARITY:
+        return False
+    (x, y), r = cv2.minEnclosingCircle(contour)
+    return any(math.hypot(x - cx, y - cy) < CIRCLE_MATCH * cr and abs(r - cr) < CIRCLE_MATCH * cr
+               for cx, cy, cr in circles)
+
+
+def refine_circle(gray, cx, cy, r, band):
+    """在原图上用圆周 ±band 内的边缘点做代数最小二乘拟合；点数不足或结果偏离过远时返回原值"""
+    h, w = gray.shape
+    x0, y0 = max(0, int(cx - r - band)), max(0, int(cy - r - band))
+    x1, y1 = min(w, int(cx + r + band) + 1), min(h, int(cy + r + band) + 1)
+    if x1 - x0 < 3 or y1 - y0 < 3:
+        return cx, cy, r
+    edges = cv2.Canny(np.ascontiguousarray(gray[y0:y1, x0:x1]), 50, 150, L2gradient=True)
+    ys, xs = np.nonzero(edges)
+    xs, ys = xs + float(x0), ys + float(y0)
+    ring = np.abs(np.hypot(xs - cx, ys - cy) - r) < band
+    if np.count_nonzero(ring) < 12:
+        return cx, cy, r
+    xs, ys = xs[ring], ys[ring]
+    a = np.stack([xs, ys, np.ones_like(xs)], axis=1)
+    (p, q, c), *_ = np.linalg.lstsq(a, xs * xs + ys * ys, rcond=None)
+    fx, fy = p / 2, q / 2
+    fr = math.sqrt(max(0.0, c + fx * fx + fy * fy))
+    if math.hypot(fx - cx, fy - cy) > band or abs(fr - r) > band:
+        return cx, cy, r
+    return fx, fy, fr
+
+
+def _snap_polygon(pts, snapper, radius):
+    """逐顶点吸附到原图边缘，去掉吸附后 (首尾相接地) 重合的顶点"""
+    out = pts.copy()
+    for i, (x, y) in enumerate(pts.tolist()):
+        snapped = snapper.snap(x, y, radius)
+        if snapped is not None:
+            out[i] = snapped
+    step = np.hypot(*(out - np.roll(out, 1, axis=0)).T)
+    return out[step >= 0.5] if np.count_nonzero(step >= 0.5) >= 3 else out
+
+
+def propose(image, snapper=None, max_side=MAX_SIDE, epsilon=EPSILON, min_area=MIN_AREA,
+            max_polygons=MAX_POLYGONS, max_holes=MAX_HOLES, max_circles=MAX_CIRCLES, circles=True):
+    """
+    由图像生成区域提议 (GeometryStore.to_list 格式，按模板多边形、排除多边形、圆的顺序)。
+    snapper 为该图像的 EdgeSnapper (复用已缓存的瓦片)，None 时新建。
+    与某个圆吻合的轮廓先被去掉，再取面积最大的 max_polygons 个，孔洞只取自这些轮廓。
+    """
+    gray = _gray(image)
+    small, s = detection_level(gray, max_side)
+    binary, blur = foreground(small)
+    found = find_circles(blur, max_circles) if circles and max_circles > 0 else []
+    outer = [(c, h) for c, a, h in find_contours(binary, min_area * small.size)
+             if not _matches_circle(c, a, found)][:max_polygons]
+    holes = sorted((hole for _, h in outer for hole in h), key=lambda hole: -hole[1])[:max_holes]
+
+    if snapper is None or snapper.image is not image:
+        snapper = EdgeSnapper(image)
+    tolerance = max(EPSILON_MIN, epsilon / s)
+    radius = 1.5 * s + 1
+    items = []
+    for role, contour in [("include", c) for c, _ in outer] + [("exclude", c) for c, _ in holes]:
+        approx = cv2.approxPolyDP(contour, tolerance, True)
+        if len(approx) < 3:
+            continue
+        pts = _snap_polygon(_to_full(approx, s), snapper, radius)
+        items.append({"type": "polygon", "role": role, "points": pts.tolist()})
+    for cx, cy, r in found:
+        (cx, cy), r = _to_full([cx, cy], s)[0], r * s
+        cx, cy, r = refine_circle(gray, cx, cy, r, 1.5 * s + 1)
+        items.append({"type": "circle", "role": "include", "center": [float(cx), float(cy)],
+                      "radius": [min(DEFAULT_RADIUS[0], float(r)), float(r)]})
+    return items
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+"""
+无界面批量模板生成。
+
+清单格式 (JSON 或 JSONL):
+    {
+      "defaults": {"circle": {"row": 172, "col": 197, "radius_min": 1.0, "radius_max": 10.0}},
+      "items": [
+        {"image": "a.png", "output": "out/a", "polygon": [[10, 10], [200, 10], [200, 150]]},
+        ...
+      ]
+    }
+条目也可以用 regions 给出多个区域 (模板/排除多边形与圆):
+    {"image": "b.png", "output": "out/b", "regions": [
+        {"type": "polygon", "role": "include", "points": [[10, 10], [200, 10], [200, 150]]},
+        {"type": "polygon", "role": "exclude", "points": [[50, 50], [80, 50], [80, 80]]},
+        {"type": "circle", "role": "include", "center": [197, 172], "radius": [1.0, 10.0]}]}
+也可以直接是条目列表。相对路径以清单所在目录为基准。
+
+用法:
+    python batch_templates.py manifest.json --engine opencv --workers 4 --report report.json
+
+--engine remote 时不启动进程池，而是把清单分批提交给常驻引擎服务 (engine_service.py)。
+--cache DIR 启用模板结果缓存 (template_cache.py)，图像、区域与参数相同的条目直接复制缓存的文件；
+remote 模式下由服务端的 --cache 负责缓存。
+--verify DIR 在生成后用样本图像验证每个模板 (template_verify.py)，匹配率或耗时不达标的条目记为失败。
+--simplify PX 在调用引擎前按该容差简化多边形 (polygon_simplify.py)，结果中记录简化前后的顶点数。
+引擎、DLL 路径、服务地址与简化参数的默认值取自 halcon_config.json 与环境变量 (app_config.py)，
+命令行参数优先。
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from multiprocessing import AuthenticationError
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from app_config import load_config
+from template_engine import TemplateRequest, create_engine
+from template_cache import TemplateCache, CachedTemplateEngine
+from template_verify import TemplateMatcher, verify, sample_paths
+
+# 每个工作进程各自持有一个已加载的引擎实例
+_worker_engine = None
+# 验证参数 {"samples", "min_score", "max_ms", "min_rate"}，None 表示不验证
+_worker_verify = None
+# 多边形简化参数 (容差, 方法)，None 表示不简化
+_worker_simplify = None
+
+
+def load_manifest(path):
+    """读取清单，返回 (条目列表, 清单目录)；defaults 合并到每个条目"""
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.lower().endswith('.jsonl'):
+            data = [json.loads(line) for line in f if line.strip()]
+        else:
+            data = json.load(f)
+
+    defaults = {}
+    if isinstance(data, dict):
+        defaults = data.get("defaults", {})
+        data = data["items"]
+    items = [{**defaults, **item} for item in data]
+    return items, os.path.dirname(os.path.abspath(path))
+
+
+def _init_worker(engine_name, engine_kwargs, cache_dir=None, cache_bytes=None, verify_args=None, simplify=None):
+    global _worker_engine, _worker_verify, _worker_simplify
+    _worker_verify = verify_args
+    _worker_simplify = simplify
+    _worker_engine = create_engine(engine_name, **engine_kwargs)
+    if cache_dir:
+        _worker_engine = CachedTemplateEngine(_worker_engine, TemplateCache(cache_dir, cache_bytes))
+
+
+def _request(item, base_dir, simplify, result):
+    """由条目构造请求；需要简化时把简化前后的顶点数记入 result"""
+    request = TemplateRequest.from_dict(item, base_dir)
+    if simplify:
+        result["vertices"] = list(request.simplify(*simplify))
+    return request
+
+
+def _run_item(index, item, base_dir):
+    """在工作进程中执行单个条目，异常转为失败结果而不是中断整个批次"""
+    start = time.perf_counter()
+    result = {"index": index, "image": item.get("image"), "output": item.get("output")}
+    try:
+        request = _request(item, base_dir, _worker_simplify, result)
+        result["artifacts"] = _worker_engine.create_template(request)
+        result["ok"] = True
+        result["cached"] = getattr(_worker_engine, "last_hit", False)
+        if _worker_verify:
+            report = verify(TemplateMatcher.from_request(request), **_worker_verify)
+            result["verify"] = report["summary"]
+            if not report["summary"]["passed"]:
+                result["ok"] = False
+                result["error"] = "验证未通过: " + "；".join(report["summary"]["reasons"])
+    except Exception as e:
+        result["ok"] = False
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def _run_remote(items, base_dir, engine_kwargs, on_result, batch_size, simplify=None):
+    """把清单分批发送给常驻引擎服务"""
+    engine = create_engine("remote", **engine_kwargs)
+    results = []
+    for first in range(0, len(items), batch_size):
+        batch = []
+        for i, item in enumerate(items[first:first + batch_size], first):
+            result = {"index": i, "image": item.get("image"), "output": item.get("output")}
+            try:
+                batch.append((result, _request(item, base_dir, simplify, result)))
+            except (KeyError, ValueError, TypeError) as e:
+                result.update(ok=False, error=f"{type(e).__name__}: {e}", seconds=0.0)
+                results.append(result)
+                if on_result:
+                    on_result(result)
+        try:
+            replies = engine.create_templates([req for _, req in batch]) if batch else []
+        except (OSError, EOFError, AuthenticationError, RuntimeError) as e:
+            # 服务不可用或连接中断：本批条目记为失败，下一批重新连接
+            error = f"引擎服务: {type(e).__name__}: {e}"
+            replies = [{"ok": False, "error": error, "seconds": 0.0} for _ in batch]
+        for (result, _), reply in zip(batch, replies):
+            reply.pop("output", None)
+            result.update(reply)
+            results.append(result)
+            if on_result:
+                on_result(result)
+    return results
+
+
+def run_batch(items, base_dir="", engine="auto", workers=None, engine_kwargs=None, on_result=None,
+              batch_size=16, cache_dir=None, cache_bytes=2 * 1024 * 1024 * 1024, verify_args=None, simplify=None):
+    """
+    在进程池中批量生成模板，返回按清单顺序排列的结果列表。
+    workers=0 表示在当前进程内顺序执行 (便于调试)；
+    engine="remote" 时按 batch_size 分批提交给常驻引擎服务。
+    cache_dir 不为空时各工作进程共用该目录下的模板结果缓存 (remote 模式不使用)。
+    verify_args 为 template_verify.verify 的参数 (paths 等)，给出时生成后立即验证 (remote 模式不使用)。
+    simplify 为 (容差, 方法)，给出时在调用引擎前简化多边形 (TemplateRequest.simplify)。
+    """
+    engine_kwargs = engine_kwargs or {}
+    results = []
+    if engine == "remote":
+        results = _run_remote(items, base_dir, engine_kwargs, on_result, batch_size, simplify)
+    elif workers == 0:
+        _init_worker(engine, engine_kwargs, cache_dir, cache_bytes, verify_args, simplify)
+        for i, item in enumerate(items):
+            results.append(_run_item(i, item, base_dir))
+            if on_result:
+                on_result(results[-1])
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(engine, engine_kwargs, cache_dir, cache_bytes, verify_args, simplify)) as pool:
+            futures = [pool.submit(_run_item, i, item, base_dir) for i, item in enumerate(items)]
+            for future in as_completed(futures):
+                results.append(future.result())
+                if on_result:
+                    on_result(results[-1])
+    results.sort(key=lambda r: r["index"])
+    return results
+
+
+def summarize(results, wall_seconds):
+    """汇总成功/失败数量与耗时统计"""
+    times = sorted(r["seconds"] for r in results)
+    ok = sum(1 for r in results if r["ok"])
+    return {
+        "total": len(results),
+        "ok": ok,
+        "failed": len(results) - ok,
+        "cache_hits": sum(1 for r in results if r.get("cached")),
+        "wall_seconds": wall_seconds,
+        "item_seconds_mean": sum(times) / len(times) if times else 0.0,
+        "item_seconds_max": times[-1] if times else 0.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="批量生成 HALCON 模板")
+    parser.add_argument("manifest", help="清单文件 (.json / .jsonl)")
+    parser.add_argument("--engine", help="引擎: auto / dotnet / opencv / remote / module:Class (默认取自配置)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="工作进程数，默认 CPU 核数；0 表示当前进程顺序执行")
+    parser.add_argument("--report", help="把逐条结果与汇总写入 JSON 文件")
+    parser.add_argument("--cache", help="模板结果缓存目录 (默认不缓存)")
+    parser.add_argument("--cache-mb", type=float, help="缓存容量上限 (MB，默认取自配置)")
+    parser.add_argument("--verify", help="验证用的样本图像文件夹 (默认不验证)")
+    parser.add_argument("--min-score", type=float, default=0.7, help="验证得分阈值")
+    parser.add_argument("--min-rate", type=float, default=1.0, help="验证要求的匹配率 (0~1)")
+    parser.add_argument("--max-ms", type=float, help="验证匹配耗时 p95 上限 (毫秒)")
+    parser.add_argument("--simplify", type=float, help="多边形简化容差 (像素，默认取自配置，0 表示不简化)")
+    parser.add_argument("--simplify-method", choices=("dp", "vw"),
+                        help="简化方法: vw (Visvalingam，默认取自配置) / dp (Douglas-Peucker)")
+    parser.add_argument("--address", help="常驻引擎服务地址 (remote，默认取自配置)")
+    args = parser.parse_args(argv)
+
+    try:
+        cfg = load_config()
+    except (OSError, ValueError) as e:
+        parser.error(f"读取配置失败: {e}")
+    engine = args.engine or cfg.engine
+    cache_mb = cfg.template_cache_mb if args.cache_mb is None else args.cache_mb
+    tolerance = cfg.simplify_tolerance if args.simplify is None else args.simplify
+    method = args.simplify_method or cfg.simplify_method
+    engine_kwargs = {"config": cfg}
+    if args.address and engine == "remote":
+        engine_kwargs["address"] = args.address
+
+    items, base_dir = load_manifest(args.manifest)
+    verify_args = None
+    if args.verify:
+        verify_args = {"paths": sample_paths(args.verify), "min_score": args.min_score,
+                       "max_ms": args.max_ms, "min_rate": args.min_rate}
+
+    def on_result(r):
+        status = ("HIT " if r.get("cached") else "OK  ") if r["ok"] else "FAIL"
+        line = f"[{status}] #{r['index']:<4} {r['seconds'] * 1000:8.1f} ms  {r['image']}"
+        if "vertices" in r:
+            line += f"  顶点 {r['vertices'][0]}→{r['vertices'][1]}"
+        if "verify" in r:
+            v = r["verify"]
+            line += f"  验证 {v['match_rate']:.0%} p95 {v['latency_ms']['p95']:.1f} ms"
+        if not r["ok"]:
+            line += f"  -> {r['error']}"
+        print(line, flush=True)
+
+    start = time.perf_counter()
+    results = run_batch(items, base_dir, engine, args.workers, engine_kwargs, on_result=on_result,
+                        cache_dir=args.cache, cache_bytes=int(cache_mb * 1024 * 1024),
+                        verify_args=verify_args, simplify=(tolerance, method) if tolerance > 0 else None)
+    summary = summarize(results, time.perf_counter() - start)
+    print(f"完成 {summary['ok']}/{summary['total']}，失败 {summary['failed']}，缓存命中 {summary['cache_hits']}，"
+          f"总耗时 {summary['wall_seconds']:.2f} s，单条平均 {summary['item_seconds_mean'] * 1000:.1f} ms")
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump({"summary": summary, "results": results}, f, ensure_ascii=False, indent=2)
+    return 0 if summary["failed"] == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+区域自动提议基准：合成场景 (带方孔的多边形零件 + 圆形零件，模糊加噪声) 上的
+耗时与精度，并与在原始分辨率上直接检测对比。
+
+精度: 模板多边形与真实多边形的掩码 IoU，圆心误差与半径误差 (像素)。
+
+    python benchmarks/bench_auto_roi.py --size 4000x3000
+"""
+import sys
+import time
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import cv2
+import numpy as np
+
+import auto_roi
+
+
+def scene(width, height, rng):
+    """返回 (图像, 真实多边形, 方孔, (cx, cy, r))，坐标按图像尺寸缩放"""
+    k = np.array([width / 4000, height / 3000])
+    poly = np.array([(500, 400), (1800, 450), (1700, 1500), (1100, 1900), (450, 1300)]) * k
+    hole = np.array([(900, 800), (1200, 800), (1200, 1100), (900, 1100)]) * k
+    circle = (3000 * k[0], 1500 * k[1], 400 * min(k))
+    img = np.full((height, width), 60, np.uint8)
+    cv2.fillPoly(img, [np.round(poly * 16).astype(np.int32)], 200, shift=4)
+    cv2.fillPoly(img, [np.round(hole * 16).astype(np.int32)], 60, shift=4)
+    cv2.circle(img, (round(circle[0] * 16), round(circle[1] * 16)), round(circle[2] * 16), 200, -1, shift=4)
+    img = cv2.GaussianBlur(img, (0, 0), 1.5)
+    img = np.clip(img + rng.normal(0, 6, img.shape), 0, 255).astype(np.uint8)
+    return cv2.cvtColor(img, cv2.COLOR_GRAY2BGR), poly, hole, circle
+
+
+def iou(a, b, shape):
+    ma, mb = np.zeros(shape, np.uint8), np.zeros(shape, np.uint8)
+    cv2.fillPoly(ma, [np.round(np.asarray(a) * 16).astype(np.int32)], 1, shift=4)
+    cv2.fillPoly(mb, [np.round(np.asarray(b) * 16).astype(np.int32)], 1, shift=4)
+    return np.count_nonzero(ma & mb) / max(1, np.count_nonzero(ma | mb))
+
+
+def run(img, poly, circle, max_side, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        items = auto_roi.propose(img, max_side=max_side)
+        times.append(time.perf_counter() - start)
+    polygons = [it["points"] for it in items if it["type"] == "polygon" and it["role"] == "include"]
+    circles = [it for it in items if it["type"] == "circle"]
+    best = max((iou(p, poly, img.shape[:2]) for p in polygons), default=0.0)
+    err = None
+    if circles:
+        c = min(circles, key=lambda it: np.hypot(it["center"][0] - circle[0], it["center"][1] - circle[1]))
+        err = (np.hypot(c["center"][0] - circle[0], c["center"][1] - circle[1]), abs(c["radius"][1] - circle[2]))
+    return np.median(times) * 1e3, len(items), best, err
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="区域自动提议基准")
+    parser.add_argument("--size", default="4000x3000")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+    width, height = (int(v) for v in args.size.lower().split("x"))
+
+    img, poly, _, circle = scene(width, height, np.random.default_rng(0))
+    print(f"图像 {width}x{height}")
+    for name, max_side in (("金字塔层", auto_roi.MAX_SIDE), ("原始分辨率", max(width, height))):
+        ms, n, best, err = run(img, poly, circle, max_side, args.repeat)
+        circle_text = f"圆心误差 {err[0]:.2f} px  半径误差 {err[1]:.2f} px" if err else "未检测到圆"
+        print(f"{name:<8} {ms:8.1f} ms  提议 {n} 个  多边形 IoU {best:.4f}  {circle_text}")
+
+
+if __name__ == '__main__':
+    main()
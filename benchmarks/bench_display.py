@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+显示刷新微基准：对比旧的整幅转换路径与金字塔/瓦片路径。
+
+    python benchmarks/bench_display.py --sizes 1,5,25,100
+
+旧路径: cvtColor(BGR2RGB) -> QImage -> QPixmap.fromImage (整幅)
+新路径: 包装 NumPy 缓冲区构建金字塔，只上传视口内瓦片；
+局部刷新: 原地修改 256x256 区域后只重算/重传受影响的瓦片。
+"""
+import os
+import sys
+import time
+import argparse
+from pathlib import Path
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import cv2
+import numpy as np
+from PyQt5 import QtGui, QtWidgets
+
+from display_pyramid import ImagePyramid, TileCache, TILE_SIZE
+
+VIEWPORT = (1920, 1080)
+
+
+def synthetic_image(megapixels, seed=0):
+    """生成 4:3 的随机 BGR 图像"""
+    h = int((megapixels * 1e6 * 3 / 4) ** 0.5)
+    w = int(h * 4 / 3)
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 256, (h, w, 3), dtype=np.uint8)
+
+
+def legacy_refresh(img):
+    rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    h, w, ch = rgb.shape
+    qimg = QtGui.QImage(rgb.data, w, h, ch * w, QtGui.QImage.Format_RGB888)
+    pix = QtGui.QPixmap.fromImage(qimg)
+    return rgb.nbytes + pix.width() * pix.height() * pix.depth() // 8
+
+
+def upload_viewport(pyramid, cache, zoom):
+    """模拟 paintEvent：上传左上角视口内的瓦片"""
+    level = pyramid.level_for_zoom(zoom)
+    scale = pyramid.level_scale(level)
+    height, width = pyramid.level_shape(level)
+    k = zoom / scale
+    tx1 = min((width - 1) // TILE_SIZE, int(VIEWPORT[0] / k) // TILE_SIZE)
+    ty1 = min((height - 1) // TILE_SIZE, int(VIEWPORT[1] / k) // TILE_SIZE)
+    for ty in range(ty1 + 1):
+        for tx in range(tx1 + 1):
+            cache.get(pyramid, level, tx, ty)
+
+
+def pyramid_refresh(img, zoom):
+    cache = TileCache()
+    pyramid = ImagePyramid(img)
+    upload_viewport(pyramid, cache, zoom)
+    return pyramid.nbytes - img.nbytes + cache.uploaded_bytes
+
+
+def region_refresh(pyramid, cache, zoom, size=256):
+    img = pyramid.levels[0]
+    before = cache.uploaded_bytes
+    img[:size, :size] ^= 0xFF
+    dirty = pyramid.update_region(0, 0, size, size)
+    for level, rect in enumerate(dirty):
+        cache.invalidate(level, *rect)
+    upload_viewport(pyramid, cache, zoom)
+    return sum(w * h * img.shape[2] for _, _, w, h in dirty[1:]) + cache.uploaded_bytes - before
+
+
+def measure(fn, repeat):
+    times, copied = [], 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        copied = fn()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times)) * 1000, copied
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="显示刷新微基准")
+    parser.add_argument("--sizes", default="1,5,25", help="图像尺寸 (百万像素)，逗号分隔")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv)
+    print(f"{'MP':>5} {'路径':<10} {'ms/刷新':>10} {'复制 MB':>10} {'整幅倍数':>8}")
+    for mp in (float(v) for v in args.sizes.split(",")):
+        img = synthetic_image(mp)
+        frame = img.nbytes
+        # 适应视口的缩放比例
+        zoom = min(1.0, VIEWPORT[0] / img.shape[1], VIEWPORT[1] / img.shape[0])
+
+        pyramid, cache = ImagePyramid(img), TileCache()
+        upload_viewport(pyramid, cache, zoom)
+        rows = [
+            ("legacy", measure(lambda: legacy_refresh(img), args.repeat)),
+            ("pyramid", measure(lambda: pyramid_refresh(img, zoom), args.repeat)),
+            ("region", measure(lambda: region_refresh(pyramid, cache, zoom), args.repeat)),
+        ]
+        for name, (ms, copied) in rows:
+            print(f"{mp:5.0f} {name:<10} {ms:10.2f} {copied / 1e6:10.2f} {copied / frame:8.2f}")
+    del app
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+坐标导出基准：合成数据集 (多幅图像、每幅若干个稠密多边形) 的导出吞吐量与内存峰值。
+
+  逐行     —— 旧做法：csv.writer 逐顶点写出 f"{x:g}" 格式化的行
+  分段     —— coord_export 的 CSV / TXT / NPZ / DXF，按 CHUNK_VERTICES 个顶点分段向量化格式化
+内存峰值由 tracemalloc 统计 (含 NumPy 数组)，不含区域数据本身。
+
+    python benchmarks/bench_export.py --images 20 --vertices 2000000
+"""
+import os
+import sys
+import csv
+import time
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+
+from geometry import GeometryStore, CIRCLE, EXCLUDE
+from coord_export import export, ROLE_LABELS
+
+
+def dataset(images, vertices, rng):
+    """images 幅图像，共约 vertices 个顶点：每幅 4 个多边形 (其中 1 个排除区域) 与 1 个圆"""
+    per_polygon = max(3, vertices // (images * 4))
+    sources = []
+    for k in range(images):
+        store = GeometryStore()
+        for j in range(4):
+            t = np.linspace(0, 2 * np.pi, per_polygon, endpoint=False)
+            r = 300 + 20 * np.sin(t * 37) + rng.uniform(0, 1, per_polygon)
+            pts = np.stack([1000 + 400 * j + r * np.cos(t), 1000 + r * np.sin(t)], axis=1)
+            store.add_polygon(pts, EXCLUDE if j == 3 else 0)
+        store.add_circle((500.25, 600.5), (0, 80.125))
+        sources.append((f"/data/images/img_{k:05d}.png", store))
+    return sources
+
+
+def legacy_csv(sources, fn):
+    """旧的逐行导出 (扩展为多幅图像)"""
+    with open(fn, 'w', newline='', encoding='utf-8') as f:
+        w = csv.writer(f)
+        w.writerow(['图像', '区域', '用途', '类型', '序号', 'X坐标', 'Y坐标', '半径'])
+        for path, store in sources:
+            for r in range(len(store)):
+                role = ROLE_LABELS[store.role(r)]
+                if store.kind(r) == CIRCLE:
+                    cx, cy, _, radius = store.circle(r)
+                    w.writerow([path, r + 1, role, "圆", 1, f"{cx:g}", f"{cy:g}", f"{radius:g}"])
+                else:
+                    for i, (x, y) in enumerate(store.points(r).tolist(), 1):
+                        w.writerow([path, r + 1, role, "多边形", i, f"{x:g}", f"{y:g}", ""])
+
+
+def measure(func):
+    """(耗时秒, 内存峰值字节)；tracemalloc 会拖慢逐行写出，耗时与内存分两次测量"""
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="坐标导出基准")
+    parser.add_argument("--images", type=int, default=20)
+    parser.add_argument("--vertices", type=int, default=2000000, help="全部图像的顶点总数")
+    parser.add_argument("--skip-legacy", action="store_true", help="不测量逐行导出")
+    args = parser.parse_args(argv)
+
+    sources = dataset(args.images, args.vertices, np.random.default_rng(0))
+    total = sum(int(store.rois["count"].sum()) for _, store in sources)
+    folder = tempfile.mkdtemp()
+    print(f"{args.images} 幅图像  {total} 个顶点")
+    print(f"{'方式':<12}{'耗时 ms':>10}{'顶点/秒':>12}{'文件 MB':>10}{'内存峰值 MB':>13}")
+
+    cases = [] if args.skip_legacy else [("逐行 CSV", ".csv", lambda fn: legacy_csv(sources, fn))]
+    cases += [(f"分段 {ext[1:].upper()}", ext, lambda fn: export(sources, fn)) for ext in (".csv", ".txt", ".npz", ".dxf")]
+    for name, ext, func in cases:
+        fn = os.path.join(folder, name.split()[0] + ext)
+        elapsed, peak = measure(lambda: func(fn))
+        target = Path(fn).with_suffix("") if ext == ".dxf" and len(sources) > 1 else Path(fn)
+        size = sum(p.stat().st_size for p in target.iterdir()) if target.is_dir() else target.stat().st_size
+        print(f"{name:<12}{elapsed * 1e3:>10.0f}{total / elapsed:>12,.0f}{size / 1048576:>10.1f}{peak / 1048576:>13.1f}")
+    shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
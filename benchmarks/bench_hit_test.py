@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+顶点命中测试基准：逐点 Python 循环 vs PointStore 网格索引。
+
+    python benchmarks/bench_hit_test.py --sizes 100,1000,10000,100000
+"""
+import sys
+import time
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+
+from point_store import PointStore
+
+
+def contour(n, seed=0):
+    """半径约 2000 像素、带起伏的闭合轮廓"""
+    rng = np.random.default_rng(seed)
+    t = np.linspace(0, 2 * np.pi, n, endpoint=False)
+    r = 2000 + 200 * np.sin(7 * t) + rng.normal(0, 3, n)
+    return np.stack([2500 + r * np.cos(t), 2500 + r * np.sin(t)], axis=1).astype(np.int32)
+
+
+def linear_hit(points, x, y, radius):
+    """原实现：逐点计算距离"""
+    for i, (px, py) in enumerate(points):
+        if ((x - px)**2 + (y - py)**2)**0.5 < radius:
+            return i
+    return -1
+
+
+def measure(fn, queries):
+    start = time.perf_counter()
+    for x, y in queries:
+        fn(x, y)
+    return (time.perf_counter() - start) / len(queries) * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="顶点命中测试基准")
+    parser.add_argument("--sizes", default="100,1000,10000,100000")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--radius", type=float, default=12)
+    args = parser.parse_args(argv)
+
+    print(f"{'顶点数':>8} {'循环 us':>10} {'索引 us':>10} {'最近边 us':>10} {'拖动 us':>10}")
+    for n in (int(v) for v in args.sizes.split(",")):
+        pts = contour(n)
+        rng = np.random.default_rng(1)
+        # 一半查询落在顶点附近，一半随机
+        near = pts[rng.integers(0, n, args.queries // 2)] + rng.integers(-5, 6, (args.queries // 2, 2))
+        queries = np.concatenate([near, rng.integers(0, 5000, (args.queries - len(near), 2))]).tolist()
+
+        plain = pts.tolist()
+        store = PointStore(pts)
+        store.nearest_vertex(0, 0, args.radius)   # 构建索引
+        t_loop = measure(lambda x, y: linear_hit(plain, x, y, args.radius), queries)
+        t_index = measure(lambda x, y: store.nearest_vertex(x, y, args.radius), queries)
+        t_edge = measure(lambda x, y: store.nearest_edge(x, y, args.radius), queries)
+        t_drag = measure(lambda x, y: (store.move(0, x, y), store.nearest_vertex(x, y, args.radius)), queries)
+        print(f"{n:8d} {t_loop:10.1f} {t_index:10.1f} {t_edge:10.1f} {t_drag:10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+坐标传递基准：稠密轮廓 (数万个顶点) 从区域到引擎参数的转换开销。
+
+  逐元素   —— 旧做法：四舍五入后转为 Python int 列表，再逐元素转换为 CLR 数组
+  整块     —— TemplateRequest 的 float64 连续数组，Marshal.Copy 整块复制
+远程引擎的请求经 pickle 传给服务进程，同时比较两种表示的序列化往返耗时与大小。
+安装了 pythonnet 时额外测量 CLR 数组转换本身。
+
+    python benchmarks/bench_marshal.py --points 50000
+"""
+import sys
+import time
+import pickle
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+
+from geometry import GeometryStore, EXCLUDE
+from template_engine import TemplateRequest
+
+
+def best_of(func, repeat=5):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1e3
+
+
+def legacy_args(geometry):
+    """旧的参数构造：每个坐标四舍五入后转为 Python int"""
+    corners = np.round(geometry.points(0)).astype(int).tolist()
+    contour = np.round(geometry.points(1)).astype(int)
+    contour = np.vstack([contour, contour[:1]])
+    return [[int(p[1]) for p in corners], [int(p[0]) for p in corners],
+            [int(v) for v in contour[:, 0].tolist()], [int(v) for v in contour[:, 1].tolist()]]
+
+
+def clr_timings(request, legacy):
+    """安装了 pythonnet 时比较两种 CLR 数组构造方式，否则返回 None"""
+    try:
+        import clr  # noqa: F401
+        from System import Array, Int32
+    except Exception:
+        return None
+    from template_engine import DotNetTemplateEngine
+    engine = DotNetTemplateEngine()
+    engine._clr = sys.modules["clr"]
+    arrays = [request.corner_rows, request.corner_cols, request.contour1X, request.contour1Y]
+    t_old = best_of(lambda: [Array[Int32](v) for v in legacy])
+    t_new = best_of(lambda: [engine._marshal(v, "System.Int32[]") for v in arrays])
+    t_f64 = best_of(lambda: [engine._marshal(v, "System.Double[]") for v in arrays])
+    return t_old, t_new, t_f64
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="坐标传递基准")
+    parser.add_argument("--points", type=int, default=50000, help="模板多边形与排除多边形各自的顶点数")
+    args = parser.parse_args(argv)
+
+    t = np.linspace(0, 2 * np.pi, args.points, endpoint=False)
+    r = 800 + 30 * np.sin(t * 97)
+    geometry = GeometryStore()
+    geometry.add_polygon(np.stack([1000 + r * np.cos(t), 1000 + r * np.sin(t)], axis=1))
+    geometry.add_polygon(np.stack([1000 + 0.3 * r * np.cos(t), 1000 + 0.3 * r * np.sin(t)], axis=1), EXCLUDE)
+
+    t_legacy = best_of(lambda: legacy_args(geometry))
+    t_request = best_of(lambda: TemplateRequest.from_geometry("a.png", "out", geometry))
+    legacy = legacy_args(geometry)
+    request = TemplateRequest.from_geometry("a.png", "out", geometry)
+    # 远程引擎只需要参数，不含 geometry 的对比
+    request.geometry = None
+    old_blob = pickle.dumps(legacy)
+    new_blob = pickle.dumps(request)
+    t_old_pickle = best_of(lambda: pickle.loads(pickle.dumps(legacy)))
+    t_new_pickle = best_of(lambda: pickle.loads(pickle.dumps(request)))
+
+    print(f"顶点数: 模板 {args.points} + 排除 {args.points}")
+    print(f"构造参数      逐元素 {t_legacy:8.2f} ms   整块 {t_request:8.2f} ms")
+    print(f"pickle 往返   逐元素 {t_old_pickle:8.2f} ms   整块 {t_new_pickle:8.2f} ms")
+    print(f"pickle 大小   逐元素 {len(old_blob) / 1024:8.0f} KB   整块 {len(new_blob) / 1024:8.0f} KB")
+    clr = clr_timings(request, legacy)
+    if clr is None:
+        print("CLR 数组转换: 未安装 pythonnet，跳过")
+    else:
+        print(f"CLR 数组转换  逐元素 {clr[0]:8.2f} ms   整块 int32 {clr[1]:8.2f} ms   整块 float64 {clr[2]:8.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+标注绘制基准：密集多边形 (默认 10k 顶点) 下 PolygonLabel 的单帧绘制耗时。
+
+    python benchmarks/bench_paint.py --vertices 10000 --zoom 0.25,1,4
+
+使用 Qt offscreen 平台，把控件渲染到 QImage 中计时。
+"局部" 列为拖动顶点时只重绘脏矩形 (移动前后的 vertex_rect 并集) 的单帧耗时。
+"""
+import os
+import sys
+import time
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import numpy as np
+from PyQt5 import QtWidgets, QtGui, QtCore
+
+from halcon_fixed import PolygonLabel
+
+
+def contour(n, size):
+    """贴近图像边缘、带起伏的闭合轮廓"""
+    t = np.linspace(0, 2 * np.pi, n, endpoint=False)
+    r = size * (0.4 + 0.03 * np.sin(11 * t))
+    c = size / 2
+    return np.stack([c + r * np.cos(t), c + r * np.sin(t)], axis=1).astype(np.int32)
+
+
+def measure(label, frames, viewport, dirty=False):
+    """
+    渲染以第一个顶点为中心、viewport 大小的区域 (模拟滚动视口)，返回每帧毫秒数 (中位数)。
+    dirty 为真时只渲染拖动顶点的脏矩形。
+    """
+    w, h = viewport
+    target = QtGui.QImage(w, h, QtGui.QImage.Format_ARGB32_Premultiplied)
+    x, y = label.points[0]
+    cx = min(max(0, int(label.image_rect.x() + x * label.zoom) - w // 2), max(0, label.width() - w))
+    cy = min(max(0, int(label.image_rect.y() + y * label.zoom) - h // 2), max(0, label.height() - h))
+    source = QtGui.QRegion(cx, cy, w, h)
+    times = []
+    # 与实际拖动一样选中被移动的顶点 (拖动中沿用细节层次)
+    label.selected_point = 0
+    for i in range(frames):
+        # 每帧移动一个顶点，使路径缓存失效，模拟拖动中的最坏情况
+        x, y = label.points[0]
+        old = label.vertex_rect(0)
+        label.points.move(0, x + (1 if i % 2 else -1), y)
+        region = source
+        if dirty:
+            rect = old.united(label.vertex_rect(0)).intersected(source.boundingRect())
+            region = QtGui.QRegion(rect)
+        start = time.perf_counter()
+        label.render(target, region.boundingRect().topLeft() - source.boundingRect().topLeft(), region)
+        times.append(time.perf_counter() - start)
+    label.selected_point = -1
+    label.polygon_painter.invalidate_lod()
+    return float(np.median(times)) * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="标注绘制基准")
+    parser.add_argument("--vertices", type=int, default=10000)
+    parser.add_argument("--size", type=int, default=4000, help="图像边长")
+    parser.add_argument("--zoom", default="0.25,1,4")
+    parser.add_argument("--frames", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    app = QtWidgets.QApplication(sys.argv[:1])
+    label = PolygonLabel()
+    label.setImage(np.full((args.size, args.size, 3), 60, np.uint8))
+    label.points.extend(contour(args.vertices, args.size))
+    label.drawing = False
+
+    print(f"顶点数 {args.vertices}  图像 {args.size}x{args.size}")
+    print(f"{'缩放':>6} {'整体 ms':>10} {'局部 ms':>10}")
+    for zoom in (float(z) for z in args.zoom.split(",")):
+        label.zoom = zoom
+        label.apply_zoom()
+        label.resize(label.minimumSize())
+        viewport = (min(label.width(), 1600), min(label.height(), 1000))
+        measure(label, 2, viewport)  # 预热瓦片缓存
+        print(f"{zoom:6.2f} {measure(label, args.frames, viewport):10.2f} "
+              f"{measure(label, args.frames, viewport, dirty=True):10.2f}")
+    app.quit()
+
+
+if __name__ == '__main__':
+    main()
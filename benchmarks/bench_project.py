@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+项目文件基准：完整保存、修改一幅图像后的增量保存、重新打开与读取单幅图像的区域。
+
+    python benchmarks/bench_project.py --images 1000 --vertices 50
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+
+from geometry import GeometryStore, EXCLUDE
+from project_file import ProjectFile
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="项目文件基准")
+    parser.add_argument("--images", type=int, default=1000)
+    parser.add_argument("--vertices", type=int, default=50)
+    parser.add_argument("--rois", type=int, default=3, help="每幅图像的多边形区域数")
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(0)
+    folder = tempfile.mkdtemp()
+    path = os.path.join(folder, "bench.hproj")
+    project = ProjectFile.create(path)
+    project.images = [os.path.join(folder, f"image_{i:05d}.png") for i in range(args.images)]
+    project.params = {"gamma": 0.8}
+    stores = []
+    for image in project.images:
+        store = GeometryStore()
+        for _ in range(args.rois):
+            store.add_polygon(rng.uniform(0, 4000, (args.vertices, 2)))
+        store.add_circle((100, 100), (10, 40), EXCLUDE)
+        project.set_geometry(image, store)
+        stores.append(store)
+
+    start = time.perf_counter()
+    project.save()
+    t_full = time.perf_counter() - start
+    size = project.nbytes
+
+    stores[args.images // 2].set_polygon(0, rng.uniform(0, 4000, (args.vertices, 2)))
+    project.current = args.images // 2
+    start = time.perf_counter()
+    appended = project.save()
+    t_incr = time.perf_counter() - start
+    project.close()
+
+    start = time.perf_counter()
+    reopened = ProjectFile(path)
+    t_open = time.perf_counter() - start
+    start = time.perf_counter()
+    store = reopened.geometry(reopened.images[reopened.current])
+    t_get = time.perf_counter() - start
+    assert np.allclose(store.points(0), stores[args.images // 2].points(0))
+    reopened.close()
+
+    print(f"图像 {args.images}  每幅 {args.rois} 个多边形 x {args.vertices} 点 + 1 个圆")
+    print(f"完整保存: {t_full * 1e3:.1f} ms  文件 {size / 1024:.0f} KB")
+    print(f"增量保存: {t_incr * 1e3:.1f} ms  追加 {appended / 1024:.1f} KB")
+    print(f"重新打开: {t_open * 1e3:.1f} ms  读取一幅图像的区域: {t_get * 1e3:.2f} ms")
+    os.remove(path)
+    os.rmdir(folder)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+多边形简化基准：稠密的描边轮廓 (默认 50k 顶点，坐标带半像素的阶梯) 经
+TemplateRequest.simplify 简化后的顶点数、简化耗时，以及模板生成 (OpenCV 替代引擎) 与
+请求序列化 (远程引擎经 pickle 传递) 的耗时对比；另测缩小显示时按细节层次绘制连线的单帧耗时。
+dp 的简化本身约是 vw 的两倍耗时，小容差 (0.5px) 时几乎抵消了引擎省下的时间，
+因此 TemplateRequest.simplify 与配置的默认方法为 vw。
+
+    python benchmarks/bench_simplify.py --vertices 50000 --tolerance 0.5,1,2
+"""
+import os
+import sys
+import time
+import pickle
+import shutil
+import argparse
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import cv2
+import numpy as np
+from PyQt5 import QtWidgets, QtGui, QtCore
+
+import polygon_render
+from geometry import GeometryStore, EXCLUDE
+from point_store import PointStore
+from template_engine import TemplateRequest, OpenCVTemplateEngine
+
+
+def traced(n, size, rng):
+    """描边得到的闭合轮廓：带起伏的圆，坐标取整到半像素 (模拟逐像素跟踪的阶梯)"""
+    t = np.linspace(0, 2 * np.pi, n, endpoint=False)
+    r = size * (0.35 + 0.04 * np.sin(7 * t) + 0.01 * np.sin(29 * t))
+    pts = np.stack([size / 2 + r * np.cos(t), size / 2 + r * np.sin(t)], axis=1)
+    return np.round((pts + rng.normal(0, 0.1, pts.shape)) * 2) / 2
+
+
+def request(image_path, prefix, pts, size):
+    geometry = GeometryStore()
+    geometry.add_polygon(pts)
+    hole = (pts - size / 2) * 0.3 + size / 2
+    geometry.add_polygon(hole, EXCLUDE)
+    return TemplateRequest.from_geometry(image_path, prefix, geometry)
+
+
+def best_of(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1e3
+
+
+def create_ms(engine, image_path, prefix, pts, size, tolerance, method, repeat):
+    """(简化耗时, 引擎耗时, pickle 往返耗时, pickle 字节数, 简化前后顶点数)"""
+    simplify_times, create_times, pickle_times = [], [], []
+    for _ in range(repeat):
+        req = request(image_path, prefix, pts, size)
+        start = time.perf_counter()
+        vertices = req.simplify(tolerance, method)
+        simplify_times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        engine.create_template(req)
+        create_times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        data = pickle.dumps(req, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.loads(data)
+        pickle_times.append(time.perf_counter() - start)
+    return (min(simplify_times) * 1e3, min(create_times) * 1e3, min(pickle_times) * 1e3,
+            len(data), vertices)
+
+
+def paint_ms(pts, zoom, lod, frames):
+    """PolygonPainter 在 zoom 下绘制整个多边形的单帧耗时 (lod 为假时关闭细节层次)"""
+    store = PointStore()
+    store.extend(pts)
+    painter_ = polygon_render.PolygonPainter()
+    saved = polygon_render.LOD_MIN_VERTICES
+    polygon_render.LOD_MIN_VERTICES = saved if lod else len(pts) + 1
+    span = pts.max(axis=0) * zoom + 40
+    target = QtGui.QImage(int(span[0]), int(span[1]), QtGui.QImage.Format_ARGB32_Premultiplied)
+    rect = target.rect()
+
+    def frame():
+        painter = QtGui.QPainter(target)
+        painter_.paint(painter, store, True, -1, QtCore.QPoint(20, 20), zoom, rect)
+        painter.end()
+
+    frame()  # 预热路径与细节层次缓存
+    ms = best_of(frame, frames)
+    polygon_render.LOD_MIN_VERTICES = saved
+    return ms
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="多边形简化基准")
+    parser.add_argument("--vertices", type=int, default=50000)
+    parser.add_argument("--size", type=int, default=3000, help="图像边长")
+    parser.add_argument("--tolerance", default="0.5,1,2")
+    parser.add_argument("--methods", default="dp,vw")
+    parser.add_argument("--zoom", default="0.5,0.25,0.1")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    pts = traced(args.vertices, args.size, np.random.default_rng(0))
+    folder = tempfile.mkdtemp()
+    image_path = os.path.join(folder, "image.png")
+    rng = np.random.default_rng(1)
+    cv2.imwrite(image_path, rng.integers(0, 255, (args.size, args.size), dtype=np.uint8))
+    engine = OpenCVTemplateEngine()
+    prefix = os.path.join(folder, "model")
+
+    print(f"轮廓 {args.vertices} 个顶点 (另有 {args.vertices} 个顶点的排除轮廓)  图像 {args.size}x{args.size}")
+    print(f"{'方式':<12}{'顶点':>16}{'简化 ms':>10}{'生成 ms':>10}{'pickle ms':>11}{'请求 KB':>10}{'加速':>8}")
+    base = None
+    cases = [("不简化", 0.0, "dp")]
+    cases += [(f"{m} {t}px", float(t), m) for m in args.methods.split(",") for t in args.tolerance.split(",")]
+    for name, tolerance, method in cases:
+        t_simplify, t_create, t_pickle, size, (before, after) = create_ms(
+            engine, image_path, prefix, pts, args.size, tolerance, method, args.repeat)
+        total = t_simplify + t_create + t_pickle
+        base = base or total
+        print(f"{name:<12}{f'{before}→{after}':>16}{t_simplify:>10.1f}{t_create:>10.1f}"
+              f"{t_pickle:>11.2f}{size / 1024:>10.0f}{base / total:>7.2f}x")
+
+    app = QtWidgets.QApplication(sys.argv[:1])
+    print(f"\n{'缩放':>6}{'完整 ms':>10}{'细节层次 ms':>13}")
+    for zoom in (float(z) for z in args.zoom.split(",")):
+        print(f"{zoom:6.2f}{paint_ms(pts, zoom, False, 10):>10.2f}{paint_ms(pts, zoom, True, 10):>13.2f}")
+    app.quit()
+    shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
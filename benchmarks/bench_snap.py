@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+顶点吸附基准：大图上每个顶点的吸附耗时 (首次计算瓦片 / 缓存命中) 与精度。
+
+测试图像为 8 倍超采样后面积平均缩小的多边形 (边缘为真实的亚像素位置)，
+点击位置在真实顶点/边附近随机偏移。
+
+    python benchmarks/bench_snap.py --size 8000x6000 --clicks 200
+"""
+import sys
+import time
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import cv2
+import numpy as np
+
+from contour_snap import EdgeSnapper
+
+SUPERSAMPLE = 8
+
+
+def polygon_image(width, height, sides, seed=0):
+    """返回 (图像, 真实顶点)；多边形在 2048x2048 的局部画布上超采样绘制后贴入大图"""
+    rng = np.random.default_rng(seed)
+    img = np.full((height, width), 40, np.uint8)
+    size = min(2048, width, height)
+    t = np.sort(rng.uniform(0, 2 * np.pi, sides))
+    r = size * rng.uniform(0.3, 0.45, sides)
+    local = np.stack([size / 2 + r * np.cos(t), size / 2 + r * np.sin(t)], axis=1) + rng.uniform(0, 1, (sides, 2))
+    hi = np.zeros((size * SUPERSAMPLE, size * SUPERSAMPLE), np.uint8)
+    hp = (local + 0.5) * SUPERSAMPLE - 0.5
+    cv2.fillPoly(hi, [np.round(hp * 16).astype(np.int32)], 255, shift=4)
+    patch = cv2.resize(hi, (size, size), interpolation=cv2.INTER_AREA).astype(np.float32) / 255 * 160 + 40
+    patch += rng.normal(0, 2, patch.shape)
+    ox, oy = (width - size) // 2, (height - size) // 2
+    img[oy:oy + size, ox:ox + size] = np.clip(patch, 0, 255).astype(np.uint8)
+    return img, local + (ox, oy)
+
+
+def edge_distance(pt, a, b):
+    d, e = b - a, pt - a
+    return abs(d[0] * e[1] - d[1] * e[0]) / np.hypot(*d)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="顶点吸附基准")
+    parser.add_argument("--size", default="8000x6000")
+    parser.add_argument("--sides", type=int, default=12)
+    parser.add_argument("--clicks", type=int, default=200)
+    parser.add_argument("--radius", type=float, default=8)
+    args = parser.parse_args(argv)
+
+    width, height = (int(v) for v in args.size.split("x"))
+    img, verts = polygon_image(width, height, args.sides)
+    rng = np.random.default_rng(1)
+    n = len(verts)
+
+    # 一半点击在顶点附近，一半在边上 (沿法线偏移)
+    clicks, truth = [], []
+    for k in range(args.clicks):
+        i = int(rng.integers(n))
+        a, b = verts[i], verts[(i + 1) % n]
+        if k % 2 == 0:
+            clicks.append(a + rng.uniform(-3, 3, 2))
+            truth.append(("corner", a, None))
+        else:
+            d = b - a
+            normal = np.array([-d[1], d[0]]) / np.hypot(*d)
+            clicks.append(a + d * rng.uniform(0.2, 0.8) + normal * rng.uniform(-3, 3))
+            truth.append(("edge", a, b))
+
+    snapper = EdgeSnapper(img)
+    results = {}
+    for name in ("首次", "缓存"):
+        start = time.perf_counter()
+        results[name] = [snapper.snap(x, y, args.radius) for x, y in clicks]
+        results[name + "_ms"] = (time.perf_counter() - start) / len(clicks) * 1e3
+
+    corner_err, edge_err, missed = [], [], 0
+    for res, (kind, a, b) in zip(results["缓存"], truth):
+        if res is None:
+            missed += 1
+        elif kind == "corner":
+            corner_err.append(np.hypot(*(np.array(res) - a)))
+        else:
+            edge_err.append(edge_distance(np.array(res), a, b))
+
+    print(f"图像 {width}x{height}  点击 {len(clicks)}  半径 {args.radius:g}  缓存 {snapper.cache.bytes / 2**20:.1f} MB")
+    print(f"每点耗时: 首次 {results['首次_ms']:.2f} ms  缓存 {results['缓存_ms']:.2f} ms")
+    print(f"角点误差: 平均 {np.mean(corner_err):.3f} px  最大 {np.max(corner_err):.3f} px")
+    print(f"边缘误差: 平均 {np.mean(edge_err):.3f} px  最大 {np.max(edge_err):.3f} px")
+    print(f"未吸附: {missed}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+启动基准：核心模块导入耗时与首个窗口显示耗时。
+
+    python benchmarks/bench_startup.py --repeat 5
+
+每次测量都在新的子进程中进行，避免模块缓存影响结果。
+首窗口测量使用 Qt offscreen 平台，无需显示器。
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# 不依赖 Qt 的核心模块 (批处理/服务路径)
+CORE_MODULES = ["app_config", "lru_cache", "template_engine", "batch_templates", "engine_service",
+                "preprocess", "image_io", "overlay"]
+
+IMPORT_SNIPPET = """
+import sys, time
+start = time.perf_counter()
+import {modules}
+elapsed = time.perf_counter() - start
+heavy = [m for m in ("cv2", "numpy", "clr") if m in sys.modules
+         and type(sys.modules[m]).__name__ not in ("_LazyModule", "_MissingModule")]
+print(elapsed, ",".join(heavy))
+"""
+
+WINDOW_SNIPPET = """
+import halcon_fixed
+app = halcon_fixed.create_application(["bench"])
+win = halcon_fixed.TemplateMaker()
+win.show()
+app.processEvents()
+print("WINDOW_SHOWN", flush=True)
+"""
+
+
+def run_python(code):
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    return time.perf_counter() - start, out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="启动耗时基准")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--no-window", action="store_true", help="只测量核心模块导入")
+    args = parser.parse_args(argv)
+
+    # Python 解释器自身的启动耗时，作为基线
+    baseline = statistics.median(run_python("pass")[0] for _ in range(args.repeat))
+    print(f"解释器启动: {baseline * 1000:8.1f} ms")
+
+    imports, heavy = [], ""
+    for _ in range(args.repeat):
+        _, out = run_python(IMPORT_SNIPPET.format(modules=", ".join(CORE_MODULES)))
+        seconds, _, heavy = out.strip().partition(" ")
+        imports.append(float(seconds))
+    print(f"核心模块导入: {statistics.median(imports) * 1000:8.1f} ms  "
+          f"已真正加载的重量级模块: {heavy or '无'}")
+
+    if args.no_window:
+        return 0
+    windows = []
+    for _ in range(args.repeat):
+        seconds, out = run_python(WINDOW_SNIPPET)
+        if "WINDOW_SHOWN" not in out:
+            raise RuntimeError("窗口未能显示")
+        windows.append(seconds)
+    print(f"首个窗口显示: {statistics.median(windows) * 1000:8.1f} ms  "
+          f"(扣除解释器启动 {(statistics.median(windows) - baseline) * 1000:.1f} ms)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
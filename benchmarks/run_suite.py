@@ -0,0 +1,344 @@
+# -*- coding: utf-8 -*-
+"""
+无界面回归基准套件 (Qt offscreen 平台，可在 Linux 服务器上运行)。
+
+    python benchmarks/run_suite.py                              # 运行并打印结果
+    python benchmarks/run_suite.py --save baseline.json         # 保存为基准线
+    python benchmarks/run_suite.py --compare baseline.json      # 与基准线比较，回归时退出码为 1
+    python benchmarks/run_suite.py --sizes 1,25 --filter paint,load
+
+用例 (图像类用例按图像尺寸参数化，绘制用例按顶点数参数化):
+  load.preview       LazyImage + ImagePyramid.from_lazy (打开图像到可以显示)
+  load.full          全分辨率解码
+  preprocess         PreprocessPipeline.run (默认参数，每次清空结果缓存)
+  polygon_finished   TemplateMaker.on_polygon_finished (区域、掩码与覆盖层)
+  update_display     TemplateMaker.update_display + 重绘视口
+  paint              PolygonLabel 单帧重绘 (顶点被修改，路径缓存失效)
+  create_template    OpenCV 替代引擎的 CreateTemplate (代替 HALCON)
+
+每个用例先预热一次，再重复运行取中位数；中位数比基准线慢 --threshold 以上
+(且绝对差超过 --min-ms) 记为回归。基准线与机器相关，应在同一台机器上生成与比较。
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+from pathlib import Path
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import cv2
+import numpy as np
+from PyQt5 import QtCore, QtGui, QtWidgets
+
+VIEWPORT = (1600, 1000)
+# 多边形区域的顶点数 (polygon_finished / create_template)
+ROI_VERTICES = 64
+
+CASES = []
+
+
+def case(name, axis="mp"):
+    """注册用例。被装饰的函数接收 (ctx, 参数)，返回计时用的无参函数；准备工作不计时"""
+    def register(func):
+        CASES.append((name, axis, func))
+        return func
+    return register
+
+
+# —— 一、共用资源
+def synthetic_image(megapixels, seed=0):
+    """4:3 的 BGR 图像：低频随机纹理 + 噪声 (压缩率与 CLAHE 效果接近真实图像)"""
+    h = int((megapixels * 1e6 * 3 / 4) ** 0.5)
+    w = int(h * 4 / 3)
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 256, (h // 16 + 1, w // 16 + 1, 3), dtype=np.uint8)
+    img = cv2.resize(small, (w, h), interpolation=cv2.INTER_CUBIC)
+    return cv2.add(img, rng.integers(0, 16, (h, w, 3), dtype=np.uint8))
+
+
+def star_polygon(cx, cy, radius, n, seed=0):
+    """以 (cx, cy) 为中心、半径有起伏的闭合多边形 (n, 2)"""
+    rng = np.random.default_rng(seed)
+    t = np.linspace(0, 2 * np.pi, n, endpoint=False)
+    r = radius * rng.uniform(0.7, 1.0, n)
+    return np.stack([cx + r * np.cos(t), cy + r * np.sin(t)], axis=1)
+
+
+class Context:
+    """用例共用的资源：合成图像、图像文件与界面对象；只保留当前尺寸的图像"""
+
+    def __init__(self, folder, fmt):
+        self.folder = folder
+        self.fmt = fmt
+        self._mp = None
+        self._image = None
+        self._file = None
+        self._maker = None
+
+    def image(self, mp):
+        if self._mp != mp:
+            self.release()
+            self._mp = mp
+            self._image = synthetic_image(mp)
+        return self._image
+
+    def file(self, mp):
+        img = self.image(mp)
+        if self._file is None:
+            self._file = os.path.join(self.folder, f"image_{mp:g}mp.{self.fmt}")
+            cv2.imwrite(self._file, img)
+        return self._file
+
+    def roi(self, mp):
+        h, w = self.image(mp).shape[:2]
+        return star_polygon(w / 2, h / 2, min(w, h) * 0.3, ROI_VERTICES)
+
+    def maker(self):
+        """显示在 offscreen 平台上的主窗口 (不使用模板缓存)"""
+        if self._maker is None:
+            from app_config import AppConfig
+            from halcon_fixed import TemplateMaker
+            self._maker = TemplateMaker(AppConfig(template_cache=""))
+            self._maker.resize(*VIEWPORT)
+            self._maker.show()
+        return self._maker
+
+    def show(self, mp):
+        """在主窗口中打开 mp 尺寸的图像"""
+        from image_io import LazyImage
+        from display_pyramid import ImagePyramid
+        maker = self.maker()
+        lazy = LazyImage(self.file(mp))
+        maker.show_image(lazy, ImagePyramid.from_lazy(lazy))
+        maker.display_image()
+        QtWidgets.QApplication.processEvents()
+        return maker
+
+    def release(self):
+        if self._file is not None and os.path.exists(self._file):
+            os.remove(self._file)
+        self._mp = self._image = self._file = None
+        if self._maker is not None:
+            self._maker.lazy_image = None
+            self._maker.base_pyramid = None
+            self._maker.image = None
+            self._maker.overlay.reset(None)
+            self._maker.label.pyramid = None
+            self._maker.label.tile_cache.clear()
+
+
+# —— 二、用例
+@case("load.preview")
+def bench_load_preview(ctx, mp):
+    from image_io import LazyImage
+    from display_pyramid import ImagePyramid
+    path = ctx.file(mp)
+    return lambda: ImagePyramid.from_lazy(LazyImage(path))
+
+
+@case("load.full")
+def bench_load_full(ctx, mp):
+    from image_io import LazyImage
+    path = ctx.file(mp)
+    return lambda: LazyImage(path).full()
+
+
+@case("preprocess")
+def bench_preprocess(ctx, mp):
+    from preprocess import PreprocessPipeline
+    img = ctx.image(mp)
+    pipeline = PreprocessPipeline()
+
+    def run():
+        pipeline.cache.clear()
+        pipeline.run(img)
+    return run
+
+
+@case("polygon_finished")
+def bench_polygon_finished(ctx, mp):
+    maker = ctx.show(mp)
+    # 两个略有偏移的多边形交替提交，否则覆盖层判断区域未变化而不重绘
+    polys = [ctx.roi(mp).tolist(), (ctx.roi(mp) + 3).tolist()]
+    turn = [0]
+
+    def run():
+        turn[0] ^= 1
+        maker.geometry.clear()
+        maker.active_roi = -1
+        maker.on_polygon_finished(polys[turn[0]])
+    return run
+
+
+@case("update_display")
+def bench_update_display(ctx, mp):
+    maker = ctx.show(mp)
+    img = ctx.image(mp)
+
+    def run():
+        maker.update_display(img)
+        maker.label.repaint()
+    return run
+
+
+@case("create_template")
+def bench_create_template(ctx, mp):
+    from template_engine import TemplateRequest, OpenCVTemplateEngine
+    request = TemplateRequest.from_polygon(ctx.file(mp), os.path.join(ctx.folder, "template"), ctx.roi(mp))
+    engine = OpenCVTemplateEngine()
+    return lambda: engine.create_template(request)
+
+
+@case("paint", axis="vertices")
+def bench_paint(ctx, vertices):
+    from halcon_fixed import PolygonLabel
+    size = 4000
+    label = PolygonLabel()
+    label.setImage(np.full((size, size, 3), 60, np.uint8))
+    t = np.linspace(0, 2 * np.pi, vertices, endpoint=False)
+    r = size * (0.4 + 0.03 * np.sin(11 * t))
+    label.points.extend(np.stack([size / 2 + r * np.cos(t), size / 2 + r * np.sin(t)], axis=1))
+    label.drawing = False
+    label.resize(label.minimumSize())
+    target = QtGui.QImage(*VIEWPORT, QtGui.QImage.Format_ARGB32_Premultiplied)
+    x, y = label.points[0]
+    left = min(max(0, int(label.image_rect.x() + x) - VIEWPORT[0] // 2), label.width() - VIEWPORT[0])
+    top = min(max(0, int(label.image_rect.y() + y) - VIEWPORT[1] // 2), label.height() - VIEWPORT[1])
+    source = QtGui.QRegion(left, top, *VIEWPORT)
+    step = [1.0]
+
+    def run():
+        # 每帧移动一个顶点，使路径缓存失效 (拖动中的最坏情况)
+        step[0] = -step[0]
+        x, y = label.points[0]
+        label.points.move(0, x + step[0], y)
+        label.render(target, QtCore.QPoint(), source)
+    return run
+
+
+# —— 三、计时与比较
+def measure(func, repeat, budget):
+    """预热一次后重复运行，至少 3 次、最多 repeat 次或累计超过 budget 秒为止"""
+    func()
+    times = []
+    total = 0.0
+    while len(times) < repeat and (len(times) < 3 or total < budget):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        times.append(elapsed * 1e3)
+        total += elapsed
+    return {"median_ms": float(np.median(times)), "min_ms": float(np.min(times)), "runs": len(times)}
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "qt": QtCore.QT_VERSION_STR,
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+
+def run_suite(sizes, vertices, names=None, repeat=7, budget=5.0, fmt="png", on_result=None):
+    """运行选中的用例，返回 {"environment", "results": {"用例[参数]": 计时}}"""
+    selected = [c for c in CASES if not names or any(c[0].startswith(n) for n in names)]
+    results = {}
+    folder = tempfile.mkdtemp(prefix="halcon_bench_")
+    ctx = Context(folder, fmt)
+    try:
+        for axis, values, unit in (("mp", sizes, "MP"), ("vertices", vertices, "")):
+            for value in values:
+                for name, case_axis, func in selected:
+                    if case_axis != axis:
+                        continue
+                    key = f"{name}[{value:g}{unit}]"
+                    results[key] = measure(func(ctx, value), repeat, budget)
+                    if on_result:
+                        on_result(key, results[key])
+                ctx.release()
+    finally:
+        ctx.release()
+        shutil.rmtree(folder, ignore_errors=True)
+    return {"environment": environment(), "results": results}
+
+
+def compare(current, baseline, threshold=0.2, min_ms=1.0):
+    """逐项比较中位数，返回 [(用例, 当前, 基准, 比值, 状态)]；状态为 回归 / 改善 / 持平 / 新增"""
+    rows = []
+    base = baseline.get("results", {})
+    for key, result in current["results"].items():
+        now = result["median_ms"]
+        if key not in base:
+            rows.append((key, now, None, None, "新增"))
+            continue
+        ref = base[key]["median_ms"]
+        ratio = now / ref if ref > 0 else float("inf")
+        if ratio > 1 + threshold and now - ref > min_ms:
+            status = "回归"
+        elif ratio < 1 / (1 + threshold) and ref - now > min_ms:
+            status = "改善"
+        else:
+            status = "持平"
+        rows.append((key, now, ref, ratio, status))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="无界面回归基准套件")
+    parser.add_argument("--sizes", default="1,10,100", help="图像尺寸 (百万像素)，逗号分隔")
+    parser.add_argument("--vertices", default="100,1000,10000,100000", help="绘制用例的顶点数，逗号分隔")
+    parser.add_argument("--filter", help="只运行名称以这些前缀开头的用例，逗号分隔")
+    parser.add_argument("--repeat", type=int, default=7, help="每个用例的最多运行次数")
+    parser.add_argument("--budget", type=float, default=5.0, help="每个用例的计时预算 (秒)，至少运行 3 次")
+    parser.add_argument("--format", default="png", help="图像文件格式 (png / jpg / tif / bmp)")
+    parser.add_argument("--save", help="把结果保存为 JSON (作为基准线)")
+    parser.add_argument("--compare", help="与基准线 JSON 比较")
+    parser.add_argument("--threshold", type=float, default=0.2, help="允许的变慢比例 (默认 0.2 = 20%%)")
+    parser.add_argument("--min-ms", type=float, default=1.0, help="绝对差小于该值时不算回归 (毫秒)")
+    args = parser.parse_args(argv)
+
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv[:1])
+    sizes = [float(v) for v in args.sizes.split(",") if v]
+    vertices = [int(v) for v in args.vertices.split(",") if v]
+    names = args.filter.split(",") if args.filter else None
+
+    def on_result(key, r):
+        print(f"{key:<32} {r['median_ms']:10.2f} ms  (最小 {r['min_ms']:.2f} ms，{r['runs']} 次)", flush=True)
+
+    report = run_suite(sizes, vertices, names, args.repeat, args.budget, args.format, on_result)
+    app.quit()
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存到 {args.save}")
+    if not args.compare:
+        return 0
+
+    with open(args.compare, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    rows = compare(report, baseline, args.threshold, args.min_ms)
+    print(f"\n{'用例':<32} {'当前 ms':>10} {'基准 ms':>10} {'比值':>7}  状态")
+    for key, now, ref, ratio, status in rows:
+        ref_text = f"{ref:10.2f}" if ref is not None else f"{'-':>10}"
+        ratio_text = f"{ratio:7.2f}" if ratio is not None else f"{'-':>7}"
+        print(f"{key:<32} {now:10.2f} {ref_text} {ratio_text}  {status}")
+    regressions = [row for row in rows if row[4] == "回归"]
+    if regressions:
+        print(f"\n{len(regressions)} 个用例变慢超过 {args.threshold:.0%}")
+        return 1
+    print("\n没有回归")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+顶点吸附：把手工点击的顶点移动到附近的图像边缘/角点上，并做亚像素细化。
+
+图像按瓦片 (带重叠边) 计算灰度、Canny 边缘与 Sobel 梯度，结果缓存在按字节限制的
+LRU 中；每次吸附只拼接顶点周围的小窗口:
+  - 窗口内有明显角点 (结构张量两个特征值相近) 时吸附到最强的角点，用 cornerSubPix 细化
+  - 否则吸附到最近的 Canny 边缘像素，沿梯度方向对梯度幅值做抛物线拟合得到亚像素位置
+"""
+from app_config import lazy_import
+from lru_cache import ByteLRU
+
+# 延迟导入：首次使用时才加载 OpenCV / NumPy
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+
+SNAP_TILE = 256
+# 瓦片重叠宽度：覆盖 Sobel/Canny 的邻域，减小瓦片边界对边缘连接的影响
+SNAP_HALO = 8
+# 结构张量较小特征值与较大特征值之比超过该值时按角点处理
+CORNER_RATIO = 0.1
+# 较大特征值低于窗口内最大值的该比例时视为噪声，不作为角点
+CORNER_FLOOR = 0.1
+
+
+class EdgeSnapper:
+    """对一幅图像做顶点吸附；图像不变时复用已计算的瓦片"""
+
+    def __init__(self, image, low=50, high=150, tile=SNAP_TILE, cache_bytes=128 * 1024 * 1024):
+        self.image = image
+        self.low = low
+        self.high = high
+        self.tile = tile
+        self.cache = ByteLRU(cache_bytes)
+
+    @property
+    def width(self):
+        return self.image.shape[1]
+
+    @property
+    def height(self):
+        return self.image.shape[0]
+
+    def _tile(self, tx, ty):
+        """第 (tx, ty) 个瓦片的 (灰度, 边缘, gx, gy)"""
+        key = (tx, ty)
+        data = self.cache.get(key)
+        if data is None:
+            t = self.tile
+            x0, y0 = tx * t, ty * t
+            x1, y1 = min(x0 + t, self.width), min(y0 + t, self.height)
+            ax0, ay0 = max(0, x0 - SNAP_HALO), max(0, y0 - SNAP_HALO)
+            ax1, ay1 = min(self.width, x1 + SNAP_HALO), min(self.height, y1 + SNAP_HALO)
+            sub = np.ascontiguousarray(self.image[ay0:ay1, ax0:ax1])
+            gray = cv2.cvtColor(sub, cv2.COLOR_BGR2GRAY) if sub.ndim == 3 else sub
+            edges = cv2.Canny(gray, self.low, self.high, L2gradient=True)
+            gx = cv2.Sobel(gray, cv2.CV_32F, 1, 0, ksize=3)
+            gy = cv2.Sobel(gray, cv2.CV_32F, 0, 1, ksize=3)
+            crop = (slice(y0 - ay0, y1 - ay0), slice(x0 - ax0, x1 - ax0))
+            data = tuple(np.ascontiguousarray(a[crop]) for a in (gray, edges, gx, gy))
+            self.cache.put(key, data)
+        return data
+
+    def window(self, x0, y0, x1, y1):
+        """拼接 [x0, x1) x [y0, y1) 范围 (已裁剪到图像内) 的 (灰度, 边缘, gx, gy)"""
+        t = self.tile
+        out = None
+        for ty in range(y0 // t, (y1 - 1) // t + 1):
+            for tx in range(x0 // t, (x1 - 1) // t + 1):
+                data = self._tile(tx, ty)
+                if out is None:
+                    out = [np.empty((y1 - y0, x1 - x0), a.dtype) for a in data]
+                bx, by = tx * t, ty * t
+                sx0, sy0 = max(x0, bx), max(y0, by)
+                sx1, sy1 = min(x1, bx + t), min(y1, by + t)
+                for dst, src in zip(out, data):
+                    dst[sy0 - y0:sy1 - y0, sx0 - x0:sx1 - x0] = src[sy0 - by:sy1 - by, sx0 - bx:sx1 - bx]
+        return out
+
+    def snap(self, x, y, radius):
+        """
+        返回 radius 范围内最近边缘上的亚像素位置 (x, y)；附近没有边缘时返回 None。
+        """
+        r = int(np.ceil(radius))
+        pad = 4   # 细化所需的额外邻域
+        xi, yi = int(round(x)), int(round(y))
+        x0, y0 = max(0, xi - r - pad), max(0, yi - r - pad)
+        x1, y1 = min(self.width, xi + r + pad + 1), min(self.height, yi + r + pad + 1)
+        if x1 <= x0 or y1 <= y0:
+            return None
+        gray, edges, gx, gy = self.window(x0, y0, x1, y1)
+        yy, xx = np.mgrid[0:y1 - y0, 0:x1 - x0]
+        d2 = (xx + x0 - x) ** 2 + (yy + y0 - y) ** 2
+        disc = d2 <= radius * radius
+        candidates = disc & (edges > 0)
+        if not candidates.any():
+            return None
+
+        # 角点只在边缘像素附近查找，避免平坦区域的噪声被当成角点
+        near_edge = cv2.dilate(edges, np.ones((5, 5), np.uint8)) > 0
+        corner = self._find_corner(gray, disc & near_edge)
+        if corner is not None:
+            refined = self._refine_corner(gray, *corner)
+        else:
+            d2 = np.where(candidates, d2, np.inf)
+            ey, ex = np.unravel_index(int(np.argmin(d2)), d2.shape)
+            refined = self._refine_edge(gx, gy, int(ex), int(ey))
+        return refined[0] + x0, refined[1] + y0
+
+    @staticmethod
+    def _find_corner(gray, disc):
+        """disc (布尔掩码) 范围内最强的角点 (窗口坐标)，没有时返回 None"""
+        eig = cv2.cornerEigenValsAndVecs(gray, 5, 3)
+        big = np.maximum(eig[..., 0], eig[..., 1])
+        small = np.minimum(eig[..., 0], eig[..., 1])
+        peak = big[disc].max() if disc.any() else 0.0
+        if peak <= 0:
+            return None
+        score = np.where(disc & (small > CORNER_RATIO * big) & (big > CORNER_FLOOR * peak), small, 0)
+        if not score.any():
+            return None
+        cy, cx = np.unravel_index(int(np.argmax(score)), score.shape)
+        return int(cx), int(cy)
+
+    @staticmethod
+    def _refine_corner(gray, ex, ey):
+        corners = np.array([[[ex, ey]]], np.float32)
+        criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 20, 0.01)
+        cv2.cornerSubPix(gray, corners, (3, 3), (-1, -1), criteria)
+        cx, cy = corners[0, 0].tolist()
+        # 细化后偏离过远说明收敛到了别的结构，保留整数边缘点
+        if abs(cx - ex) > 3 or abs(cy - ey) > 3:
+            return float(ex), float(ey)
+        return cx, cy
+
+    @staticmethod
+    def _refine_edge(gx, gy, ex, ey):
+        """沿梯度方向对梯度幅值做三点抛物线拟合"""
+        vx, vy = float(gx[ey, ex]), float(gy[ey, ex])
+        norm = (vx * vx + vy * vy) ** 0.5
+        if norm == 0:
+            return float(ex), float(ey)
+        nx, ny = vx / norm, vy / norm
+        mag = cv2.magnitude(gx, gy)
+
+        def sample(px, py):
+            return float(cv2.getRectSubPix(mag, (1, 1), (px, py))[0, 0])
+
+        m0 = float(mag[ey, ex])
+        m_minus = sample(ex - nx, ey - ny)
+        m_plus = sample(ex + nx, ey + ny)
+        denom = m_minus - 2 * m0 + m_plus
+        if denom >= 0:
+            return float(ex), float(ey)
+        offset = max(-0.5, min(0.5, 0.5 * (m_minus - m_plus) / denom))
+        return ex + offset * nx, ey + offset * ny
@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+"""
+区域坐标的流式导出 (当前图像或整个数据集)。
+
+    stats = export([(图像路径, GeometryStore 或 (区域表, 坐标)), ...], "coords.csv")
+
+按扩展名选择格式:
+  .csv / .txt  每个顶点一行: 图像, 区域, 用途, 类型, 序号, X, Y, 半径 (圆只导出圆心一行)；
+               区域与序号从 1 开始，坐标保留 DECIMALS 位小数并去掉末尾的 0
+  .npz         二进制列存储 (不压缩): images 为图像路径，vertices 为结构化数组 (字段见 vertex_dtype)，
+               image 为 images 中的下标，多边形顶点的 radius 为 NaN；
+               np.load(fn)["vertices"]["x"] 即取出一列
+  .dxf         AutoCAD R12 DXF：多边形为闭合 POLYLINE，圆为 CIRCLE，图层 TEMPLATE / EXCLUDE。
+               HALCON 的 read_contour_xld_dxf 直接读为 XLD 轮廓 (DXF 的 x / y 即列 / 行坐标)，
+               再用 gen_region_contour_xld 得到区域。多幅图像时 fn 作为目录，每幅图像一个 <图像名>.dxf
+
+顶点按 CHUNK_VERTICES 个一段处理：每段的各列先格式化为字节矩阵 (数字逐位计算，文字查表，
+空位填 0 字节)，横向拼接后一次去掉填充字节写出，没有逐顶点的 Python 循环。
+内存占用只与分段大小有关；项目文件中的区域通过内存映射读取，不整体复制。
+
+    python coord_export.py project.hproj coords.npz
+"""
+import os
+import sys
+import zipfile
+import argparse
+from functools import lru_cache
+from pathlib import Path
+
+from app_config import lazy_import
+from geometry import GeometryStore, CIRCLE
+
+# 延迟导入：首次使用时才加载 NumPy
+np = lazy_import("numpy")
+
+# 每段处理的顶点数 (文本格式每段约占 CHUNK_VERTICES * 100 字节)
+CHUNK_VERTICES = 1 << 18
+# 文本格式的坐标小数位数
+DECIMALS = 3
+HEADER = ("图像", "区域", "用途", "类型", "序号", "X坐标", "Y坐标", "半径")
+ROLE_LABELS = ("模板区域", "排除区域")
+KIND_LABELS = ("多边形", "圆")
+DXF_LAYERS = ("TEMPLATE", "EXCLUDE")
+FORMATS = {".csv": "csv", ".txt": "txt", ".npz": "npz", ".dxf": "dxf"}
+
+_ZERO = ord("0")
+
+
+@lru_cache(maxsize=1)
+def vertex_dtype():
+    return np.dtype([
+        ("image", np.uint32),
+        ("roi", np.uint32),
+        ("role", np.uint8),
+        ("kind", np.uint8),
+        ("seq", np.uint32),
+        ("x", np.float64),
+        ("y", np.float64),
+        ("radius", np.float64),
+    ])
+
+
+# —— 一、按列格式化为字节矩阵 (0 字节为填充，拼接后统一去掉)
+def _table(texts):
+    """字符串 -> (k, w) 字节矩阵，右侧以 0 填充 (UTF-8 文本中不会出现 0 字节)"""
+    data = [text.encode("utf-8") for text in texts]
+    table = np.zeros((len(data), max(1, *map(len, data))), np.uint8)
+    for i, b in enumerate(data):
+        table[i, :len(b)] = np.frombuffer(b, np.uint8)
+    return table
+
+
+def _const(text, n):
+    return np.broadcast_to(_table([text]), (n, max(1, len(text.encode("utf-8")))))
+
+
+def _digits(v, width):
+    """非负整数 -> (n, width) 的十进制数字，右对齐，高位补 '0'"""
+    out = np.empty((len(v), width), np.uint8)
+    for k in range(width - 1, -1, -1):
+        v, d = np.divmod(v, 10)
+        out[:, k] = d
+    out += _ZERO
+    return out
+
+
+def _ints(v):
+    """非负整数列，去掉高位的 0"""
+    v = np.asarray(v, np.int64)
+    width = len(str(int(v.max()))) if len(v) else 1
+    out = _digits(v, width)
+    for k in range(width - 1):
+        out[v < 10 ** (width - 1 - k), k] = 0
+    return out
+
+
+def _fixed(x, decimals, present=None):
+    """浮点列保留 decimals 位小数并去掉小数末尾的 0；present 为 False 的行为空"""
+    x = np.asarray(x, np.float64)
+    scale = 10 ** decimals
+    q = np.rint(np.abs(x) * scale).astype(np.int64)
+    whole, frac = np.divmod(q, scale)
+    sign = np.where((x < 0) & (q > 0), ord("-"), 0).astype(np.uint8)[:, None]
+    fields = [sign, _ints(whole)]
+    if decimals:
+        digits = _digits(frac, decimals)
+        for k in range(decimals):
+            digits[frac % 10 ** (decimals - k) == 0, k] = 0
+        dot = np.where(frac == 0, 0, ord(".")).astype(np.uint8)[:, None]
+        fields += [dot, digits]
+    out = np.concatenate(fields, axis=1)
+    if present is not None:
+        out[~present] = 0
+    return out
+
+
+def _join(fields):
+    """各列横向拼接为行，去掉填充字节"""
+    rows = np.concatenate(fields, axis=1).ravel()
+    return rows[rows != 0].tobytes()
+
+
+# —— 二、区域来源
+def _arrays(item):
+    """GeometryStore 或 (区域表, 坐标) -> 按区域顺序排列的 (区域表, (m, 2) 坐标)"""
+    if isinstance(item, GeometryStore):
+        return item.packed()
+    rois, coords = item
+    return rois, np.asarray(coords).reshape(-1, 2)
+
+
+def _counts(item):
+    """(区域数, 顶点数)，不复制坐标"""
+    rois = item.rois if isinstance(item, GeometryStore) else item[0]
+    return len(rois), int(rois["count"].sum())
+
+
+def _chunks(rois, coords, chunk):
+    """按 chunk 个顶点分段: (区域下标, 区域内序号 (从 0 起), 是否该区域的末顶点, 坐标)"""
+    counts = rois["count"].astype(np.int64)
+    ends = np.cumsum(counts)
+    total = int(ends[-1]) if len(ends) else 0
+    for a in range(0, total, chunk):
+        idx = np.arange(a, min(a + chunk, total))
+        roi = np.searchsorted(ends, idx, side="right")
+        yield roi, idx - (ends[roi] - counts[roi]), idx == ends[roi] - 1, coords[a:a + len(idx)]
+
+
+def dataset_sources(annotations, project=None):
+    """
+    整个数据集的区域来源 [(图像路径, 区域)]：会话中打开过的图像用内存中的存储 (含未保存的修改)，
+    其余已标注的图像直接映射项目文件中的数据。没有区域的图像不导出。
+    """
+    sources, seen = [], set()
+    for path, store in annotations.items():
+        seen.add(os.path.normcase(os.path.abspath(path)))
+        if len(store):
+            sources.append((path, store))
+    if project is not None:
+        for path in project.annotated():
+            if os.path.normcase(os.path.abspath(path)) in seen:
+                continue
+            arrays = project.arrays(path)
+            if arrays is not None and len(arrays[0]):
+                sources.append((path, arrays))
+    return sources
+
+
+# —— 三、各格式的写出
+def _csv_field(text):
+    if any(c in text for c in ',"\r\n'):
+        return '"' + text.replace('"', '""') + '"'
+    return text
+
+
+def write_table(f, sources, sep=",", decimals=DECIMALS, chunk=CHUNK_VERTICES):
+    """CSV (sep=",") / TXT (sep="\\t")；f 为二进制文件"""
+    roles, kinds = _table(ROLE_LABELS), _table(KIND_LABELS)
+    f.write((sep.join(HEADER) + "\n").encode("utf-8"))
+    for path, item in sources:
+        name = _csv_field(str(path)) if sep == "," else str(path).replace(sep, " ")
+        rois, coords = _arrays(item)
+        for roi, seq, _, xy in _chunks(rois, coords, chunk):
+            n = len(roi)
+            s = _const(sep, n)
+            kind = rois["kind"][roi]
+            f.write(_join([
+                _const(name + sep, n), _ints(roi + 1), s, roles[rois["role"][roi]], s, kinds[kind], s,
+                _ints(seq + 1), s, _fixed(xy[:, 0], decimals), s, _fixed(xy[:, 1], decimals), s,
+                _fixed(rois["r1"][roi], decimals, kind == CIRCLE), _const("\n", n),
+            ]))
+
+
+def write_npz(fn, sources, chunk=CHUNK_VERTICES):
+    """images.npy + vertices.npy；先由区域表求出总顶点数写入数组头，再逐段写入数据"""
+    dtype = vertex_dtype()
+    total = sum(_counts(item)[1] for _, item in sources)
+    header = {"descr": np.lib.format.dtype_to_descr(dtype), "fortran_order": False, "shape": (total,)}
+    with zipfile.ZipFile(fn, "w", zipfile.ZIP_STORED, allowZip64=True) as zf:
+        with zf.open("images.npy", "w") as f:
+            np.lib.format.write_array(f, np.array([str(path) for path, _ in sources], dtype=str))
+        with zf.open("vertices.npy", "w", force_zip64=True) as f:
+            np.lib.format.write_array_header_1_0(f, header)
+            for i, (_, item) in enumerate(sources):
+                rois, coords = _arrays(item)
+                for roi, seq, _, xy in _chunks(rois, coords, chunk):
+                    rec = np.empty(len(roi), dtype)
+                    rec["image"] = i
+                    rec["roi"] = roi + 1
+                    rec["role"] = rois["role"][roi]
+                    rec["kind"] = kind = rois["kind"][roi]
+                    rec["seq"] = seq + 1
+                    rec["x"] = xy[:, 0]
+                    rec["y"] = xy[:, 1]
+                    rec["radius"] = np.where(kind == CIRCLE, rois["r1"][roi], np.nan)
+                    f.write(rec.tobytes())
+
+
+def write_dxf(f, rois, coords, decimals=DECIMALS, chunk=CHUNK_VERTICES):
+    """一幅图像的区域写为 R12 DXF 的 ENTITIES 段；f 为二进制文件"""
+    layers = [f"8\n{layer}\n" for layer in DXF_LAYERS]
+    heads = _table([""] + [f"0\nPOLYLINE\n{layer}66\n1\n10\n0.0\n20\n0.0\n30\n0.0\n70\n1\n" for layer in layers])
+    entities = _table([f"0\n{name}\n{layer}10\n" for name in ("VERTEX", "CIRCLE") for layer in layers])
+    tails = _table([""] + [f"0\nSEQEND\n{layer}" for layer in layers])
+    radius_tag, newline = _table(["", "40\n"]), _table(["", "\n"])
+    f.write(b"0\nSECTION\n2\nENTITIES\n")
+    for roi, seq, last, xy in _chunks(rois, coords, chunk):
+        n = len(roi)
+        kind, role = rois["kind"][roi].astype(np.intp), rois["role"][roi].astype(np.intp)
+        polygon = kind != CIRCLE
+        f.write(_join([
+            heads[np.where(polygon & (seq == 0), role + 1, 0)], entities[kind * 2 + role],
+            _fixed(xy[:, 0], decimals), _const("\n20\n", n), _fixed(xy[:, 1], decimals), _const("\n", n),
+            radius_tag[kind], _fixed(rois["r1"][roi], decimals, ~polygon), newline[kind],
+            tails[np.where(polygon & last, role + 1, 0)],
+        ]))
+    f.write(b"0\nENDSEC\n0\nEOF\n")
+
+
+def export(sources, fn, decimals=DECIMALS, chunk=CHUNK_VERTICES):
+    """
+    按扩展名导出 sources，返回 {"images", "rois", "vertices", "files", "bytes"}。
+    DXF 导出多幅图像时 fn 去掉扩展名作为目录。
+    """
+    fmt = FORMATS.get(Path(fn).suffix.lower())
+    if fmt is None:
+        raise ValueError(f"不支持的导出格式: {Path(fn).suffix or fn}")
+    files = []
+    if fmt in ("csv", "txt"):
+        with open(fn, "wb") as f:
+            write_table(f, sources, "," if fmt == "csv" else "\t", decimals, chunk)
+        files.append(fn)
+    elif fmt == "npz":
+        write_npz(fn, sources, chunk)
+        files.append(fn)
+    else:
+        folder = None if len(sources) == 1 else Path(fn).with_suffix("")
+        if folder is not None:
+            folder.mkdir(parents=True, exist_ok=True)
+        stems = set()
+        for path, item in sources:
+            target = fn
+            if folder is not None:
+                stem = Path(path).stem
+                if stem in stems:
+                    stem = f"{stem}_{len(stems)}"
+                stems.add(stem)
+                target = str(folder / f"{stem}.dxf")
+            with open(target, "wb") as f:
+                write_dxf(f, *_arrays(item), decimals, chunk)
+            files.append(target)
+
+    counts = [_counts(item) for _, item in sources]
+    return {
+        "images": len(sources),
+        "rois": sum(c[0] for c in counts),
+        "vertices": sum(c[1] for c in counts),
+        "files": files,
+        "bytes": sum(os.path.getsize(p) for p in files),
+    }
+
+
+def main(argv=None):
+    from project_file import ProjectFile
+
+    parser = argparse.ArgumentParser(description="导出项目文件中全部图像的区域坐标")
+    parser.add_argument("project", help="项目文件 (.hproj)")
+    parser.add_argument("output", help="输出文件: .csv / .txt / .npz / .dxf")
+    parser.add_argument("--decimals", type=int, default=DECIMALS, help="文本格式的坐标小数位数")
+    args = parser.parse_args(argv)
+
+    try:
+        project = ProjectFile(args.project)
+    except (OSError, ValueError) as e:
+        print(f"无法打开项目文件: {e}", file=sys.stderr)
+        return 1
+    try:
+        stats = export(dataset_sources({}, project), args.output, args.decimals)
+    finally:
+        project.close()
+    print(f"已导出 {stats['images']} 幅图像、{stats['rois']} 个区域、{stats['vertices']} 个顶点 "
+          f"({stats['bytes'] / 1048576:.1f} MB): {', '.join(map(str, stats['files']))}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
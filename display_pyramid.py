@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+"""
+大图显示用的多分辨率金字塔与瓦片缓存。
+
+缩放时只渲染视口内、最接近当前缩放比例的金字塔层级上的瓦片，
+较粗的层级也只在瓦片第一次被显示时才生成，缩放/平移与整幅刷新的开销都与原图尺寸无关。
+"""
+import math
+from collections import OrderedDict
+
+from PyQt5 import QtGui, sip
+
+from app_config import lazy_import
+from image_io import is_memmap
+
+# 延迟导入：首次使用时才加载 OpenCV / NumPy
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+
+TILE_SIZE = 512
+
+
+class ImagePyramid:
+    """
+    多分辨率图像金字塔，levels[0] 为原图，之后每级缩小一半 (宽高向上取整)。
+    除源层级 (原图与预览) 外，各层级都按瓦片延迟生成：某个瓦片第一次被显示时
+    才由上一级对应的 2x2 区域缩小得到，因此包装一幅新图像不需要任何缩放。
+    由预览构建时，比预览更精细的层级首次需要时通过 loader 加载原图生成，
+    更粗的层级由预览生成。
+    """
+
+    def __init__(self, image, min_size=TILE_SIZE):
+        self.size = (image.shape[1], image.shape[0])
+        self.loader = None
+        self.base_level = 0
+        self._setup(image, 0, min_size)
+
+    @classmethod
+    def from_preview(cls, preview, factor, size, loader, min_size=TILE_SIZE):
+        """preview 为原图 (宽高 size) 缩小 factor 倍 (2 的幂) 的图像"""
+        pyramid = cls.__new__(cls)
+        pyramid.size = tuple(size)
+        pyramid.loader = loader
+        pyramid.base_level = int(round(math.log2(factor)))
+        pyramid._setup(preview, pyramid.base_level, min_size)
+        return pyramid
+
+    @classmethod
+    def from_lazy(cls, lazy, min_size=TILE_SIZE):
+        """由 image_io.LazyImage 构建：只使用预览，原图按需加载"""
+        preview, factor = lazy.preview()
+        if factor == 1:
+            return cls(preview, min_size)
+        return cls.from_preview(preview, factor, lazy.size, lazy.full, min_size)
+
+    def _setup(self, source, base, min_size):
+        """各层级的尺寸；base 层级为 source，其余层级 (除原图外) 延迟生成"""
+        w, h = self.size
+        self.shapes = [(h, w)]
+        while max(self.shapes[-1]) > min_size or len(self.shapes) <= base:
+            h, w = self.shapes[-1]
+            self.shapes.append(((h + 1) // 2, (w + 1) // 2))
+        self.shapes[base] = source.shape[:2]
+        self._pixel = (source.shape[2:], source.dtype)
+        self.levels = [None] * len(self.shapes)
+        self.levels[base] = source
+        self._ready = {}    # 延迟层级 -> 瓦片是否已生成 (行, 列) 布尔数组
+
+    def _is_source(self, level):
+        return level == 0 or level == self.base_level
+
+    def release(self):
+        """丢弃由原图生成的精细层级 (之后需要时重新加载)"""
+        if self.loader is not None:
+            for i in range(self.base_level):
+                self.levels[i] = None
+                self._ready.pop(i, None)
+
+    def ensure_level(self, level):
+        """确保层级可用；比预览更精细时加载原图 (该层级的瓦片仍在显示时才生成)"""
+        if level < self.base_level and self.levels[0] is None:
+            self.levels[0] = self.loader()
+
+    def level_shape(self, level):
+        """层级的 (高, 宽)"""
+        return self.shapes[level]
+
+    def _tiles(self, level):
+        """延迟层级的瓦片状态；首次使用时分配层级缓冲区 (未写入的页不占内存)"""
+        ready = self._ready.get(level)
+        if ready is None:
+            h, w = self.shapes[level]
+            channels, dtype = self._pixel
+            self.levels[level] = np.empty((h, w) + channels, dtype)
+            ready = np.zeros((-(-h // TILE_SIZE), -(-w // TILE_SIZE)), bool)
+            self._ready[level] = ready
+        return ready
+
+    def _ensure_rect(self, level, x0, y0, x1, y1):
+        """保证层级 level 上 [x0, x1) x [y0, y1) 已生成 (逐瓦片，从上一级缩小)"""
+        if self._is_source(level):
+            self.ensure_level(level)
+            return
+        ready = self._tiles(level)
+        h, w = self.shapes[level]
+        prev_h, prev_w = self.shapes[level - 1]
+        for ty in range(y0 // TILE_SIZE, (y1 - 1) // TILE_SIZE + 1):
+            for tx in range(x0 // TILE_SIZE, (x1 - 1) // TILE_SIZE + 1):
+                if ready[ty, tx]:
+                    continue
+                a0, b0 = tx * TILE_SIZE, ty * TILE_SIZE
+                a1, b1 = min(a0 + TILE_SIZE, w), min(b0 + TILE_SIZE, h)
+                sx1, sy1 = min(2 * a1, prev_w), min(2 * b1, prev_h)
+                self._ensure_rect(level - 1, 2 * a0, 2 * b0, sx1, sy1)
+                src = self.levels[level - 1][2 * b0:sy1, 2 * a0:sx1]
+                self.levels[level][b0:b1, a0:a1] = cv2.resize(src, (a1 - a0, b1 - b0),
+                                                               interpolation=cv2.INTER_AREA)
+                ready[ty, tx] = True
+
+    def tile(self, level, tx, ty):
+        """层级 level 的瓦片 (tx, ty) 的像素 (视图)，需要时先生成"""
+        h, w = self.shapes[level]
+        x0, y0 = tx * TILE_SIZE, ty * TILE_SIZE
+        x1, y1 = min(x0 + TILE_SIZE, w), min(y0 + TILE_SIZE, h)
+        self._ensure_rect(level, x0, y0, x1, y1)
+        return self.levels[level][y0:y1, x0:x1]
+
+    @property
+    def nbytes(self):
+        """已生成像素占用的内存 (内存映射的原图不计入，延迟层级只计已生成的瓦片)"""
+        total = 0
+        for level, data in enumerate(self.levels):
+            if data is None or is_memmap(data):
+                continue
+            ready = self._ready.get(level)
+            if ready is None:
+                total += data.nbytes
+            elif ready.any():
+                total += data.nbytes * int(ready.sum()) // ready.size
+        return total
+
+    @property
+    def width(self):
+        return self.size[0]
+
+    @property
+    def height(self):
+        return self.size[1]
+
+    def level_for_zoom(self, zoom):
+        """选择分辨率不低于显示分辨率的最小层级"""
+        if zoom >= 1.0:
+            return 0
+        level = int(math.floor(math.log2(1.0 / zoom)))
+        return min(level, len(self.shapes) - 1)
+
+    def level_scale(self, level):
+        """层级坐标 = 原图坐标 * level_scale"""
+        return self.shapes[level][1] / self.width
+
+    def update_region(self, x, y, w, h):
+        """
+        levels[0] 的 (x, y, w, h) 区域已被原地修改后调用，返回每级受影响的矩形列表。
+        已生成的瓦片只重算受影响的区域；上一级未重算 (或本级有未生成瓦片) 时
+        把受影响的瓦片标记为未生成，下次显示时再由上一级生成。
+        """
+        x0, y0 = max(0, x), max(0, y)
+        x1, y1 = min(self.width, x + w), min(self.height, y + h)
+        dirty = [(x0, y0, x1 - x0, y1 - y0)]
+        current = True   # 上一级的受影响区域已是最新
+        for level in range(1, len(self.shapes)):
+            cur_h, cur_w = self.shapes[level]
+            x0, y0 = x0 // 2, y0 // 2
+            x1, y1 = min(cur_w, (x1 + 1) // 2), min(cur_h, (y1 + 1) // 2)
+            if x1 <= x0 or y1 <= y0:
+                break
+            dirty.append((x0, y0, x1 - x0, y1 - y0))
+            if level == self.base_level:
+                # 预览不能延迟重建：先补齐上一级的受影响区域再重算
+                prev_h, prev_w = self.shapes[level - 1]
+                self._ensure_rect(level - 1, 2 * x0, 2 * y0, min(2 * x1, prev_w), min(2 * y1, prev_h))
+                current = True
+            else:
+                ready = self._ready.get(level)
+                if ready is None:
+                    current = False
+                    continue
+                tiles = ready[y0 // TILE_SIZE:(y1 - 1) // TILE_SIZE + 1,
+                              x0 // TILE_SIZE:(x1 - 1) // TILE_SIZE + 1]
+                if not (current and tiles.all()):
+                    tiles[:] = False
+                    current = False
+                    continue
+            prev, cur = self.levels[level - 1], self.levels[level]
+            src = prev[2 * y0:min(2 * y1, prev.shape[0]), 2 * x0:min(2 * x1, prev.shape[1])]
+            cur[y0:y1, x0:x1] = cv2.resize(src, (x1 - x0, y1 - y0), interpolation=cv2.INTER_AREA)
+        return dirty
+
+
+# Qt 5.14 起支持 BGR888，可直接包装 OpenCV 缓冲区而无需 cvtColor
+HAS_BGR888 = hasattr(QtGui.QImage, "Format_BGR888")
+
+
+def numpy_to_qimage(arr):
+    """
+    把 OpenCV 图像 (BGR 或灰度) 包装为 QImage，不复制像素数据。
+    arr 可以是大图的切片视图 (行跨度由 strides 给出)；
+    返回的 QImage 持有 arr 的引用，保证缓冲区在其生命周期内有效。
+    """
+    packed = arr.dtype == np.uint8 and arr.strides[-1] == 1 and (arr.ndim == 2 or arr.strides[1] == arr.shape[2])
+    if not packed:
+        arr = np.ascontiguousarray(arr, dtype=np.uint8)
+    if arr.ndim == 2:
+        fmt = QtGui.QImage.Format_Grayscale8
+    elif HAS_BGR888:
+        fmt = QtGui.QImage.Format_BGR888
+    else:
+        arr = cv2.cvtColor(arr, cv2.COLOR_BGR2RGB)
+        fmt = QtGui.QImage.Format_RGB888
+    h, w = arr.shape[:2]
+    qimg = QtGui.QImage(sip.voidptr(arr.ctypes.data), w, h, arr.strides[0], fmt)
+    qimg._numpy_ref = arr
+    return qimg
+
+
+def numpy_to_qpixmap(arr):
+    """
+    把 OpenCV 图像上传为 QPixmap。彩色图先 cvtColor 为 RGB888：光栅后端可直接使用
+    RGB888，而 BGR888 会在 fromImage 中逐像素转换为 RGB32，慢数倍。
+    """
+    if arr.ndim == 3 and arr.dtype == np.uint8 and arr.shape[2] == 3:
+        rgb = cv2.cvtColor(arr, cv2.COLOR_BGR2RGB)
+        h, w = rgb.shape[:2]
+        qimg = QtGui.QImage(sip.voidptr(rgb.ctypes.data), w, h, rgb.strides[0], QtGui.QImage.Format_RGB888)
+        return QtGui.QPixmap.fromImage(qimg)
+    return QtGui.QPixmap.fromImage(numpy_to_qimage(arr))
+
+
+class TileCache:
+    """按 (层级, 列, 行) 缓存瓦片 QPixmap，超出容量时按 LRU 淘汰"""
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._tiles = OrderedDict()
+        self._bytes = 0
+        self.uploaded_bytes = 0   # 累计上传到 QPixmap 的字节数 (用于基准测试)
+
+    def clear(self):
+        self._tiles.clear()
+        self._bytes = 0
+
+    def invalidate(self, level, x, y, w, h):
+        """丢弃与层级 level 上 (x, y, w, h) 相交的瓦片，下次绘制时重新上传"""
+        tx0, ty0 = x // TILE_SIZE, y // TILE_SIZE
+        tx1, ty1 = (x + w - 1) // TILE_SIZE, (y + h - 1) // TILE_SIZE
+        for ty in range(ty0, ty1 + 1):
+            for tx in range(tx0, tx1 + 1):
+                entry = self._tiles.pop((level, tx, ty), None)
+                if entry is not None:
+                    self._bytes -= entry[1]
+
+    def get(self, pyramid, level, tx, ty):
+        """返回瓦片 QPixmap，未缓存时从金字塔层级切片生成"""
+        key = (level, tx, ty)
+        entry = self._tiles.get(key)
+        if entry is not None:
+            self._tiles.move_to_end(key)
+            return entry[0]
+
+        tile = pyramid.tile(level, tx, ty)
+        pix = numpy_to_qpixmap(tile)
+        self._tiles[key] = (pix, tile.nbytes)
+        self._bytes += tile.nbytes
+        self.uploaded_bytes += tile.nbytes
+        while self._bytes > self.max_bytes and len(self._tiles) > 1:
+            _, (_, nbytes) = self._tiles.popitem(last=False)
+            self._bytes -= nbytes
+        return pix
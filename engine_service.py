@@ -0,0 +1,349 @@
+# -*- coding: utf-8 -*-
+"""
+常驻模板引擎服务。
+
+服务进程只加载一次引擎 (CLR + DLL + 反射解析 CreateTemplate) 并保持热状态，
+GUI 与批处理客户端通过本地套接字/命名管道提交批量请求。
+
+    python engine_service.py serve --engine auto     # 启动服务 (--cache DIR 启用模板结果缓存)
+    python engine_service.py ping                    # 检查服务
+    python engine_service.py stats                   # 查看统计
+    python engine_service.py stop                    # 停止服务
+
+客户端使用 create_engine("remote") 或 EngineClient。
+
+消息经 pickle 传递，只有持有认证密钥的进程才能连接：密钥取自环境变量 HALCON_ENGINE_AUTHKEY，
+未设置时使用当前用户的密钥文件 (AUTHKEY_FILE，首次使用时随机生成，权限 0600)。
+Unix 套接字按用户命名并只允许所有者访问；Windows 命名管道按用户命名，
+其默认安全描述符只允许创建者、管理员与 SYSTEM 以读写方式连接。
+"""
+import os
+import sys
+import stat
+import time
+import secrets
+import argparse
+import tempfile
+import threading
+from pathlib import Path
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener, Client
+
+from app_config import load_config
+from template_engine import TemplateEngine, create_engine
+from template_cache import TemplateCache, CachedTemplateEngine
+
+if sys.platform == "win32":
+    DEFAULT_ADDRESS = r"\\.\pipe\halcon_template_engine_" + os.environ.get("USERNAME", "user")
+else:
+    DEFAULT_ADDRESS = os.path.join(tempfile.gettempdir(), f"halcon_template_engine_{os.getuid()}.sock")
+AUTHKEY_FILE = Path.home() / ".halcon_template_engine.key"
+
+
+def default_authkey(path=AUTHKEY_FILE, create=True):
+    """
+    HALCON_ENGINE_AUTHKEY，未设置时读取当前用户的密钥文件。
+    文件不存在时 create 为真则生成 (服务端)，否则返回 None (客户端：服务不可能在运行)。
+    """
+    env = os.environ.get("HALCON_ENGINE_AUTHKEY")
+    if env:
+        return env.encode()
+    path = Path(path)
+    if not create and not path.exists():
+        return None
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        if sys.platform != "win32" and path.stat().st_mode & (stat.S_IRWXG | stat.S_IRWXO):
+            raise RuntimeError(f"密钥文件可被其他用户访问，请将权限改为 0600: {path}")
+        key = path.read_text(encoding="ascii").strip()
+        if not key:
+            raise RuntimeError(f"密钥文件为空: {path}")
+        return key.encode()
+    key = secrets.token_hex(32)
+    with os.fdopen(fd, "w", encoding="ascii") as f:
+        f.write(key)
+    return key.encode()
+
+
+class EngineServer:
+    """在本地地址上监听，逐个执行批量模板请求 (引擎调用串行化)"""
+
+    def __init__(self, engine, address=DEFAULT_ADDRESS, authkey=None):
+        self.engine = engine
+        self.address = address
+        self.authkey = authkey or default_authkey()
+        self.started = time.time()
+        self.load_seconds = 0.0
+        self.served = 0
+        self.failed = 0
+        self._engine_lock = threading.Lock()
+        self._stats_lock = threading.Lock()  # 各连接线程共同更新 served / failed
+        self._listener = None
+        self._stopping = False
+
+    def warm_up(self):
+        """预先加载引擎，使第一个请求不再承担加载开销"""
+        start = time.perf_counter()
+        load = getattr(self.engine, "load", None)
+        if load is not None:
+            load()
+        self.load_seconds = time.perf_counter() - start
+
+    def process(self, requests):
+        """执行一批请求，返回与请求一一对应的结果"""
+        results = []
+        for request in requests:
+            start = time.perf_counter()
+            result = {"output": request.output_prefix}
+            try:
+                with self._engine_lock:
+                    result["artifacts"] = self.engine.create_template(request)
+                result["ok"] = True
+            except Exception as e:
+                result["ok"] = False
+                result["error"] = f"{type(e).__name__}: {e}"
+            result["seconds"] = time.perf_counter() - start
+            with self._stats_lock:
+                self.served += 1
+                self.failed += not result["ok"]
+            results.append(result)
+        return results
+
+    def stats(self):
+        with self._stats_lock:
+            served, failed = self.served, self.failed
+        return {
+            "engine": self.engine.name,
+            "uptime": time.time() - self.started,
+            "load_seconds": self.load_seconds,
+            "served": served,
+            "failed": failed,
+            **({"cache": self.engine.cache.stats()} if isinstance(self.engine, CachedTemplateEngine) else {}),
+        }
+
+    def handle(self, conn):
+        """处理一个客户端连接上的全部消息"""
+        with conn:
+            while True:
+                try:
+                    msg = conn.recv()
+                except (EOFError, OSError):
+                    return
+                op = msg.get("op")
+                if op == "create":
+                    conn.send({"ok": True, "results": self.process(msg["requests"])})
+                elif op == "ping":
+                    conn.send({"ok": True})
+                elif op == "stats":
+                    conn.send({"ok": True, "stats": self.stats()})
+                elif op == "shutdown":
+                    conn.send({"ok": True})
+                    self.stop()
+                    return
+                else:
+                    conn.send({"ok": False, "error": f"未知操作: {op}"})
+
+    def listen(self):
+        """开始监听；地址被占用时抛出 RuntimeError"""
+        _remove_stale_socket(self.address, self.authkey)
+        self._listener = _listen(self.address, self.authkey)
+
+    def serve_forever(self):
+        if self._listener is None:
+            self.listen()
+        try:
+            while not self._stopping:
+                try:
+                    conn = self._listener.accept()
+                except (OSError, EOFError, AuthenticationError):
+                    if self._stopping:
+                        break
+                    continue  # 认证失败等单个连接错误
+                threading.Thread(target=self.handle, args=(conn,), daemon=True).start()
+        finally:
+            self._listener.close()
+
+    def stop(self):
+        self._stopping = True
+        # 连接一次以唤醒阻塞中的 accept
+        try:
+            Client(self.address, authkey=self.authkey).close()
+        except (OSError, EOFError):
+            pass
+
+
+def _listen(address, authkey):
+    """创建监听；Unix 套接字文件在创建时即只允许所有者访问 (避免 bind 与 chmod 之间的窗口)"""
+    if sys.platform == "win32":
+        return Listener(address, authkey=authkey)
+    umask = os.umask(0o177)
+    try:
+        listener = Listener(address, authkey=authkey)
+    finally:
+        os.umask(umask)
+    os.chmod(address, 0o600)
+    return listener
+
+
+def _remove_stale_socket(address, authkey):
+    """清理上次异常退出留下的 Unix 套接字文件"""
+    if sys.platform == "win32" or not os.path.exists(address):
+        return
+    try:
+        Client(address, authkey=authkey).close()
+    except AuthenticationError:
+        # 有进程在监听但密钥不同：不是本用户的服务，不能删除
+        raise RuntimeError(f"地址已被其他所有者的服务占用: {address}")
+    except (OSError, EOFError):
+        os.unlink(address)
+    else:
+        raise RuntimeError(f"引擎服务已在运行: {address}")
+
+
+class EngineClient:
+    """引擎服务客户端，保持一个连接；连接断开时自动重连一次"""
+
+    def __init__(self, address=DEFAULT_ADDRESS, authkey=None):
+        self.address = address
+        self.authkey = authkey    # None: 首次连接时读取默认密钥 (构造时不访问文件)
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self.authkey is None:
+            key = default_authkey(create=False)
+            if key is None:
+                raise FileNotFoundError(f"引擎服务密钥文件不存在 (服务未启动过): {AUTHKEY_FILE}")
+            self.authkey = key
+        return Client(self.address, authkey=self.authkey)
+
+    def _call(self, msg):
+        with self._lock:
+            for attempt in (0, 1):
+                if self._conn is None:
+                    self._conn = self._connect()
+                try:
+                    self._conn.send(msg)
+                    reply = self._conn.recv()
+                    break
+                except (EOFError, OSError):
+                    self._conn.close()
+                    self._conn = None
+                    if attempt:
+                        raise
+        if not reply.get("ok"):
+            raise RuntimeError(reply.get("error", "引擎服务返回错误"))
+        return reply
+
+    def ping(self):
+        """服务可用时返回 True (不抛出异常)"""
+        try:
+            self._call({"op": "ping"})
+            return True
+        except (OSError, EOFError, AuthenticationError, RuntimeError):
+            return False
+
+    def stats(self):
+        return self._call({"op": "stats"})["stats"]
+
+    def create_templates(self, requests):
+        """批量提交 TemplateRequest，返回逐条结果"""
+        return self._call({"op": "create", "requests": list(requests)})["results"]
+
+    def shutdown(self):
+        self._call({"op": "shutdown"})
+        self.close()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class RemoteTemplateEngine(TemplateEngine):
+    """通过常驻服务执行的模板引擎，接口与本地引擎一致"""
+    name = "remote"
+
+    def __init__(self, address=DEFAULT_ADDRESS, authkey=None):
+        self.client = EngineClient(address, authkey)
+        self._fixed_regions = None
+
+    def available(self):
+        return self.client.ping()
+
+    @property
+    def fixed_regions(self):
+        """服务端引擎是否只接受固定参数的区域 (查询成功后缓存)；无法查询时按 .NET 引擎处理"""
+        if self._fixed_regions is None:
+            try:
+                self._fixed_regions = self.client.stats()["engine"] == "dotnet"
+            except (OSError, EOFError, AuthenticationError, RuntimeError):
+                return True
+        return self._fixed_regions
+
+    def create_templates(self, requests):
+        return self.client.create_templates(requests)
+
+    def create_template(self, request):
+        result = self.client.create_templates([request])[0]
+        if not result["ok"]:
+            raise RuntimeError(result["error"])
+        return result["artifacts"]
+
+    def cache_params(self):
+        # 服务端使用哪个引擎由服务决定，按服务地址区分
+        return {"address": str(self.client.address)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="常驻模板引擎服务")
+    parser.add_argument("command", choices=("serve", "ping", "stats", "stop"))
+    parser.add_argument("--engine", help="服务使用的引擎 (默认取自配置，配置为 auto/remote 时为 auto)")
+    parser.add_argument("--address", help="服务地址 (默认取自配置)")
+    parser.add_argument("--cache", help="模板结果缓存目录 (默认不缓存)")
+    parser.add_argument("--cache-mb", type=float, help="缓存容量上限 (MB，默认取自配置)")
+    args = parser.parse_args(argv)
+
+    # DLL 路径与服务地址取自 halcon_config.json 与环境变量，命令行参数优先
+    try:
+        cfg = load_config()
+    except (OSError, ValueError) as e:
+        parser.error(f"读取配置失败: {e}")
+    address = args.address or cfg.service_address or DEFAULT_ADDRESS
+    if args.command == "serve":
+        # 配置中的 auto/remote 是界面的选择 (先找服务)，服务自身只能在本进程加载引擎
+        name = args.engine or (cfg.engine if cfg.engine not in ("auto", "remote") else "auto")
+        engine = create_engine(name, cfg)
+        cache_mb = cfg.template_cache_mb if args.cache_mb is None else args.cache_mb
+        if args.cache:
+            engine = CachedTemplateEngine(engine, TemplateCache(args.cache, int(cache_mb * 1024 * 1024)))
+        server = EngineServer(engine, address)
+        try:
+            server.listen()
+        except (RuntimeError, OSError) as e:
+            print(f"无法启动引擎服务: {e}", file=sys.stderr)
+            return 1
+        server.warm_up()
+        print(f"引擎服务已启动: {address}  引擎: {server.engine.name}  "
+              f"加载耗时 {server.load_seconds:.2f} s", flush=True)
+        server.serve_forever()
+        return 0
+
+    client = EngineClient(address)
+    if args.command == "ping":
+        ok = client.ping()
+        print("服务运行中" if ok else "服务未运行")
+        return 0 if ok else 1
+    if args.command == "stats":
+        for key, value in client.stats().items():
+            print(f"{key}: {value}")
+        return 0
+    client.shutdown()
+    print("服务已停止")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+"""
+多区域 (ROI) 几何存储。
+
+所有区域共用一个 (n, 2) 坐标数组，区域表为 NumPy 结构化数组
+(类型、用途、坐标起始位置与数量、圆半径)；删除或修改顶点数时旧坐标只标记为废弃，
+废弃过多时再整体压缩。掩码按需在区域外接矩形内栅格化，不保存整幅掩码。
+
+区域类型: polygon (多边形) / circle (圆，圆心 + 半径范围)
+区域用途: include (模板区域) / exclude (排除区域)
+"""
+from functools import lru_cache
+
+from app_config import lazy_import
+
+# 延迟导入：首次使用时才加载 OpenCV / NumPy
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+
+POLYGON, CIRCLE = 0, 1
+INCLUDE, EXCLUDE = 0, 1
+KIND_NAMES = ("polygon", "circle")
+ROLE_NAMES = ("include", "exclude")
+
+# 圆转为多边形轮廓时的顶点数
+CIRCLE_SEGMENTS = 64
+# 栅格化时坐标的小数位数 (二进制)，亚像素坐标按 1/16 像素参与填充
+DRAW_SHIFT = 4
+
+
+@lru_cache(maxsize=1)
+def roi_dtype():
+    return np.dtype([
+        ("kind", np.uint8),
+        ("role", np.uint8),
+        ("start", np.int64),
+        ("count", np.int64),
+        ("r0", np.float64),
+        ("r1", np.float64),
+    ])
+
+
+def _role(role):
+    return ROLE_NAMES.index(role) if isinstance(role, str) else int(role)
+
+
+class GeometryStore:
+    """一幅图像上的全部区域，下标即区域编号 (删除后其后的区域编号前移)"""
+
+    def __init__(self):
+        self.coords = np.zeros((0, 2), np.float64)
+        self.rois = np.zeros(0, roi_dtype())
+        self._used = 0        # coords 中已使用的行数 (含废弃)
+        self._garbage = 0     # 废弃的坐标行数
+        self.revision = 0
+
+    def __len__(self):
+        return len(self.rois)
+
+    # —— 写入
+    def _alloc(self, pts):
+        """把 pts 追加到坐标数组末尾，返回起始位置"""
+        n = len(pts)
+        if self._used + n > len(self.coords):
+            grown = np.zeros((max(self._used + n, 2 * len(self.coords), 64), 2), np.float64)
+            grown[:self._used] = self.coords[:self._used]
+            self.coords = grown
+        start = self._used
+        self.coords[start:start + n] = pts
+        self._used += n
+        return start
+
+    def _append(self, kind, role, pts, r0=0.0, r1=0.0):
+        row = np.zeros(1, roi_dtype())
+        row["kind"], row["role"] = kind, _role(role)
+        row["start"], row["count"] = self._alloc(pts), len(pts)
+        row["r0"], row["r1"] = r0, r1
+        self.rois = np.concatenate([self.rois, row])
+        self.revision += 1
+        return len(self.rois) - 1
+
+    def add_polygon(self, points, role=INCLUDE):
+        pts = np.asarray(points, np.float64).reshape(-1, 2)
+        if len(pts) < 3:
+            raise ValueError("多边形至少需要3个点")
+        return self._append(POLYGON, role, pts)
+
+    def add_circle(self, center, radius, role=INCLUDE):
+        """radius 为 (最小半径, 最大半径)；区域本身按最大半径计算"""
+        r0, r1 = (float(v) for v in radius)
+        if r1 <= 0 or r0 > r1:
+            raise ValueError("圆半径无效")
+        return self._append(CIRCLE, role, np.asarray(center, np.float64).reshape(1, 2), r0, r1)
+
+    def set_polygon(self, i, points):
+        """替换多边形顶点；顶点数不变时原地覆盖"""
+        pts = np.asarray(points, np.float64).reshape(-1, 2)
+        if len(pts) < 3:
+            raise ValueError("多边形至少需要3个点")
+        roi = self.rois[i]
+        if roi["count"] == len(pts):
+            self.coords[roi["start"]:roi["start"] + len(pts)] = pts
+        else:
+            self._garbage += int(roi["count"])
+            self.rois["start"][i] = self._alloc(pts)
+            self.rois["count"][i] = len(pts)
+            self._maybe_compact()
+        self.revision += 1
+
+    def set_role(self, i, role):
+        self.rois["role"][i] = _role(role)
+        self.revision += 1
+
+    def remove(self, i):
+        self._garbage += int(self.rois[i]["count"])
+        self.rois = np.delete(self.rois, i)
+        self._maybe_compact()
+        self.revision += 1
+
+    def clear(self):
+        self.rois = self.rois[:0]
+        self._used = self._garbage = 0
+        self.revision += 1
+
+    def _maybe_compact(self):
+        if self._garbage * 2 > self._used:
+            self.compact()
+
+    def compact(self):
+        """丢弃废弃坐标，按区域顺序重新排列"""
+        starts, counts = self.rois["start"], self.rois["count"]
+        coords = np.zeros((max(int(counts.sum()), 64), 2), np.float64)
+        pos = 0
+        for k in range(len(self.rois)):
+            n = int(counts[k])
+            coords[pos:pos + n] = self.coords[starts[k]:starts[k] + n]
+            starts[k] = pos
+            pos += n
+        self.coords, self._used, self._garbage = coords, pos, 0
+
+    # —— 读取
+    def kind(self, i):
+        return int(self.rois[i]["kind"])
+
+    def role(self, i):
+        return int(self.rois[i]["role"])
+
+    def indices(self, kind=None, role=None):
+        """满足条件的区域编号数组"""
+        sel = np.ones(len(self.rois), bool)
+        if kind is not None:
+            sel &= self.rois["kind"] == kind
+        if role is not None:
+            sel &= self.rois["role"] == _role(role)
+        return np.flatnonzero(sel)
+
+    def points(self, i):
+        """多边形顶点 (视图)；圆返回只含圆心的数组"""
+        roi = self.rois[i]
+        return self.coords[roi["start"]:roi["start"] + roi["count"]]
+
+    def circle(self, i):
+        """(圆心 x, 圆心 y, 最小半径, 最大半径)"""
+        roi = self.rois[i]
+        cx, cy = self.coords[roi["start"]].tolist()
+        return cx, cy, float(roi["r0"]), float(roi["r1"])
+
+    def outline(self, i):
+        """区域轮廓 (n, 2)；圆按 CIRCLE_SEGMENTS 段近似"""
+        if self.kind(i) == POLYGON:
+            return self.points(i)
+        cx, cy, _, r = self.circle(i)
+        t = np.linspace(0, 2 * np.pi, CIRCLE_SEGMENTS, endpoint=False)
+        return np.stack([cx + r * np.cos(t), cy + r * np.sin(t)], axis=1)
+
+    def bbox(self, i):
+        """区域外接矩形 (x, y, w, h)，整数像素，未裁剪到图像范围"""
+        if self.kind(i) == CIRCLE:
+            cx, cy, _, r = self.circle(i)
+            lo, hi = np.array([cx - r, cy - r]), np.array([cx + r, cy + r])
+        else:
+            pts = self.points(i)
+            lo, hi = pts.min(axis=0), pts.max(axis=0)
+        x0, y0 = np.floor(lo).astype(int).tolist()
+        x1, y1 = (np.ceil(hi).astype(int) + 1).tolist()
+        return x0, y0, x1 - x0, y1 - y0
+
+    def union_bbox(self, ids):
+        """若干区域外接矩形的并集，ids 为空时返回 None"""
+        boxes = [self.bbox(i) for i in ids]
+        if not boxes:
+            return None
+        x0 = min(b[0] for b in boxes)
+        y0 = min(b[1] for b in boxes)
+        x1 = max(b[0] + b[2] for b in boxes)
+        y1 = max(b[1] + b[3] for b in boxes)
+        return x0, y0, x1 - x0, y1 - y0
+
+    # —— 栅格化
+    def draw(self, i, mask, origin, value=255):
+        """把区域 i 画到 mask 上，origin 为 mask 左上角在图像中的坐标"""
+        ox, oy = origin
+        scale = 1 << DRAW_SHIFT
+        if self.kind(i) == CIRCLE:
+            cx, cy, _, r = self.circle(i)
+            center = (int(round((cx - ox) * scale)), int(round((cy - oy) * scale)))
+            cv2.circle(mask, center, int(round(r * scale)), value, -1, shift=DRAW_SHIFT)
+        else:
+            local = np.round((self.points(i) - (ox, oy)) * scale).astype(np.int32)
+            cv2.fillPoly(mask, [local], value, shift=DRAW_SHIFT)
+        return mask
+
+    def rasterize(self, i, bbox=None):
+        """区域 i 的掩码，只覆盖 bbox (默认为区域外接矩形)，返回 (x, y, mask)"""
+        x, y, w, h = bbox or self.bbox(i)
+        return x, y, self.draw(i, np.zeros((h, w), np.uint8), (x, y))
+
+    def combined_mask(self, bbox=None):
+        """
+        所有模板区域的并集减去所有排除区域，只覆盖 bbox
+        (默认为模板区域外接矩形的并集)，返回 (x, y, mask)；没有模板区域时返回 None。
+        """
+        include = self.indices(role=INCLUDE)
+        bbox = bbox or self.union_bbox(include)
+        if bbox is None:
+            return None
+        x, y, w, h = bbox
+        mask = np.zeros((h, w), np.uint8)
+        for i in include:
+            self.draw(i, mask, (x, y), 255)
+        for i in self.indices(role=EXCLUDE):
+            bx, by, bw, bh = self.bbox(i)
+            if bx < x + w and by < y + h and bx + bw > x and by + bh > y:
+                self.draw(i, mask, (x, y), 0)
+        return x, y, mask
+
+    # —— 复制与序列化
+    def copy(self):
+        other = GeometryStore()
+        other.coords = self.coords[:self._used].copy()
+        other.rois = self.rois.copy()
+        other._used, other._garbage = self._used, self._garbage
+        return other
+
+    def packed(self):
+        """(区域表, 坐标)：去掉废弃坐标后按区域顺序排列的副本，用于保存"""
+        other = self.copy()
+        other.compact()
+        return other.rois, other.coords[:other._used]
+
+    @classmethod
+    def from_arrays(cls, rois, coords):
+        """由 packed() 的结果重建 (复制数据，可直接编辑)"""
+        store = cls()
+        store.rois = np.array(rois, roi_dtype())
+        store.coords = np.array(coords, np.float64).reshape(-1, 2)
+        store._used = len(store.coords)
+        return store
+
+    def to_list(self):
+        """[{type, role, points | center + radius}, ...]，用于清单与元数据"""
+        items = []
+        for i in range(len(self)):
+            item = {"type": KIND_NAMES[self.kind(i)], "role": ROLE_NAMES[self.role(i)]}
+            if self.kind(i) == CIRCLE:
+                cx, cy, r0, r1 = self.circle(i)
+                item.update(center=[cx, cy], radius=[r0, r1])
+            else:
+                item["points"] = self.points(i).tolist()
+            items.append(item)
+        return items
+
+    @classmethod
+    def from_list(cls, items):
+        store = cls()
+        for item in items:
+            role = item.get("role", "include")
+            if item.get("type", "polygon") == "circle":
+                store.add_circle(item["center"], item["radius"], role)
+            else:
+                store.add_polygon(item["points"], role)
+        return store
+
+    @property
+    def nbytes(self):
+        return self.coords.nbytes + self.rois.nbytes
@@ -1,92 +1,152 @@
 # -*- coding: utf-8 -*-
-import sys
 import os
-import clr
-import csv
-import cv2
-import numpy as np
+import sys
+import time
 from pathlib import Path
+from multiprocessing import AuthenticationError
 from PyQt5 import QtWidgets, QtGui, QtCore
 from PyQt5.QtCore import Qt
 
-# 设置环境变量 (修复路径问题) - 在程序一开始就设置
-os.environ['HALCONROOT'] = r"C:\Program Files\MVTec\HALCON-24.11-Progress-Steady"
-os.environ['PATH'] = r"C:\Program Files\MVTec\HALCON-24.11-Progress-Steady\bin;" + os.environ.get('PATH', '')
-
-# —— 一、配置 DLL 路径
-HALCON_DOTNET = r"C:\Program Files\MVTec\HALCON-24.11-Progress-Steady\bin\dotnet35\halcondotnetxl.dll"
-ENGINE_DLL = r"C:\Users\USERA\source\repos\TemplateEngineProj\TemplateEngineProj\bin\Debug\TemplateEngineProj.dll"
-
-# 检查DLL文件是否存在
-if not os.path.exists(HALCON_DOTNET):
-    QtWidgets.QMessageBox.critical(
-        None,
-        "文件缺失",
-        f"找不到HALCON DLL文件:\n{HALCON_DOTNET}\n请检查HALCON安装路径。"
-    )
-    sys.exit(1)
-
-if not os.path.exists(ENGINE_DLL):
-    QtWidgets.QMessageBox.critical(
-        None,
-        "文件缺失",
-        f"找不到自定义引擎DLL文件:\n{ENGINE_DLL}\n请编译C#项目并生成DLL。"
-    )
-    sys.exit(1)
-
-# —— 二、通过反射获取 CreateTemplate 方法
-def get_create_template_method(engine_assembly):
-    try:
-        # 获取类型
-        type_name = "TemplateEngineProj.LoadImages+TemplateEngine"
-        template_engine_type = engine_assembly.GetType(type_name)
-
-        if template_engine_type is None:
-            # 尝试备用类型名
-            type_name = "TemplateEngineProj.TemplateEngine"
-            template_engine_type = engine_assembly.GetType(type_name)
-
-            if template_engine_type is None:
-                # 列出所有类型
-                all_types = "\n".join([t.FullName for t in engine_assembly.GetTypes()])
-                raise Exception(f"未找到类型: {type_name}\n程序集中的类型:\n{all_types}")
-
-        # 获取 CreateTemplate 方法
-        method = template_engine_type.GetMethod("CreateTemplate")
-
-        if method is None:
-            # 尝试备用方法名
-            method = template_engine_type.GetMethod("create_template")
-            if method is None:
-                # 列出所有方法
-                methods = "\n".join([m.Name for m in template_engine_type.GetMethods()])
-                raise Exception(f"未找到 CreateTemplate 方法\n类型中的方法:\n{methods}")
-
-        print(f"成功获取 CreateTemplate 方法")
-        return method
-    except Exception as e:
-        QtWidgets.QMessageBox.critical(
-            None,
-            "反射错误",
-            f"无法获取 CreateTemplate 方法: {str(e)}\n"
-            f"请检查C#代码中的类名和方法名是否正确。"
-        )
-        return None
+# 以下模块导入时没有副作用，OpenCV/NumPy/CLR 均在首次使用时才加载；
+# DLL 路径与引擎选择来自 app_config (配置文件/环境变量)
+import profiling
+from app_config import load_config
+from display_pyramid import ImagePyramid, TileCache, TILE_SIZE, numpy_to_qpixmap
+from image_io import LazyImage, ImagePrefetcher, list_images
+from overlay import RegionOverlay
+from geometry import GeometryStore, POLYGON, CIRCLE, INCLUDE, EXCLUDE
+from point_store import PointStore
+from polygon_render import PolygonPainter
+from contour_snap import EdgeSnapper
+from project_file import ProjectFile
+from preprocess import PreprocessPipeline
+from template_engine import DotNetTemplateEngine, TemplateRequest, create_engine, DEFAULT_RADIUS
+from template_cache import TemplateCache, CachedTemplateEngine
+from template_verify import TemplateMatcher, verify, sample_paths, format_summary
+from auto_roi import propose as propose_regions, fixed_limits
+from coord_export import FORMATS as EXPORT_FORMATS, dataset_sources, export as export_regions
+
+# —— 一、后台模板生成任务
+class TemplateJobSignals(QtCore.QObject):
+    """TemplateJob 的信号 (QRunnable 本身不是 QObject)"""
+    progress = QtCore.pyqtSignal(int, int, str)   # 任务号, 进度(-1 表示忙碌), 说明
+    finished = QtCore.pyqtSignal(int, list)       # 任务号, 生成的文件
+    failed = QtCore.pyqtSignal(int, str)          # 任务号, 错误信息
+
+
+class TemplateJob(QtCore.QRunnable):
+    """
+    在线程池中执行一次 CreateTemplate。
+    引擎调用本身无法中断：排队中的任务可以直接移出队列，
+    运行中的任务取消后结果被丢弃。
+    simplify 为 (容差, 方法) 时先简化多边形再调用引擎 (TemplateRequest.simplify)。
+    """
+
+    def __init__(self, job_id, engine, request, simplify=None):
+        super().__init__()
+        self.setAutoDelete(False)  # 由 TemplateMaker.jobs 持有，便于 tryTake
+        self.job_id = job_id
+        self.engine = engine
+        self.request = request
+        self.cancelled = False
+        self.cache_hit = False   # 结果来自模板缓存
+        self.simplify = simplify
+        self.vertices = None     # 简化前后的顶点数
+        self.seconds = None      # 引擎调用耗时
+        self.signals = TemplateJobSignals()
+
+    def title(self):
+        return f"{Path(self.request.image_path).name} -> {Path(self.request.output_prefix).name}"
+
+    def cancel(self):
+        self.cancelled = True
+
+    def prepare(self):
+        """调用引擎 / 匹配器之前简化多边形"""
+        if self.simplify and self.simplify[0] > 0:
+            with profiling.span("simplify", method=self.simplify[1]):
+                self.vertices = self.request.simplify(*self.simplify)
+
+    def run(self):
+        if self.cancelled:
+            return
+        self.signals.progress.emit(self.job_id, 10, "准备参数")
+        try:
+            self.prepare()
+            self.signals.progress.emit(self.job_id, -1, "HALCON 模板生成中")
+            start = time.perf_counter()
+            with profiling.span("engine.create_template", engine=self.engine.name):
+                artifacts = self.engine.create_template(self.request)
+            self.seconds = time.perf_counter() - start
+        except Exception as e:
+            self.signals.failed.emit(self.job_id, str(e))
+            return
+        self.cache_hit = getattr(self.engine, "last_hit", False)
+        self.signals.progress.emit(self.job_id, 100, "完成")
+        self.signals.finished.emit(self.job_id, artifacts)
+
+
+class VerifyJob(TemplateJob):
+    """
+    在样本图像上试运行当前区域的模板匹配 (template_verify)，不调用引擎。
+    逐幅报告进度，可在样本之间取消；finished 信号的列表中只有验证报告。
+    """
+
+    def __init__(self, job_id, request, samples, min_score=0.7, simplify=None):
+        super().__init__(job_id, None, request, simplify)
+        self.samples = samples
+        self.min_score = min_score
+
+    def title(self):
+        return f"{Path(self.request.image_path).name} 验证 ({len(self.samples)} 幅样本)"
+
+    def run(self):
+        if self.cancelled:
+            return
+        self.signals.progress.emit(self.job_id, -1, "构建匹配器")
+        done = []
+
+        def on_result(result):
+            done.append(result)
+            if self.cancelled:
+                raise InterruptedError
+            self.signals.progress.emit(self.job_id, 100 * len(done) // len(self.samples),
+                                       f"验证 {len(done)}/{len(self.samples)}")
+
+        try:
+            self.prepare()
+            with profiling.span("verify", samples=len(self.samples)):
+                matcher = TemplateMatcher.from_request(self.request)
+                report = verify(matcher, self.samples, self.min_score, on_result=on_result)
+        except InterruptedError:
+            self.signals.failed.emit(self.job_id, "已取消")
+            return
+        except Exception as e:
+            self.signals.failed.emit(self.job_id, str(e))
+            return
+        self.signals.finished.emit(self.job_id, [report])
 
-# —— 三、完整 PolygonLabel 实现
+# —— 二、完整 PolygonLabel 实现
 class PolygonLabel(QtWidgets.QLabel):
     """
     支持缩放、平移和多边形点添加的自定义 QLabel。
     """
     polygon_finished = QtCore.pyqtSignal(list)
+    polygon_edited = QtCore.pyqtSignal(list)    # 已闭合多边形的顶点被拖动
+    polygon_started = QtCore.pyqtSignal()       # 多边形闭合后开始绘制新的多边形
+    circle_finished = QtCore.pyqtSignal(float, float, float)   # 圆心 x, 圆心 y, 半径
 
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.points = []
+        self.points = PointStore()  # 顶点数组 + 网格索引
         self.drawing = False
+        self.mode = "polygon"       # polygon: 逐点绘制多边形；circle: 先点圆心再点圆周
         self.selected_point = -1
+        self.dragging = False      # 正在拖动选中的顶点
+        self.snap = None           # 顶点吸附函数 (x, y, 半径) -> (x, y) 或 None；None 时不吸附
         self.zoom = 1.0            # 缩放比例
-        self._pixmap = None        # 原始 QPixmap
+        self.pyramid = None        # 显示用图像金字塔
+        self.tile_cache = TileCache()
         self.image_rect = None     # 图像显示区域
         self.setFocusPolicy(Qt.StrongFocus)
         self.setStyleSheet("background-color: #2D2D30;")  # 深灰色背景
@@ -94,28 +154,107 @@ class PolygonLabel(QtWidgets.QLabel):
         # 提高框选精准度
         self.point_radius = 8  # 点半径
         self.point_hit_range = 12  # 点检测范围
-
-    def setPixmap(self, pixmap: QtGui.QPixmap):
-        # 保存原始 pixmap 并应用当前缩放
-        self._pixmap = pixmap
+        self.polygon_painter = PolygonPainter(self.point_radius)
+
+        # 拖动节流：鼠标移动只记录目标位置，按显示器刷新间隔应用，只重绘受影响的矩形
+        self.pending_drag = None
+        self.drag_timer = QtCore.QTimer(self)
+        self.drag_timer.setSingleShot(True)
+        self.drag_timer.setTimerType(Qt.PreciseTimer)
+        self.drag_timer.timeout.connect(self.apply_drag)
+
+    def setImage(self, img):
+        # 构建金字塔并应用当前缩放；瓦片在 paintEvent 中按需生成
+        self.setPyramid(ImagePyramid(img))
+
+    def setPyramid(self, pyramid):
+        self.pyramid = pyramid
+        self.tile_cache.clear()
         self.apply_zoom()
 
+    def clearImage(self):
+        """清除显示的图像与正在编辑的多边形"""
+        self.pyramid = None
+        self.tile_cache.clear()
+        self.image_rect = None
+        self.points.clear()
+        self.drawing = False
+        self.dragging = False
+        self.pending_drag = None
+        self.selected_point = -1
+        self.zoom = 1.0
+        self.setMinimumSize(0, 0)
+        self.update()
+
     def apply_zoom(self):
-        if self._pixmap is None:
+        if self.pyramid is None:
+            return
+        w = max(1, int(self.pyramid.width * self.zoom))
+        h = max(1, int(self.pyramid.height * self.zoom))
+        # 只更新显示区域大小，不再生成整幅缩放图
+        self.setMinimumSize(w, h)
+        self.update_image_rect()
+        self.update()
+
+    def update_region(self, x, y, w, h):
+        """原图 (x, y, w, h) 区域已原地修改：只重算金字塔对应区域并重新上传相交瓦片"""
+        if self.pyramid is None:
             return
-        w = int(self._pixmap.width() * self.zoom)
-        h = int(self._pixmap.height() * self.zoom)
-        scaled = self._pixmap.scaled(w, h, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-        super().setPixmap(scaled)
+        for level, rect in enumerate(self.pyramid.update_region(x, y, w, h)):
+            self.tile_cache.invalidate(level, *rect)
+        if self.image_rect is not None:
+            self.update(QtCore.QRect(
+                self.image_rect.x() + int(x * self.zoom) - 1,
+                self.image_rect.y() + int(y * self.zoom) - 1,
+                int(w * self.zoom) + 3,
+                int(h * self.zoom) + 3
+            ))
+
+    def update_image_rect(self):
+        if self.pyramid is None:
+            return
+        w = max(1, int(self.pyramid.width * self.zoom))
+        h = max(1, int(self.pyramid.height * self.zoom))
         self.image_rect = QtCore.QRect(
-            (self.width() - scaled.width()) // 2,
-            (self.height() - scaled.height()) // 2,
-            scaled.width(),
-            scaled.height()
+            max(0, (self.width() - w) // 2),
+            max(0, (self.height() - h) // 2),
+            w,
+            h
         )
 
+    def resizeEvent(self, event):
+        self.update_image_rect()
+        super().resizeEvent(event)
+
+    @profiling.timed("paint.tiles")
+    def draw_tiles(self, painter, exposed):
+        """只绘制与可见区域相交的瓦片，使用最接近当前缩放比例的金字塔层级"""
+        visible = exposed.intersected(self.image_rect)
+        if visible.isEmpty():
+            return
+        level = self.pyramid.level_for_zoom(self.zoom)
+        self.pyramid.ensure_level(level)  # 放大到预览精度以上时才加载原图
+        scale = self.pyramid.level_scale(level)
+        height, width = self.pyramid.level_shape(level)
+        # 层级像素 -> 屏幕像素
+        k = self.zoom / scale
+        ox, oy = self.image_rect.x(), self.image_rect.y()
+
+        tx0 = max(0, int((visible.left() - ox) / k) // TILE_SIZE)
+        ty0 = max(0, int((visible.top() - oy) / k) // TILE_SIZE)
+        tx1 = min((width - 1) // TILE_SIZE, int((visible.right() + 1 - ox) / k) // TILE_SIZE)
+        ty1 = min((height - 1) // TILE_SIZE, int((visible.bottom() + 1 - oy) / k) // TILE_SIZE)
+
+        painter.setRenderHint(QtGui.QPainter.SmoothPixmapTransform, k != 1.0)
+        for ty in range(ty0, ty1 + 1):
+            for tx in range(tx0, tx1 + 1):
+                pix = self.tile_cache.get(self.pyramid, level, tx, ty)
+                target = QtCore.QRectF(ox + tx * TILE_SIZE * k, oy + ty * TILE_SIZE * k,
+                                       pix.width() * k, pix.height() * k)
+                painter.drawPixmap(target, pix, QtCore.QRectF(pix.rect()))
+
     def mapToImage(self, pos):
-        if self._pixmap is None or self.image_rect is None:
+        if self.pyramid is None or self.image_rect is None:
             return None
         if not self.image_rect.contains(pos):
             return None
@@ -131,6 +270,14 @@ class PolygonLabel(QtWidgets.QLabel):
             self.image_rect.y() + int(pt.y() * self.zoom)
         )
 
+    def snap_point(self, x, y):
+        """吸附到附近的边缘/角点；搜索半径为屏幕上的点检测范围，附近没有边缘时返回原坐标"""
+        if self.snap is None:
+            return x, y
+        radius = min(64.0, max(4.0, self.point_hit_range / self.zoom))
+        snapped = self.snap(x, y, radius)
+        return snapped if snapped is not None else (x, y)
+
     def wheelEvent(self, event: QtGui.QWheelEvent):
         delta = event.angleDelta().y()
         factor = 1.25 if delta > 0 else 0.8
@@ -139,44 +286,75 @@ class PolygonLabel(QtWidgets.QLabel):
         event.accept()
 
     def mousePressEvent(self, event):
-        if self._pixmap is None:
+        if self.pyramid is None:
             return
         img_pt = self.mapToImage(event.pos())
         if img_pt is None:
             return
+        if self.mode == "circle" and event.button() == QtCore.Qt.LeftButton:
+            self.circle_click(img_pt)
+            return
+
+        # 检查是否点击了现有点 (网格索引查询)
+        hit = self.points.nearest_vertex(img_pt.x(), img_pt.y(), self.point_hit_range)
         if event.button() == QtCore.Qt.LeftButton:
-            # 检查是否点击了现有点
-            for i, pt in enumerate(self.points):
-                distance = ((img_pt.x() - pt.x())**2 + (img_pt.y() - pt.y())**2)**0.5
-                if distance < self.point_hit_range:
-                    self.selected_point = i
-                    return
+            if hit >= 0:
+                self.selected_point = hit
+                return
+            # 点击已闭合多边形的边时在边上插入顶点并选中，可直接拖动
+            edge = None if self.drawing else self.points.nearest_edge(
+                img_pt.x(), img_pt.y(), self.point_hit_range)
+            if edge is not None:
+                i, (x, y) = edge
+                self.points.insert(i + 1, *self.snap_point(x, y))
+                self.selected_point = i + 1
+                self.polygon_edited.emit(self.points.tolist())
+                self.update()
+                return
+            # 已闭合的多边形保留在区域列表中，从新的多边形开始
+            if not self.drawing and self.points:
+                self.points.clear()
+                self.polygon_started.emit()
             # 添加新点
             self.drawing = True
-            self.points.append(img_pt)
+            self.points.append(*self.snap_point(img_pt.x(), img_pt.y()))
             self.selected_point = -1
             self.update()
         elif event.button() == QtCore.Qt.RightButton:
-            # 检查是否右键点击了现有点
-            for i, pt in enumerate(self.points):
-                distance = ((img_pt.x() - pt.x())**2 + (img_pt.y() - pt.y())**2)**0.5
-                if distance < self.point_hit_range:
-                    del self.points[i]
-                    self.selected_point = -1
-                    self.update()
-                    return
+            # 右键点击了现有点则删除
+            if hit >= 0:
+                del self.points[hit]
+                self.selected_point = -1
+                self.update()
+                return
             # 完成多边形绘制
             if self.drawing and len(self.points) >= 3:
-                self.polygon_finished.emit([(p.x(), p.y()) for p in self.points])
+                self.polygon_finished.emit(self.points.tolist())
                 self.drawing = False
                 self.update()
 
+    def circle_click(self, img_pt):
+        """圆形模式：第一次点击确定圆心，第二次点击确定半径"""
+        if not self.drawing:
+            self.points.clear()
+            self.points.append(img_pt.x(), img_pt.y())
+            self.drawing = True
+        else:
+            cx, cy = self.points[0]
+            radius = ((img_pt.x() - cx)**2 + (img_pt.y() - cy)**2)**0.5
+            self.points.clear()
+            self.drawing = False
+            if radius >= 1:
+                self.circle_finished.emit(cx, cy, radius)
+        self.selected_point = -1
+        self.update()
+
     def mouseDoubleClickEvent(self, event):
-        if self._pixmap is None:
+        if self.pyramid is None:
             return
         img_pt = self.mapToImage(event.pos())
-        if img_pt and event.button() == QtCore.Qt.LeftButton:
-            self.points.append(img_pt)
+        if img_pt and event.button() == QtCore.Qt.LeftButton and self.mode == "polygon":
+            self.points.append(*self.snap_point(img_pt.x(), img_pt.y()))
             self.update()
 
     def keyPressEvent(self, event):
@@ -193,79 +371,181 @@ class PolygonLabel(QtWidgets.QLabel):
             self.update()
         super().keyPressEvent(event)
 
+    def vertex_rect(self, i):
+        """顶点 i 及相邻边的屏幕矩形 (局部重绘用)"""
+        return self.polygon_painter.vertex_rect(self.points, i, not self.drawing,
+                                                self.image_rect.topLeft(), self.zoom)
+
+    def move_vertex(self, i, x, y):
+        """移动顶点，只重绘移动前后受影响的区域"""
+        if self.image_rect is None:
+            self.points.move(i, x, y)
+            self.update()
+            return
+        old = self.vertex_rect(i)
+        self.points.move(i, x, y)
+        self.update(old.united(self.vertex_rect(i)))
+
+    def drag_interval(self):
+        """拖动更新间隔 (毫秒)：显示器刷新一次的时间"""
+        handle = self.window().windowHandle()
+        screen = handle.screen() if handle is not None else QtWidgets.QApplication.primaryScreen()
+        rate = screen.refreshRate() if screen is not None else 0
+        return max(4, int(1000 / (rate if rate > 0 else 60)))
+
+    def apply_drag(self):
+        """应用最近一次鼠标位置；之后一个刷新间隔内的移动合并到下一次"""
+        if self.pending_drag is None or not 0 <= self.selected_point < len(self.points):
+            self.pending_drag = None
+            return
+        x, y = self.pending_drag
+        self.pending_drag = None
+        self.move_vertex(self.selected_point, x, y)
+        if not self.drawing and len(self.points) >= 3:
+            self.polygon_edited.emit(self.points.tolist())
+        self.drag_timer.start(self.drag_interval())
+
     def mouseMoveEvent(self, event):
         if 0 <= self.selected_point < len(self.points):
             img_pt = self.mapToImage(event.pos())
             if img_pt:
-                self.points[self.selected_point] = img_pt
-                self.update()
+                self.pending_drag = (img_pt.x(), img_pt.y())
+                self.dragging = True
+                # 第一次移动立即应用，刷新间隔内的后续移动由定时器合并
+                if not self.drag_timer.isActive():
+                    self.apply_drag()
         super().mouseMoveEvent(event)
 
+    def mouseReleaseEvent(self, event):
+        # 先应用尚未处理的移动
+        self.apply_drag()
+        self.drag_timer.stop()
+        # 拖动结束时把顶点吸附到边缘 (拖动过程中不吸附，保证跟手)
+        if self.dragging and 0 <= self.selected_point < len(self.points):
+            x, y = self.points[self.selected_point]
+            snapped = self.snap_point(x, y)
+            if snapped != (x, y):
+                self.move_vertex(self.selected_point, *snapped)
+                if not self.drawing and len(self.points) >= 3:
+                    self.polygon_edited.emit(self.points.tolist())
+        if self.dragging:
+            # 拖动中沿用的细节层次可能已不准确，重新计算后整体重绘
+            self.polygon_painter.invalidate_lod()
+            self.update()
+        self.dragging = False
+        super().mouseReleaseEvent(event)
+
+    @profiling.timed("paint")
     def paintEvent(self, event):
         super().paintEvent(event)
-        if not self.points:
+        if self.pyramid is None:
             return
 
         painter = QtGui.QPainter(self)
-        painter.setRenderHint(QtGui.QPainter.Antialiasing)
-        painter.setFont(QtGui.QFont("Arial", 10))
-
-        # 绘制点
-        for i, pt in enumerate(self.points):
-            screen_pt = self.mapToScreen(pt)
-            if not screen_pt:
-                continue
+        self.draw_tiles(painter, event.rect())
+        if not self.points:
+            painter.end()
+            return
 
-            # 设置点颜色（选中的点为红色）
-            if i == self.selected_point:
-                pen = QtGui.QPen(QtCore.Qt.red)
-                brush = QtGui.QBrush(QtCore.Qt.red)
-            else:
-                pen = QtGui.QPen(QtCore.Qt.cyan)
-                brush = QtGui.QBrush(QtCore.Qt.cyan)
-
-            pen.setWidth(2)
-            painter.setPen(pen)
-            painter.setBrush(brush)
-            painter.drawEllipse(screen_pt, self.point_radius, self.point_radius)
-
-            # 绘制点坐标
-            painter.setPen(QtGui.QPen(QtCore.Qt.yellow))
-            painter.drawText(screen_pt.x() + 10, screen_pt.y() - 8, f"P{i+1}:({pt.x()},{pt.y()})")
-
-        # 绘制多边形连线
-        if len(self.points) > 1:
-            pen = QtGui.QPen(QtGui.QColor(0, 200, 255))
-            pen.setWidth(2)
-            painter.setPen(pen)
-            path = QtGui.QPainterPath()
-
-            # 第一个点
-            start_pt = self.mapToScreen(self.points[0])
-            if start_pt:
-                path.moveTo(start_pt)
-
-            # 中间点
-            for pt in self.points[1:]:
-                p = self.mapToScreen(pt)
-                if p:
-                    path.lineTo(p)
-
-            # 闭合多边形（如果已完成绘制）
-            if not self.drawing and start_pt:
-                path.lineTo(start_pt)
-
-            painter.drawPath(path)
+        # 只绘制可见顶点；路径在两次编辑之间复用
+        with profiling.span("paint.polygon", points=len(self.points)):
+            self.polygon_painter.paint(painter, self.points, not self.drawing, self.selected_point,
+                                       self.image_rect.topLeft(), self.zoom, event.rect(),
+                                       self.visibleRegion().boundingRect())
 
         # 绘制操作提示
+        painter.setFont(QtGui.QFont("Arial", 10))
         painter.setPen(QtGui.QPen(QtCore.Qt.white))
-        painter.drawText(10, 20, "左键:添加/选中  右键:删除/完成  Delete:删除点  Esc:取消选中  滚轮:缩放")
+        painter.drawText(10, 20, "左键:添加/选中/在边上插入  右键:删除/完成  Delete:删除点  Esc:取消选中  滚轮:缩放")
         painter.end()
 
+def prepare_dataset_entry(path):
+    """预取线程中执行：解码预览并构建显示金字塔"""
+    lazy = LazyImage(path)
+    return lazy, ImagePyramid.from_lazy(lazy)
+
+
+# —— 三、预处理参数对话框
+class PreprocessDialog(QtWidgets.QDialog):
+    """调整预处理参数，在缩小的图像上即时预览"""
+
+    def __init__(self, pipeline, image, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("预处理参数")
+        self.pipeline = pipeline
+        self.image = image
+        self.saved_params = dict(pipeline.params)
+
+        p = pipeline.params
+        self.spin_denoise = QtWidgets.QDoubleSpinBox()
+        self.spin_denoise.setRange(0.0, 30.0)
+        self.spin_denoise.setValue(p["denoise"])
+        self.spin_clip = QtWidgets.QDoubleSpinBox()
+        self.spin_clip.setRange(0.0, 40.0)
+        self.spin_clip.setSingleStep(0.5)
+        self.spin_clip.setValue(p["clahe_clip"])
+        self.spin_grid = QtWidgets.QSpinBox()
+        self.spin_grid.setRange(1, 64)
+        self.spin_grid.setValue(p["clahe_grid"])
+        self.spin_gamma = QtWidgets.QDoubleSpinBox()
+        self.spin_gamma.setRange(0.1, 5.0)
+        self.spin_gamma.setSingleStep(0.05)
+        self.spin_gamma.setValue(p["gamma"])
+        self.chk_normalize = QtWidgets.QCheckBox()
+        self.chk_normalize.setChecked(p["normalize"])
+
+        form = QtWidgets.QFormLayout()
+        form.addRow("降噪强度 (0=关闭)", self.spin_denoise)
+        form.addRow("CLAHE 限幅 (0=关闭)", self.spin_clip)
+        form.addRow("CLAHE 网格", self.spin_grid)
+        form.addRow("伽马 (1=关闭)", self.spin_gamma)
+        form.addRow("归一化", self.chk_normalize)
+
+        self.preview = QtWidgets.QLabel()
+        self.preview.setAlignment(Qt.AlignCenter)
+        self.preview.setMinimumSize(480, 360)
+
+        buttons = QtWidgets.QDialogButtonBox(QtWidgets.QDialogButtonBox.Ok | QtWidgets.QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.addLayout(form)
+        layout.addWidget(self.preview, 1)
+        layout.addWidget(buttons)
+
+        for spin in (self.spin_denoise, self.spin_clip, self.spin_grid, self.spin_gamma):
+            spin.valueChanged.connect(self.update_preview)
+        self.chk_normalize.toggled.connect(self.update_preview)
+        self.update_preview()
+
+    def update_preview(self, *_):
+        self.pipeline.configure(
+            denoise=self.spin_denoise.value(),
+            clahe_clip=self.spin_clip.value(),
+            clahe_grid=self.spin_grid.value(),
+            gamma=self.spin_gamma.value(),
+            normalize=self.chk_normalize.isChecked(),
+        )
+        pix = numpy_to_qpixmap(self.pipeline.preview(self.image))
+        self.preview.setPixmap(pix.scaled(self.preview.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation))
+
+    def reject(self):
+        # 取消时恢复原参数
+        self.pipeline.configure(**self.saved_params)
+        super().reject()
+
 # —— 四、主窗口 TemplateMaker (带延迟加载)
+# 区域类型下拉框: (显示文字, 绘制模式)
+ROI_TYPES = [("模板区域", "include"), ("排除区域", "exclude"), ("圆形区域", "circle")]
+# 覆盖层颜色 (BGR)
+ROI_COLORS = {"include": (255, 150, 0), "exclude": (0, 0, 255), "circle": (0, 200, 0)}
+ROLE_TEXT = {INCLUDE: "模板区域", EXCLUDE: "排除区域"}
+
 class TemplateMaker(QtWidgets.QWidget):
-    def __init__(self):
+    def __init__(self, config=None):
         super().__init__()
+        self.config = config or load_config()
         self.setWindowTitle("高精度多边形标注工具 (HALCON .NET 3.5)")
         self.setMinimumSize(800, 600)
         self.setStyleSheet("""
@@ -302,10 +582,21 @@ class TemplateMaker(QtWidgets.QWidget):
         """)
 
         self.current_image_path = None
-        self.image = None
-        self.mask = None
+        self.lazy_image = None     # 加载的原图 (延迟解码)，预处理始终从原图开始
+        self.base_pyramid = None   # 原图的显示金字塔 (由预览构建)
+        self.dataset = None        # 文件夹模式的预取器
+        self.dataset_index = -1
+        self.loading_project = False  # 打开项目、切换到其当前图像期间不保存
+        self._image = None         # 预处理结果
+        self.pipeline = PreprocessPipeline()
         self.last_vis = None
-        self.orig_pts = []  # 存储原始图像坐标
+        # 全部区域 (原始图像坐标)；掩码在需要时按区域外接矩形栅格化
+        self.geometry = GeometryStore()
+        self.active_roi = -1    # 正在标签中编辑的多边形区域
+        self.overlay = RegionOverlay()
+        self.snapper = None     # 当前工作图像的边缘吸附 (瓦片结果随图像缓存)
+        self.annotations = {}   # 图像路径 -> GeometryStore (本次会话中打开过的图像)
+        self.project = None     # 打开的项目文件，切换图像时自动增量保存
 
         # 创建图像显示区域
         self.label = PolygonLabel()
@@ -315,32 +606,99 @@ class TemplateMaker(QtWidgets.QWidget):
         scroll.setWidgetResizable(True)
         scroll.setAlignment(Qt.AlignCenter)
         scroll.setStyleSheet("background-color: #2D2D30;")
+        self.scroll = scroll
+
+        # 性能调试覆盖层 (F12 显示/隐藏，Ctrl+Shift+T 导出 trace)
+        profiling.enable(self.config.profile)
+        if self.config.profile_trace:
+            profiling.export_at_exit(self.config.profile_trace)
+        self.profile_overlay = QtWidgets.QLabel(scroll)
+        self.profile_overlay.setFont(QtGui.QFont("Consolas", 9))
+        self.profile_overlay.setStyleSheet(
+            "background-color: rgba(0, 0, 0, 180); color: #9CDCFE; padding: 6px; font-size: 9pt;")
+        self.profile_overlay.setAttribute(Qt.WA_TransparentForMouseEvents)
+        self.profile_overlay.hide()
+        self.profile_timer = QtCore.QTimer(self)
+        self.profile_timer.setInterval(500)
+        self.profile_timer.timeout.connect(self.refresh_profile_overlay)
 
         # 创建按钮
         self.btn_load   = QtWidgets.QPushButton("导入图像")
+        self.btn_folder = QtWidgets.QPushButton("打开文件夹")
+        self.btn_project_open = QtWidgets.QPushButton("打开项目")
+        self.btn_project_save = QtWidgets.QPushButton("保存项目")
+        self.btn_prev   = QtWidgets.QPushButton("上一张")
+        self.btn_next   = QtWidgets.QPushButton("下一张")
         self.btn_pre    = QtWidgets.QPushButton("预处理图像")
         self.btn_save   = QtWidgets.QPushButton("保存模板")
         self.btn_export = QtWidgets.QPushButton("导出坐标")
         self.btn_clear  = QtWidgets.QPushButton("清除所有点")
 
+        # 区域类型与区域列表
+        self.roi_type = QtWidgets.QComboBox()
+        for text, mode in ROI_TYPES:
+            self.roi_type.addItem(text, mode)
+        self.roi_list = QtWidgets.QListWidget()
+        self.roi_list.setMaximumHeight(110)
+        self.btn_roi_delete = QtWidgets.QPushButton("删除区域")
+        self.btn_roi_delete.setEnabled(False)
+        self.btn_auto_roi = QtWidgets.QPushButton("自动区域")
+        self.btn_auto_roi.setEnabled(False)
+        self.chk_snap = QtWidgets.QCheckBox("边缘吸附")
+
         # 初始禁用按钮
-        for btn in (self.btn_pre, self.btn_save, self.btn_export, self.btn_clear):
+        for btn in (self.btn_pre, self.btn_save, self.btn_export, self.btn_clear,
+                    self.btn_prev, self.btn_next):
             btn.setEnabled(False)
 
         # 按钮布局
         button_layout = QtWidgets.QHBoxLayout()
         button_layout.addWidget(self.btn_load)
+        button_layout.addWidget(self.btn_folder)
+        button_layout.addWidget(self.btn_project_open)
+        button_layout.addWidget(self.btn_project_save)
+        button_layout.addWidget(self.btn_prev)
+        button_layout.addWidget(self.btn_next)
         button_layout.addWidget(self.btn_pre)
+        button_layout.addWidget(self.roi_type)
+        button_layout.addWidget(self.chk_snap)
         button_layout.addWidget(self.btn_save)
         button_layout.addWidget(self.btn_export)
         button_layout.addWidget(self.btn_clear)
         button_layout.setSpacing(10)
         button_layout.setContentsMargins(5, 5, 5, 5)
 
+        # 模板任务队列
+        self.job_list = QtWidgets.QListWidget()
+        self.job_list.setMaximumHeight(110)
+        self.job_progress = QtWidgets.QProgressBar()
+        self.job_progress.setRange(0, 100)
+        self.job_progress.setValue(0)
+        self.btn_cancel = QtWidgets.QPushButton("取消任务")
+        self.btn_cancel.setEnabled(False)
+        self.btn_verify = QtWidgets.QPushButton("验证模板")
+        self.btn_verify.setEnabled(False)
+
+        job_side = QtWidgets.QVBoxLayout()
+        job_side.addWidget(self.job_progress)
+        job_side.addWidget(self.btn_verify)
+        job_side.addWidget(self.btn_cancel)
+        job_side.addStretch(1)
+        roi_side = QtWidgets.QVBoxLayout()
+        roi_side.addWidget(self.btn_auto_roi)
+        roi_side.addWidget(self.btn_roi_delete)
+        roi_side.addStretch(1)
+        job_layout = QtWidgets.QHBoxLayout()
+        job_layout.addWidget(self.roi_list, 1)
+        job_layout.addLayout(roi_side)
+        job_layout.addWidget(self.job_list, 1)
+        job_layout.addLayout(job_side)
+
         # 主布局
         main_layout = QtWidgets.QVBoxLayout(self)
         main_layout.addWidget(scroll)
         main_layout.addLayout(button_layout)
+        main_layout.addLayout(job_layout)
         main_layout.setStretch(0, 1)  # 图像区域占据更多空间
 
         # 状态栏
@@ -350,45 +708,97 @@ class TemplateMaker(QtWidgets.QWidget):
 
         # 连接信号和槽
         self.btn_load.clicked.connect(self.load_image)
+        self.btn_folder.clicked.connect(self.open_folder)
+        self.btn_project_open.clicked.connect(self.open_project)
+        self.btn_project_save.clicked.connect(self.save_project)
+        QtWidgets.QShortcut(QtGui.QKeySequence.Save, self, self.save_project)
+        self.btn_prev.clicked.connect(self.prev_image)
+        self.btn_next.clicked.connect(self.next_image)
+        QtWidgets.QShortcut(QtGui.QKeySequence(Qt.Key_PageUp), self, self.prev_image)
+        QtWidgets.QShortcut(QtGui.QKeySequence(Qt.Key_PageDown), self, self.next_image)
+        QtWidgets.QShortcut(QtGui.QKeySequence(Qt.Key_F12), self, self.toggle_profile_overlay)
+        QtWidgets.QShortcut(QtGui.QKeySequence("Ctrl+Shift+T"), self, self.export_profile)
         self.btn_pre.clicked.connect(self.preprocess_image)
         self.btn_save.clicked.connect(self.save_template)
         self.btn_export.clicked.connect(self.export_coordinates)
         self.btn_clear.clicked.connect(self.clear_points)
+        self.btn_cancel.clicked.connect(self.cancel_job)
+        self.btn_verify.clicked.connect(self.verify_template)
+        self.job_list.currentRowChanged.connect(self.update_cancel_button)
         self.label.polygon_finished.connect(self.on_polygon_finished)
+        self.label.polygon_edited.connect(self.on_polygon_edited)
+        self.label.polygon_started.connect(self.on_polygon_started)
+        self.label.circle_finished.connect(self.on_circle_finished)
+        self.roi_type.currentIndexChanged.connect(self.on_roi_type_changed)
+        self.chk_snap.toggled.connect(self.on_snap_toggled)
+        self.roi_list.currentRowChanged.connect(self.select_roi)
+        self.btn_roi_delete.clicked.connect(self.delete_roi)
+        self.btn_auto_roi.clicked.connect(self.propose_rois)
 
         # DLL 相关状态
-        self.CreateTemplateMethod = None
+        self.engine = None
         self.dll_loaded = False
+        self.template_cache = None
+        if self.config.template_cache:
+            self.template_cache = TemplateCache(self.config.template_cache,
+                                                int(self.config.template_cache_mb * 1024 * 1024))
+
+        # 模板任务: 单线程队列 (HALCON 引擎按顺序调用)，界面线程不再阻塞
+        self.job_pool = QtCore.QThreadPool(self)
+        self.job_pool.setMaxThreadCount(1)
+        self.jobs = {}        # 任务号 -> TemplateJob
+        self.job_items = {}   # 任务号 -> QListWidgetItem
+        self.next_job_id = 1
 
     def ensure_dll_loaded(self):
         """确保DLL已加载"""
         if self.dll_loaded:
             return True
 
-        try:
-            # 加载 HALCON DLL
-            clr.AddReference(HALCON_DOTNET)
-            print(f"HALCON DLL 加载成功: {HALCON_DOTNET}")
-
-            # 加载自定义引擎 DLL
-            clr.AddReference(ENGINE_DLL)
-            print(f"自定义引擎 DLL 加载成功: {ENGINE_DLL}")
-
-            # 获取当前加载的程序集
-            assemblies = clr.System.AppDomain.CurrentDomain.GetAssemblies()
-            engine_assembly = next((a for a in assemblies if a.GetName().Name == "TemplateEngineProj"), None)
-            if engine_assembly is None:
-                engine_assembly = clr.System.Reflection.Assembly.LoadFrom(ENGINE_DLL)
-
-            # 获取 CreateTemplate 方法
-            self.CreateTemplateMethod = get_create_template_method(engine_assembly)
+        cfg = self.config
+        if cfg.engine == "opencv":
+            # 无 HALCON 的开发环境
+            self.use_engine(create_engine("opencv"))
+            return True
 
-            if self.CreateTemplateMethod:
-                self.dll_loaded = True
+        # 常驻引擎服务已运行时直接使用，本进程不再加载 CLR
+        if cfg.engine in ("auto", "remote"):
+            remote, error = self.connect_service()
+            if remote is not None:
+                print("已连接常驻模板引擎服务")
+                self.use_engine(remote)
                 return True
-            else:
+            if cfg.engine == "remote":
+                QtWidgets.QMessageBox.critical(self, "引擎服务", f"常驻模板引擎服务不可用: {error or '服务未运行'}")
                 return False
+            if error:
+                print(f"常驻模板引擎服务不可用，改用本进程引擎: {error}")
+
+        # 检查DLL文件是否存在
+        for name, path in cfg.missing_dlls():
+            QtWidgets.QMessageBox.critical(
+                self,
+                "文件缺失",
+                f"找不到{name}文件:\n{path}\n请检查HALCON安装路径或配置文件 halcon_config.json。"
+            )
+            return False
+
+        try:
+            # 加载 HALCON DLL 与自定义引擎 DLL，并通过反射获取 CreateTemplate 方法
+            engine = DotNetTemplateEngine(cfg.halcon_dotnet, cfg.engine_dll, cfg.halcon_root)
+            engine.load()
+            print("成功获取 CreateTemplate 方法")
+            self.use_engine(engine)
+            return True
 
+        except RuntimeError as e:
+            QtWidgets.QMessageBox.critical(
+                self,
+                "反射错误",
+                f"无法获取 CreateTemplate 方法: {str(e)}\n"
+                f"请检查C#代码中的类名和方法名是否正确。"
+            )
+            return False
         except Exception as e:
             QtWidgets.QMessageBox.critical(
                 self,
@@ -401,6 +811,24 @@ class TemplateMaker(QtWidgets.QWidget):
             )
             return False
 
+    def connect_service(self):
+        """连接常驻引擎服务，返回 (引擎, 错误说明)；服务未运行时两者均为 None"""
+        try:
+            remote = create_engine("remote", self.config)
+            if not remote.available():
+                return None, None
+            remote.fixed_regions  # 查询并缓存服务端引擎类型
+            return remote, None
+        except (OSError, EOFError, AuthenticationError, RuntimeError) as e:
+            return None, f"{type(e).__name__}: {e}"
+
+    def use_engine(self, engine):
+        """设置模板引擎；配置了缓存目录时包装为带结果缓存的引擎"""
+        if self.template_cache is not None:
+            engine = CachedTemplateEngine(engine, self.template_cache)
+        self.engine = engine
+        self.dll_loaded = True
+
     def load_image(self):
         """加载图像文件"""
         # 首次操作时加载DLL
@@ -409,162 +837,526 @@ class TemplateMaker(QtWidgets.QWidget):
 
         path, _ = QtWidgets.QFileDialog.getOpenFileName(
             self, "选择图像", "",
-            "图像文件 (*.png *.jpg *.jpeg *.bmp *.tif *.tiff)"
+            "图像文件 (*.png *.jpg *.jpeg *.bmp *.tif *.tiff *.npy)"
         )
         if not path:
             return
 
-        # 使用OpenCV读取图像
-        img = cv2.imread(path)
-        if img is None:
-            QtWidgets.QMessageBox.critical(self, "加载错误", f"无法加载图片：{path}")
+        # 先只解码缩小的预览，全分辨率在需要时才加载
+        try:
+            with profiling.span("load_image.decode", path=Path(path).name):
+                lazy = LazyImage(path)
+                pyramid = ImagePyramid.from_lazy(lazy)
+        except (IOError, OSError) as e:
+            QtWidgets.QMessageBox.critical(self, "加载错误", f"无法加载图片：{path}\n{e}")
             return
 
-        self.current_image_path = path
-        self.image = img
+        # 单幅模式
+        if self.dataset is not None:
+            self.dataset.shutdown()
+            self.dataset = None
+            self.dataset_index = -1
+        self.show_image(lazy, pyramid)
+
+    def open_folder(self):
+        """文件夹模式：按文件名顺序浏览，后台预取后续图像"""
+        if not self.ensure_dll_loaded():
+            return
+
+        folder = QtWidgets.QFileDialog.getExistingDirectory(self, "选择图像文件夹")
+        if not folder:
+            return
+        paths = list_images(folder)
+        if not paths:
+            QtWidgets.QMessageBox.warning(self, "提示", "文件夹中没有图像文件")
+            return
+
+        if self.dataset is not None:
+            self.dataset.shutdown()
+        self.dataset = ImagePrefetcher(paths, prepare_dataset_entry)
+        self.dataset_index = -1
+        self.goto_image(0)
+
+    def goto_image(self, index):
+        """切换到数据集中的第 index 幅图像"""
+        if self.dataset is None or not 0 <= index < len(self.dataset):
+            return
+        try:
+            with profiling.span("goto_image.fetch", index=index):
+                lazy, pyramid = self.dataset.get(index)
+        except (IOError, OSError) as e:
+            QtWidgets.QMessageBox.critical(self, "加载错误", str(e))
+            return
+        self.dataset_index = index
+        self.show_image(lazy, pyramid)
+
+    def prev_image(self):
+        self.goto_image(self.dataset_index - 1)
+
+    def next_image(self):
+        self.goto_image(self.dataset_index + 1)
+
+    @profiling.timed("show_image")
+    def show_image(self, lazy, pyramid):
+        """切换当前图像并载入该图像的区域"""
+        # 打开项目时先保存上一幅图像的修改
+        if self.project is not None and self.lazy_image is not None and not self.loading_project:
+            self.write_project()
+
+        # 释放上一幅图像的全分辨率数据，预览留在预取缓存中
+        if self.lazy_image is not None and self.lazy_image is not lazy:
+            self.lazy_image.release()
+            self.base_pyramid.release()
+
+        self.current_image_path = lazy.path
+        self.lazy_image = lazy
+        self.base_pyramid = pyramid
+        self._image = None
+        self.overlay.reset(None)
+        self.snapper = None
         self.last_vis = None
-        self.orig_pts.clear()
+        self.geometry = self.annotations_for(lazy.path)
+        self.active_roi = -1
+        self.refresh_roi_list()
         self.label.points.clear()
+        self.label.drawing = False
         self.label.selected_point = -1
         self.label.zoom = 1.0
-        self.mask = None
 
-        # 更新显示
-        self.update_display(self.image)
+        # 更新显示 (已有区域时显示覆盖层)
+        if len(self.geometry):
+            self.render_overlay()
+        else:
+            self.display_image()
 
         # 更新状态栏
-        filename = Path(path).name
-        self.status_bar.showMessage(f"已加载图像: {filename}  尺寸: {img.shape[1]}x{img.shape[0]}")
+        filename = Path(lazy.path).name
+        w, h = lazy.size
+        position = f"[{self.dataset_index + 1}/{len(self.dataset)}] " if self.dataset is not None else ""
+        self.status_bar.showMessage(f"{position}已加载图像: {filename}  尺寸: {w}x{h}")
 
         # 启用相关按钮
         self.btn_pre.setEnabled(True)
-        for btn in (self.btn_save, self.btn_export, self.btn_clear):
-            btn.setEnabled(False)
+        self.btn_auto_roi.setEnabled(True)
+        self.update_roi_buttons()
+        self.btn_prev.setEnabled(self.dataset is not None and self.dataset_index > 0)
+        self.btn_next.setEnabled(self.dataset is not None and self.dataset_index < len(self.dataset) - 1)
+
+    def clear_image(self):
+        """清除当前图像及其区域，回到未加载图像的状态"""
+        if self.lazy_image is not None:
+            self.lazy_image.release()
+        self.current_image_path = None
+        self.lazy_image = None
+        self.base_pyramid = None
+        self._image = None
+        self.overlay.reset(None)
+        self.snapper = None
+        self.last_vis = None
+        self.geometry = GeometryStore()
+        self.active_roi = -1
+        self.refresh_roi_list()
+        self.label.clearImage()
+        self.btn_pre.setEnabled(False)
+        self.btn_auto_roi.setEnabled(False)
+        self.update_roi_buttons()
+        self.btn_prev.setEnabled(False)
+        self.btn_next.setEnabled(False)
+
+    def annotations_for(self, path):
+        """图像的区域存储：本次会话中已编辑的、项目文件中保存的，或新建"""
+        store = self.annotations.get(path)
+        if store is None:
+            store = self.project.geometry(path) if self.project is not None else None
+            if store is None:
+                store = GeometryStore()
+            self.annotations[path] = store
+        return store
+
+    def open_project(self):
+        """打开项目文件：恢复图像列表、各图像的区域与预处理参数"""
+        if not self.ensure_dll_loaded():
+            return
+        fn, _ = QtWidgets.QFileDialog.getOpenFileName(self, "打开项目", "", "项目文件 (*.hproj)")
+        if not fn:
+            return
+        # 先保存当前项目 (包括当前图像上次切换后的修改)，再读取新项目
+        if self.project is not None and self.lazy_image is not None:
+            self.write_project()
+        try:
+            project = ProjectFile(fn)
+            self.pipeline.configure(**project.params)
+        except (OSError, ValueError) as e:
+            QtWidgets.QMessageBox.critical(self, "打开项目错误", f"无法打开项目文件：{fn}\n{e}")
+            return
 
-    def preprocess_image(self):
-        """预处理图像（CLAHE + 伽马校正）"""
-        if self.image is None:
+        self.close_project()
+        self.project = project
+        self.annotations = {}
+        if self.dataset is not None:
+            self.dataset.shutdown()
+            self.dataset = None
+        if project.images:
+            self.dataset = ImagePrefetcher(project.images, prepare_dataset_entry)
+            self.dataset_index = -1
+            # 切换到项目的当前图像时不保存：上一幅图像不属于该项目，dataset_index 也尚未确定
+            self.loading_project = True
+            try:
+                self.goto_image(min(max(project.current, 0), len(project.images) - 1))
+            finally:
+                self.loading_project = False
+        else:
+            # 项目中没有图像：上一幅图像不属于该项目，不能继续显示 (其区域不会被保存)
+            self.clear_image()
+        self.status_bar.showMessage(
+            f"已打开项目 {Path(fn).name}: {len(project.images)} 幅图像，{len(project.annotated())} 幅已标注")
+
+    def save_project(self):
+        """保存项目：首次保存时选择文件，之后只追加修改过的内容"""
+        if self.lazy_image is None:
             return
+        if self.project is None:
+            fn, _ = QtWidgets.QFileDialog.getSaveFileName(self, "保存项目", "", "项目文件 (*.hproj)")
+            if not fn:
+                return
+            try:
+                self.project = ProjectFile.create(fn)
+            except OSError as e:
+                QtWidgets.QMessageBox.critical(self, "保存项目错误", f"无法创建项目文件：{fn}\n{e}")
+                return
+        written = self.write_project()
+        if written is not None:
+            self.status_bar.showMessage(
+                f"项目已保存: {Path(self.project.path).name} (写入 {written / 1024:.1f} KB)")
+
+    def write_project(self):
+        """把会话状态增量写入项目文件，返回写入的字节数；出错时返回 None"""
+        project = self.project
+        if self.dataset is not None:
+            project.images = list(self.dataset.paths)
+            project.current = self.dataset_index
+        else:
+            # 单幅模式：把当前图像并入项目已有的图像列表，不丢弃其他图像
+            path = os.path.abspath(self.lazy_image.path)
+            images = [os.path.abspath(p) for p in project.images]
+            if path not in images:
+                images.append(path)
+            project.images = images
+            project.current = images.index(path)
+        project.params = dict(self.pipeline.params)
+        for path, store in self.annotations.items():
+            project.set_geometry(path, store)
+        try:
+            with profiling.span("project.save"):
+                return project.save()
+        except OSError as e:
+            QtWidgets.QMessageBox.critical(self, "保存项目错误", f"保存项目时出错: {str(e)}")
+            return None
+
+    def close_project(self):
+        if self.project is not None:
+            self.project.close()
+            self.project = None
 
-        img = self.image.copy()
+    @property
+    def source_image(self):
+        """加载的原图 (全分辨率，首次访问时才解码或内存映射)"""
+        return self.lazy_image.full() if self.lazy_image is not None else None
 
-        # 转换为LAB颜色空间
-        lab = cv2.cvtColor(img, cv2.COLOR_BGR2LAB)
-        l, a, b = cv2.split(lab)
+    @property
+    def image(self):
+        """当前工作图像：预处理结果，未预处理时为原图"""
+        return self._image if self._image is not None else self.source_image
 
-        # 应用CLAHE
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-        cl = clahe.apply(l)
+    @image.setter
+    def image(self, img):
+        self._image = img
+
+    def display_image(self):
+        """显示当前工作图像；未预处理时使用由预览构建的金字塔，不加载原图"""
+        if self._image is not None:
+            self.update_display(self._image)
+        elif self.base_pyramid is not None:
+            self.label.setPyramid(self.base_pyramid)
+
+    def preprocess_image(self):
+        """预处理图像（可配置流水线，结果按图像与参数缓存）"""
+        if self.lazy_image is None:
+            return
 
-        # 合并通道并转换回BGR
-        img = cv2.cvtColor(cv2.merge((cl, a, b)), cv2.COLOR_LAB2BGR)
+        dialog = PreprocessDialog(self.pipeline, self.lazy_image.preview()[0], self)
+        if dialog.exec_() != QtWidgets.QDialog.Accepted:
+            return
 
-        # 应用伽马校正
-        inv_gamma = 1.0 / 0.8
-        table = np.array([(i / 255.0) ** inv_gamma * 255 for i in range(256)], np.uint8)
-        img = cv2.LUT(img, table)
+        QtWidgets.QApplication.setOverrideCursor(Qt.WaitCursor)
+        try:
+            with profiling.span("preprocess.run", params=self.pipeline.describe()):
+                img = self.pipeline.run(self.source_image)
+        finally:
+            QtWidgets.QApplication.restoreOverrideCursor()
 
         self.image = img
-        self.clear_points()
-        self.update_display(self.image)
-        self.status_bar.showMessage("图像预处理完成 (CLAHE + 伽马校正)")
+        self.overlay.reset(img)
+        self.clear_points()  # 同时刷新显示
+        self.status_bar.showMessage(f"图像预处理完成 ({self.pipeline.describe()})")
 
+    @profiling.timed("on_polygon_finished")
     def on_polygon_finished(self, poly):
-        """多边形绘制完成时的处理"""
+        """多边形绘制完成：加入区域列表 (模板区域或排除区域)"""
         if len(poly) < 3:
             QtWidgets.QMessageBox.warning(self, "无效多边形", "至少需要3个点构成多边形")
             return
 
         # 存储原始坐标点
-        self.orig_pts = [(x, y) for x, y in poly]
-
-        # 创建掩码
-        h, w = self.image.shape[:2]
-        mask = np.zeros((h, w), np.uint8)
-        pts = np.array(self.orig_pts, dtype=np.int32)
-        cv2.fillPoly(mask, [pts], 255)
-        self.mask = mask
-
-        # 创建带透明度的覆盖层
-        overlay = self.image.copy()
-        cv2.fillPoly(overlay, [pts], (255, 150, 0))  # 蓝色填充
-        alpha = 0.3
-        beta = 1.0 - alpha
-        self.last_vis = cv2.addWeighted(self.image, beta, overlay, alpha, 0)
-
-        # 更新显示
-        self.update_display(self.last_vis)
-
-        # 启用保存和导出按钮
-        self.btn_save.setEnabled(True)
-        self.btn_export.setEnabled(True)
-        self.btn_clear.setEnabled(True)
+        if 0 <= self.active_roi < len(self.geometry):
+            self.geometry.set_polygon(self.active_roi, poly)
+        else:
+            role = EXCLUDE if self.roi_type.currentData() == "exclude" else INCLUDE
+            self.active_roi = self.geometry.add_polygon(poly, role)
+        self.refresh_roi_list()
+
+        # 掩码与覆盖层只在区域外接矩形内生成
+        self.render_overlay()
+        self.update_roi_buttons()
 
         # 更新状态栏
-        self.status_bar.showMessage(f"多边形已创建，包含 {len(self.orig_pts)} 个点")
+        self.status_bar.showMessage(
+            f"{self.roi_type.currentText()}已创建，包含 {len(poly)} 个点 (共 {len(self.geometry)} 个区域)")
+
+    @profiling.timed("on_polygon_edited")
+    def on_polygon_edited(self, poly):
+        """拖动已闭合多边形的顶点时实时更新覆盖层"""
+        if self.last_vis is None or not 0 <= self.active_roi < len(self.geometry):
+            return
+        self.geometry.set_polygon(self.active_roi, poly)
+        self.render_overlay()
+
+    def on_polygon_started(self):
+        """开始绘制新的多边形，之前的多边形保留为区域"""
+        self.active_roi = -1
+        self.roi_list.blockSignals(True)
+        self.roi_list.setCurrentRow(-1)
+        self.roi_list.blockSignals(False)
+
+    def on_circle_finished(self, cx, cy, radius):
+        """圆形区域：半径下限取默认值 (不超过所画半径)"""
+        self.geometry.add_circle((cx, cy), (min(DEFAULT_RADIUS[0], radius), radius))
+        self.active_roi = -1
+        self.refresh_roi_list()
+        self.render_overlay()
+        self.update_roi_buttons()
+        self.status_bar.showMessage(f"圆形区域已创建: 圆心 ({cx:.0f}, {cy:.0f})  半径 {radius:.1f}")
+
+    def on_snap_toggled(self, checked):
+        self.label.snap = self.snap_point if checked else None
+
+    def edge_snapper(self):
+        """当前工作图像的边缘吸附；切换图像或预处理后重新建立缓存"""
+        image = self.image
+        if image is None:
+            return None
+        if self.snapper is None or self.snapper.image is not image:
+            self.snapper = EdgeSnapper(image)
+        return self.snapper
+
+    def snap_point(self, x, y, radius):
+        """在当前工作图像上吸附顶点"""
+        snapper = self.edge_snapper()
+        return snapper.snap(x, y, radius) if snapper is not None else None
+
+    def propose_rois(self):
+        """由当前工作图像 (含预处理) 自动提议区域，加入区域列表后可逐个编辑顶点或删除"""
+        snapper = self.edge_snapper()
+        if snapper is None:
+            return
+        # .NET 引擎只接受 CreateTemplate 固定参数的区域，提议不超出其剩余容量
+        limits = fixed_limits(self.geometry) if getattr(self.engine, "fixed_regions", False) else {}
+        if limits and not any(limits.values()):
+            self.status_bar.showMessage("CreateTemplate 只能容纳一个模板多边形、一个圆与两个排除多边形，已没有空位")
+            return
+        QtWidgets.QApplication.setOverrideCursor(Qt.WaitCursor)
+        try:
+            with profiling.span("auto_roi.propose"):
+                proposals = propose_regions(snapper.image, snapper, **limits)
+        finally:
+            QtWidgets.QApplication.restoreOverrideCursor()
+        if not proposals:
+            self.status_bar.showMessage("未找到候选区域")
+            return
+
+        first = len(self.geometry)
+        for item in proposals:
+            if item["type"] == "circle":
+                self.geometry.add_circle(item["center"], item["radius"], item["role"])
+            else:
+                self.geometry.add_polygon(item["points"], item["role"])
+        self.active_roi = -1
+        self.refresh_roi_list()
+        self.render_overlay()
+        # 选中第一个提议：多边形载入标签，可直接拖动顶点调整
+        self.roi_list.setCurrentRow(first)
+        self.update_roi_buttons()
+        self.status_bar.showMessage(
+            f"已添加 {len(proposals)} 个建议区域 (#{first + 1}~#{len(self.geometry)})：选中后可调整顶点，不需要的可删除")
+
+    def on_roi_type_changed(self, index):
+        self.label.mode = "circle" if self.roi_type.itemData(index) == "circle" else "polygon"
+        # 切换工具时丢弃未完成的图形
+        if self.label.drawing:
+            self.label.points.clear()
+            self.label.drawing = False
+            self.label.update()
+
+    def refresh_roi_list(self):
+        """按区域存储重建区域列表"""
+        self.roi_list.blockSignals(True)
+        self.roi_list.clear()
+        for i in range(len(self.geometry)):
+            role = "排除区域" if self.geometry.role(i) == EXCLUDE else "模板区域"
+            if self.geometry.kind(i) == CIRCLE:
+                cx, cy, r0, r1 = self.geometry.circle(i)
+                text = f"#{i + 1}  圆形{role}  圆心({cx:.0f},{cy:.0f})  半径 {r0:g}~{r1:.1f}"
+            else:
+                text = f"#{i + 1}  {role}  多边形 ({len(self.geometry.points(i))} 点)"
+            self.roi_list.addItem(text)
+        self.roi_list.setCurrentRow(self.active_roi)
+        self.roi_list.blockSignals(False)
+
+    def select_roi(self, row):
+        """选中列表中的多边形区域时载入标签进行编辑"""
+        self.btn_roi_delete.setEnabled(row >= 0)
+        if not 0 <= row < len(self.geometry):
+            return
+        self.label.points.clear()
+        self.label.selected_point = -1
+        self.label.drawing = False
+        if self.geometry.kind(row) == POLYGON:
+            self.label.points.extend(self.geometry.points(row))
+            self.active_roi = row
+        else:
+            self.active_roi = -1
+        self.label.update()
+
+    def delete_roi(self):
+        row = self.roi_list.currentRow()
+        if not 0 <= row < len(self.geometry):
+            return
+        self.geometry.remove(row)
+        if row == self.active_roi:
+            self.label.points.clear()
+            self.label.selected_point = -1
+            self.label.update()
+            self.active_roi = -1
+        elif row < self.active_roi:
+            self.active_roi -= 1
+        self.refresh_roi_list()
+        self.render_overlay()
+        self.update_roi_buttons()
+        self.status_bar.showMessage(f"已删除区域 #{row + 1}")
+
+    def update_roi_buttons(self):
+        has_rois = len(self.geometry) > 0
+        self.btn_save.setEnabled(has_rois)
+        self.btn_verify.setEnabled(has_rois)
+        self.btn_export.setEnabled(has_rois or self.project is not None and bool(self.project.annotated()))
+        self.btn_clear.setEnabled(has_rois or bool(self.label.points))
+        self.btn_roi_delete.setEnabled(self.roi_list.currentRow() >= 0)
+
+    @profiling.timed("render_overlay")
+    def render_overlay(self):
+        """增量绘制全部区域的半透明覆盖层，只刷新发生变化的区域"""
+        if self.overlay.base is not self.image:
+            self.overlay.reset(self.image)
+        shapes = {}
+        for i in range(len(self.geometry)):
+            if self.geometry.kind(i) == CIRCLE:
+                color = ROI_COLORS["circle"]
+            else:
+                color = ROI_COLORS["exclude" if self.geometry.role(i) == EXCLUDE else "include"]
+            shapes[i] = (self.geometry.outline(i), color)
+        vis, dirty = self.overlay.render(shapes)
+        self.last_vis = vis
+        if self.label.pyramid is None or self.label.pyramid.levels[0] is not vis:
+            # 首次显示覆盖层缓冲区
+            self.update_display(vis)
+        elif dirty is not None:
+            self.update_display(vis, dirty)
 
     def clear_points(self):
-        """清除所有点"""
+        """清除所有点与区域"""
         self.label.points.clear()
+        self.label.drawing = False
         self.label.selected_point = -1
         self.label.zoom = 1.0
-        self.mask = None
         self.last_vis = None
-        self.orig_pts.clear()
-
-        # 显示原始图像
-        if self.image is not None:
-            self.update_display(self.image)
+        self.geometry.clear()
+        self.active_roi = -1
+        self.refresh_roi_list()
+
+        # 显示原始图像：已有覆盖层缓冲区时只恢复覆盖层所在区域
+        dirty = self.overlay.clear() if self.overlay.base is not None else None
+        if self.overlay.vis is not None and self.label.pyramid is not None \
+                and self.label.pyramid.levels[0] is self.overlay.vis:
+            if dirty is not None:
+                self.update_display(self.overlay.vis, dirty)
+            self.label.apply_zoom()
+        else:
+            self.display_image()
 
         # 禁用相关按钮
-        for btn in (self.btn_save, self.btn_export):
-            btn.setEnabled(False)
+        self.update_roi_buttons()
 
         self.status_bar.showMessage("已清除所有点")
 
     def export_coordinates(self):
-        """导出坐标到CSV或TXT文件"""
-        if not self.orig_pts:
+        """导出区域坐标 (CSV / TXT / NPZ 列存储 / HALCON 可读的 DXF)：当前图像或全部已标注图像"""
+        sources = dataset_sources(self.annotations, self.project)
+        if len(sources) > 1:
+            answer = QtWidgets.QMessageBox.question(
+                self, "导出坐标", f"导出全部 {len(sources)} 幅已标注图像的区域？\n选择“否”只导出当前图像。",
+                QtWidgets.QMessageBox.Yes | QtWidgets.QMessageBox.No | QtWidgets.QMessageBox.Cancel,
+                QtWidgets.QMessageBox.Yes)
+            if answer == QtWidgets.QMessageBox.Cancel:
+                return
+            if answer == QtWidgets.QMessageBox.No:
+                sources = [(self.current_image_path, self.geometry)] if len(self.geometry) else []
+        if not sources:
             QtWidgets.QMessageBox.warning(self, "提示", "无坐标可导出")
             return
 
-        # 获取保存路径
-        fn, _ = QtWidgets.QFileDialog.getSaveFileName(
-            self, "保存坐标", "", "CSV (*.csv);;TXT (*.txt);;All Files (*)"
+        # 获取保存路径 (未写扩展名时按所选格式补上)
+        fn, selected = QtWidgets.QFileDialog.getSaveFileName(
+            self, "保存坐标", "", "CSV (*.csv);;TXT (*.txt);;NPZ 列存储 (*.npz);;HALCON XLD 轮廓 (*.dxf)"
         )
         if not fn:
             return
+        if Path(fn).suffix.lower() not in EXPORT_FORMATS:
+            fn += selected[selected.rfind("*") + 1:selected.rfind(")")] or ".csv"
 
+        QtWidgets.QApplication.setOverrideCursor(Qt.WaitCursor)
         try:
-            if fn.lower().endswith('.csv'):
-                # 保存为CSV格式
-                with open(fn, 'w', newline='', encoding='utf-8') as f:
-                    w = csv.writer(f)
-                    w.writerow(['序号', 'X坐标', 'Y坐标'])
-                    for i, (x, y) in enumerate(self.orig_pts, 1):
-                        w.writerow([i, x, y])
-            else:
-                # 保存为TXT格式
-                with open(fn, 'w', encoding='utf-8') as f:
-                    f.write('序号\tX坐标\tY坐标\n')
-                    for i, (x, y) in enumerate(self.orig_pts, 1):
-                        f.write(f"{i}\t{x}\t{y}\n")
-
-            # 显示成功消息
-            filename = Path(fn).name
-            QtWidgets.QMessageBox.information(self, "完成", f"已保存坐标文件: {filename}")
-            self.status_bar.showMessage(f"已导出坐标到 {filename}")
+            with profiling.span("export.coordinates", images=len(sources)):
+                stats = export_regions(sources, fn)
         except Exception as e:
+            QtWidgets.QApplication.restoreOverrideCursor()
             QtWidgets.QMessageBox.critical(self, "导出错误", f"导出坐标时出错: {str(e)}")
+            return
+        QtWidgets.QApplication.restoreOverrideCursor()
+
+        # 显示成功消息
+        target = Path(fn).name if len(stats["files"]) == 1 else str(Path(fn).with_suffix(""))
+        summary = f"{stats['images']} 幅图像、{stats['rois']} 个区域、{stats['vertices']} 个顶点"
+        QtWidgets.QMessageBox.information(self, "完成", f"已导出 {summary}\n{target}")
+        self.status_bar.showMessage(f"已导出坐标到 {target} ({summary})")
 
     def save_template(self):
-        """保存HALCON模板"""
+        """提交HALCON模板生成任务 (后台执行，界面可继续标注)"""
         # 确保DLL已加载
-        if not self.ensure_dll_loaded() or not self.CreateTemplateMethod:
+        if not self.ensure_dll_loaded():
             return
 
-        if not self.orig_pts:
-            QtWidgets.QMessageBox.warning(self, "提示", "请先创建多边形")
+        if not len(self.geometry.indices(POLYGON, INCLUDE)):
+            QtWidgets.QMessageBox.warning(self, "提示", "请先创建模板区域多边形")
             return
 
         # 获取保存路径前缀
@@ -574,88 +1366,226 @@ class TemplateMaker(QtWidgets.QWidget):
         if not output_prefix:
             return
 
-        try:
-            # 硬编码的参数
-            circle_row, circle_col = 172, 197
-            radius_min, radius_max = 1.0, 10.0
-            contour1X = [103, 289, 266, 139, 103]
-            contour1Y = [ 88,  83, 253, 258,  88]
-            contour2X = [593, 945, 948, 947, 956, 1310, 1320, 599, 597, 593, 593]
-            contour2Y = [292, 287, 499, 517, 592,  593,  875, 882, 538, 471, 292]
-
-            # 提取多边形坐标
-            corner_rows = [pt[1] for pt in self.orig_pts]
-            corner_cols = [pt[0] for pt in self.orig_pts]
-
-            # 显示等待光标
-            QtWidgets.QApplication.setOverrideCursor(Qt.WaitCursor)
-
-            # 创建.NET数组
-            contour1X_arr = clr.System.Array[clr.System.Int32](contour1X)
-            contour1Y_arr = clr.System.Array[clr.System.Int32](contour1Y)
-            contour2X_arr = clr.System.Array[clr.System.Int32](contour2X)
-            contour2Y_arr = clr.System.Array[clr.System.Int32](contour2Y)
-            corner_rows_arr = clr.System.Array[clr.System.Int32](corner_rows)
-            corner_cols_arr = clr.System.Array[clr.System.Int32](corner_cols)
-
-            # 通过反射调用C#方法
-            self.CreateTemplateMethod.Invoke(None, [
-                self.current_image_path,
-                output_prefix,
-                circle_row,
-                circle_col,
-                radius_min,
-                radius_max,
-                contour1X_arr,
-                contour1Y_arr,
-                contour2X_arr,
-                contour2Y_arr,
-                corner_rows_arr,
-                corner_cols_arr
-            ])
-
-            # 恢复光标
-            QtWidgets.QApplication.restoreOverrideCursor()
+        # 提交时复制区域，之后修改不影响排队中的任务；全部区域在一次引擎调用中提交
+        with profiling.span("save_template.submit", rois=len(self.geometry)):
+            request = TemplateRequest.from_geometry(self.current_image_path, output_prefix, self.geometry.copy())
+            self.submit_job(TemplateJob(self.next_job_id, self.engine, request, self.simplify_args()))
+        self.status_bar.showMessage(f"模板任务 #{self.next_job_id - 1} 已加入队列")
 
-            # 显示成功消息
-            QtWidgets.QMessageBox.information(self, "完成", "HALCON 模板已生成！")
-            self.status_bar.showMessage("模板生成成功")
+    def verify_template(self):
+        """用样本图像验证当前区域的匹配稳定性与耗时 (后台执行，不需要 HALCON)"""
+        if not len(self.geometry.indices(role=INCLUDE)):
+            QtWidgets.QMessageBox.warning(self, "提示", "请先创建模板区域")
+            return
+        folder = QtWidgets.QFileDialog.getExistingDirectory(self, "选择验证样本文件夹")
+        if not folder:
+            return
+        samples = sample_paths(folder)
+        if not samples:
+            QtWidgets.QMessageBox.warning(self, "提示", "文件夹中没有图像")
+            return
+        request = TemplateRequest.from_geometry(self.current_image_path, "", self.geometry.copy())
+        self.submit_job(VerifyJob(self.next_job_id, request, samples, simplify=self.simplify_args()))
+        self.status_bar.showMessage(f"验证任务 #{self.next_job_id - 1} 已加入队列 ({len(samples)} 幅样本)")
+
+    def simplify_args(self):
+        """提交任务时的多边形简化参数 (容差, 方法)，容差为 0 时不简化"""
+        tolerance = self.config.simplify_tolerance
+        return (tolerance, self.config.simplify_method) if tolerance > 0 else None
+
+    def submit_job(self, job):
+        """把任务加入列表与线程池"""
+        self.next_job_id += 1
+        job.signals.progress.connect(self.on_job_progress)
+        job.signals.finished.connect(self.on_job_finished)
+        job.signals.failed.connect(self.on_job_failed)
+
+        item = QtWidgets.QListWidgetItem()
+        self.job_list.addItem(item)
+        self.jobs[job.job_id] = job
+        self.job_items[job.job_id] = item
+        self.set_job_status(job.job_id, "排队中")
+
+        self.job_pool.start(job)
+        self.update_cancel_button()
+
+    def set_job_status(self, job_id, status):
+        """更新任务列表中的状态文字"""
+        self.job_items[job_id].setText(f"#{job_id}  {self.jobs[job_id].title()}    [{status}]")
+
+    def selected_job(self):
+        """当前选中的未结束任务"""
+        item = self.job_list.currentItem()
+        for job_id, it in self.job_items.items():
+            if it is item and job_id in self.jobs:
+                return self.jobs[job_id]
+        return None
 
-        except Exception as e:
-            # 确保恢复光标状态
-            QtWidgets.QApplication.restoreOverrideCursor()
+    def update_cancel_button(self, *_):
+        job = self.selected_job()
+        self.btn_cancel.setEnabled(job is not None and not job.cancelled)
 
-            # 显示错误信息
-            QtWidgets.QMessageBox.critical(
-                self,
-                "模板生成错误",
-                f"生成模板时发生错误:\n{str(e)}\n\n"
-                "可能原因:\n"
-                "1. 图像路径无效\n"
-                "2. 参数超出范围\n"
-                "3. HALCON 许可证问题\n"
-                "4. 内存不足"
-            )
-            self.status_bar.showMessage(f"模板生成失败: {str(e)}")
+    def cancel_job(self):
+        """取消选中的任务：排队中的直接移出，运行中的丢弃结果"""
+        job = self.selected_job()
+        if job is None:
+            return
+        job.cancel()
+        if self.job_pool.tryTake(job):
+            self.finish_job(job.job_id, "已取消")
+        else:
+            self.set_job_status(job.job_id, "取消中 (引擎调用结束后丢弃结果)")
+        self.update_cancel_button()
+
+    def finish_job(self, job_id, status):
+        """任务结束：更新列表并释放任务对象"""
+        self.set_job_status(job_id, status)
+        del self.jobs[job_id]
+        if not self.jobs:
+            self.job_progress.setRange(0, 100)
+            self.job_progress.setValue(0)
+        self.update_cancel_button()
+
+    def on_job_progress(self, job_id, percent, message):
+        if job_id not in self.jobs or self.jobs[job_id].cancelled:
+            return
+        if percent < 0:
+            self.job_progress.setRange(0, 0)  # 引擎调用期间显示忙碌
+        else:
+            self.job_progress.setRange(0, 100)
+            self.job_progress.setValue(percent)
+        self.set_job_status(job_id, message)
+
+    def on_job_finished(self, job_id, artifacts):
+        job = self.jobs[job_id]
+        if job.cancelled:
+            self.finish_job(job_id, "已取消")
+            return
+        if isinstance(job, VerifyJob):
+            self.on_verify_finished(job_id, artifacts[0])
+            return
+        self.finish_job(job_id, "完成 (命中缓存)" if job.cache_hit else "完成")
+        message = f"模板 #{job_id} 生成成功: {job.request.output_prefix}"
+        if job.seconds is not None:
+            message += f"  耗时 {job.seconds:.2f} s"
+        if job.vertices is not None:
+            message += f"  顶点 {job.vertices[0]} → {job.vertices[1]}"
+        if self.template_cache is not None:
+            stats = self.template_cache.stats()
+            message += (f"  | 模板缓存 命中 {stats['hits']} / 未命中 {stats['misses']}，"
+                        f"节省 {stats['saved_seconds']:.1f} s")
+        self.status_bar.showMessage(message)
+
+    def on_verify_finished(self, job_id, report):
+        summary = report["summary"]
+        passed = summary["passed"]
+        self.finish_job(job_id, "验证通过" if passed else "验证未通过")
+        text = format_summary(summary)
+        if passed:
+            QtWidgets.QMessageBox.information(self, "模板验证", text)
+        else:
+            QtWidgets.QMessageBox.warning(self, "模板验证", text)
+        self.status_bar.showMessage(
+            f"验证 #{job_id}: 匹配率 {summary['match_rate']:.0%}，p95 {summary['latency_ms']['p95']:.1f} ms")
+
+    def on_job_failed(self, job_id, error):
+        job = self.jobs[job_id]
+        if job.cancelled:
+            self.finish_job(job_id, "已取消")
+            return
+        self.finish_job(job_id, "失败")
+        if isinstance(job, VerifyJob):
+            QtWidgets.QMessageBox.critical(self, "模板验证错误", f"验证 #{job_id} 出错:\n{error}")
+            self.status_bar.showMessage(f"验证 #{job_id} 失败: {error}")
+            return
+        QtWidgets.QMessageBox.critical(
+            self,
+            "模板生成错误",
+            f"模板 #{job_id} 生成时发生错误:\n{error}\n\n"
+            "可能原因:\n"
+            "1. 图像路径无效\n"
+            "2. 参数超出范围\n"
+            "3. HALCON 许可证问题\n"
+            "4. 内存不足"
+        )
+        self.status_bar.showMessage(f"模板 #{job_id} 生成失败: {error}")
 
-    def update_display(self, img):
-        """更新图像显示"""
+    def toggle_profile_overlay(self):
+        """显示/隐藏性能调试覆盖层；计时未开启时同时开启"""
+        if self.profile_overlay.isVisible():
+            self.profile_overlay.hide()
+            self.profile_timer.stop()
+            return
+        if not profiling.enabled():
+            profiling.enable()
+            self.status_bar.showMessage("已开启性能计时 (F12 隐藏覆盖层，Ctrl+Shift+T 导出 trace)")
+        self.refresh_profile_overlay()
+        self.profile_overlay.show()
+        self.profile_overlay.raise_()
+        self.profile_timer.start()
+
+    def refresh_profile_overlay(self):
+        self.profile_overlay.setText(profiling.profiler.format_table())
+        self.profile_overlay.adjustSize()
+        self.profile_overlay.move(max(0, self.scroll.width() - self.profile_overlay.width() - 24), 8)
+
+    def export_profile(self):
+        """导出 Chrome trace (chrome://tracing 或 Perfetto 打开) 与各阶段统计"""
+        if not profiling.enabled():
+            QtWidgets.QMessageBox.information(self, "性能计时", "性能计时未开启，按 F12 开启后再操作")
+            return
+        fn, _ = QtWidgets.QFileDialog.getSaveFileName(self, "导出性能记录", "trace.json", "JSON 文件 (*.json)")
+        if not fn:
+            return
+        try:
+            count = profiling.profiler.export(fn)
+        except OSError as e:
+            QtWidgets.QMessageBox.critical(self, "导出错误", f"导出性能记录时出错: {str(e)}")
+            return
+        self.status_bar.showMessage(f"已导出 {count} 个计时事件到 {Path(fn).name}")
+
+    def closeEvent(self, event):
+        """关闭窗口前处理未完成的模板任务"""
+        if self.jobs:
+            reply = QtWidgets.QMessageBox.question(
+                self, "任务未完成",
+                f"还有 {len(self.jobs)} 个模板任务未完成，确定退出吗？\n"
+                "排队中的任务将被取消，正在运行的任务会等待其完成。"
+            )
+            if reply != QtWidgets.QMessageBox.Yes:
+                event.ignore()
+                return
+            for job in self.jobs.values():
+                job.cancel()
+            self.job_pool.clear()
+            self.job_pool.waitForDone()
+        if self.project is not None:
+            self.write_project()
+            self.close_project()
+        if self.dataset is not None:
+            self.dataset.shutdown()
+        super().closeEvent(event)
+
+    @profiling.timed("update_display")
+    def update_display(self, img, region=None):
+        """
+        更新图像显示。img 直接作为显示缓冲区 (不复制)；
+        若 img 就是当前显示的缓冲区且给出了 region=(x, y, w, h)，只重新上传该区域。
+        """
         try:
-            # 将OpenCV图像转换为Qt图像
-            rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-            h, w, ch = rgb.shape
-            bytes_per_line = ch * w
-            qimg = QtGui.QImage(rgb.data, w, h, bytes_per_line, QtGui.QImage.Format_RGB888)
-            pix = QtGui.QPixmap.fromImage(qimg)
-
-            # 更新标签
-            self.label.setPixmap(pix)
+            pyramid = self.label.pyramid
+            if region is not None and pyramid is not None and pyramid.levels[0] is img:
+                self.label.update_region(*region)
+            else:
+                # 标签内部构建显示金字塔，按需生成可见瓦片
+                self.label.setImage(img)
         except Exception as e:
             QtWidgets.QMessageBox.critical(self, "显示错误", f"更新显示时出错: {str(e)}")
 
 # —— 五、应用程序入口
-if __name__ == '__main__':
-    app = QtWidgets.QApplication(sys.argv)
+def create_application(argv=None):
+    """创建 QApplication 并设置深色主题"""
+    app = QtWidgets.QApplication(sys.argv if argv is None else argv)
     app.setStyle("Fusion")
 
     # 设置深色主题
@@ -673,10 +1603,19 @@ if __name__ == '__main__':
     dark_palette.setColor(QtGui.QPalette.Highlight, QtGui.QColor(0, 120, 215))
     dark_palette.setColor(QtGui.QPalette.HighlightedText, QtGui.QColor(255, 255, 255))
     app.setPalette(dark_palette)
+    return app
+
+
+def main():
+    app = create_application()
 
     # 创建并显示主窗口
     win = TemplateMaker()
     win.showMaximized()
 
     # 应用程序退出
-    sys.exit(app.exec_())
+    return app.exec_()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
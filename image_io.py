@@ -0,0 +1,371 @@
+# -*- coding: utf-8 -*-
+"""
+延迟图像加载。
+
+先解码缩小的预览 (JPEG 在解码阶段直接缩小)，全分辨率只在真正需要时才读取；
+未压缩的 TIFF 与 .npy 文件通过内存映射访问，只有被访问的区域才会进入内存。
+预览与全分辨率图像都是 BGR 三通道 (灰度图的内存映射扩展为三通道视图，不复制)，
+预览尺寸为原图宽高除以缩小倍数后向上取整，与显示金字塔逐层 2 倍缩小的尺寸一致。
+浏览文件夹时由 ImagePrefetcher 在后台预先解码后续图像。
+"""
+import os
+import struct
+import functools
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, CancelledError
+
+from app_config import lazy_import
+from lru_cache import ByteLRU
+
+# 延迟导入：首次使用时才加载 OpenCV / NumPy
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+
+# 预览最长边不超过该值
+PREVIEW_MAX_SIDE = 2048
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff", ".npy")
+
+# 解析损坏 (截断) 的文件头时可能出现的异常，统一转换为 IOError
+_CORRUPT_ERRORS = (struct.error, KeyError, IndexError, ValueError)
+
+
+def _corrupt_as_ioerror(func):
+    """把 func(path, ...) 解析损坏文件时的异常转换为 IOError，调用方只需处理 IOError"""
+    @functools.wraps(func)
+    def wrapper(path, *args, **kwargs):
+        try:
+            return func(path, *args, **kwargs)
+        except _CORRUPT_ERRORS as e:
+            raise IOError(f"图片文件已损坏：{path} ({type(e).__name__}: {e})") from e
+    return wrapper
+
+
+def _reduced_flag(factor):
+    """缩小倍数对应的 imread 标志"""
+    return {
+        1: cv2.IMREAD_COLOR,
+        2: cv2.IMREAD_REDUCED_COLOR_2,
+        4: cv2.IMREAD_REDUCED_COLOR_4,
+        8: cv2.IMREAD_REDUCED_COLOR_8,
+    }[factor]
+
+
+def is_memmap(arr):
+    """数组 (或其视图链上的某个数组) 是否为内存映射"""
+    while arr is not None:
+        if isinstance(arr, np.memmap):
+            return True
+        arr = getattr(arr, "base", None)
+    return False
+
+
+def _as_bgr(arr):
+    """单通道图像扩展为 BGR 三通道的只读视图 (不复制)"""
+    if arr.ndim == 2:
+        arr = arr[..., None]
+    return np.broadcast_to(arr, arr.shape[:2] + (3,)) if arr.shape[2] == 1 else arr
+
+
+def _read_tiff_ifd(f):
+    """读取 TIFF 第一个 IFD，返回 {标签: 值列表}；不是 (经典) TIFF 时返回 None"""
+    head = f.read(8)
+    if head[:2] == b"II":
+        endian = "<"
+    elif head[:2] == b"MM":
+        endian = ">"
+    else:
+        return None
+    magic, offset = struct.unpack(endian + "HI", head[2:8])
+    if magic != 42:
+        return None
+
+    sizes = {1: ("B", 1), 3: ("H", 2), 4: ("I", 4)}
+    f.seek(offset)
+    count, = struct.unpack(endian + "H", f.read(2))
+    entries = f.read(count * 12)
+    tags = {}
+    for i in range(count):
+        tag, typ, n, value = struct.unpack(endian + "HHI4s", entries[i * 12:(i + 1) * 12])
+        if typ not in sizes:
+            continue
+        code, size = sizes[typ]
+        if n * size <= 4:
+            raw = value[:n * size]
+        else:
+            pos = f.tell()
+            f.seek(struct.unpack(endian + "I", value)[0])
+            raw = f.read(n * size)
+            f.seek(pos)
+        tags[tag] = list(struct.unpack(endian + code * n, raw))
+    return tags
+
+
+@_corrupt_as_ioerror
+def tiff_memmap_layout(path):
+    """
+    若 path 是可直接内存映射的 TIFF (未压缩、8 位、像素交错、条带连续)，
+    返回 (偏移, 高, 宽, 通道数)，否则返回 None。
+    """
+    with open(path, "rb") as f:
+        tags = _read_tiff_ifd(f)
+    if not tags or 322 in tags:                      # 分块 (tiled) TIFF 不支持
+        return None
+    width, height = tags[256][0], tags[257][0]
+    spp = tags.get(277, [1])[0]
+    if tags.get(259, [1])[0] != 1 or any(b != 8 for b in tags.get(258, [8])):
+        return None
+    # 只支持 BlackIsZero 灰度与 RGB(A)
+    if spp not in (1, 3, 4) or tags.get(262, [1])[0] not in (1, 2):
+        return None
+    if spp > 1 and tags.get(284, [1])[0] != 1:
+        return None
+    offsets, counts = tags.get(273), tags.get(279)
+    if not offsets or not counts:
+        return None
+    for off, cnt, nxt in zip(offsets, counts, offsets[1:]):
+        if off + cnt != nxt:
+            return None
+    if sum(counts) < width * height * spp:
+        return None
+    return offsets[0], height, width, spp
+
+
+@_corrupt_as_ioerror
+def image_size(path):
+    """只读取文件头获取 (宽, 高)，支持 PNG/JPEG/BMP/TIFF/NPY，未知格式返回 None"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".npy":
+        shape = np.load(path, mmap_mode="r").shape
+        return shape[1], shape[0]
+    with open(path, "rb") as f:
+        head = f.read(26)
+        if head[:8] == b"\x89PNG\r\n\x1a\n":
+            return struct.unpack(">II", head[16:24])
+        if head[:2] == b"BM":
+            w, h = struct.unpack("<ii", head[18:26])
+            return w, abs(h)
+        if head[:2] in (b"II", b"MM"):
+            f.seek(0)
+            tags = _read_tiff_ifd(f)
+            return (tags[256][0], tags[257][0]) if tags else None
+        if head[:2] == b"\xff\xd8":
+            f.seek(2)
+            while True:
+                marker = f.read(4)
+                if len(marker) < 4 or marker[0] != 0xFF:
+                    return None
+                length = struct.unpack(">H", marker[2:4])[0]
+                # SOF0..SOF15 (不含 DHT/JPG/DAC)
+                if 0xC0 <= marker[1] <= 0xCF and marker[1] not in (0xC4, 0xC8, 0xCC):
+                    h, w = struct.unpack(">xHH", f.read(5))
+                    return w, h
+                f.seek(length - 2, os.SEEK_CUR)
+    return None
+
+
+class LazyImage:
+    """
+    延迟加载的图像。
+      preview()  —— 缩小的预览 (返回 (图像, 缩小倍数))
+      full()     —— 全分辨率 BGR 图像 (可能是只读的内存映射)
+      region()   —— 全分辨率的局部区域
+      release()  —— 释放全分辨率数据
+    """
+
+    def __init__(self, path, preview_max_side=PREVIEW_MAX_SIDE):
+        self.path = str(path)
+        self.preview_max_side = preview_max_side
+        self._size = image_size(self.path)
+        self._preview = None
+        self._full = None
+
+    @property
+    def size(self):
+        """(宽, 高)；文件头无法解析时解码全图获得"""
+        if self._size is None:
+            img = self.full()
+            self._size = (img.shape[1], img.shape[0])
+        return self._size
+
+    @property
+    def is_mapped(self):
+        return is_memmap(self._full)
+
+    def preview_factor(self):
+        if self._size is None:
+            return 1
+        factor = 1
+        while max(self._size) / factor > self.preview_max_side and factor < 8:
+            factor *= 2
+        return factor
+
+    def preview(self):
+        """
+        解码缩小的预览；JPEG 在解码阶段直接按比例缩小，其他格式解码 (或内存映射) 后缩小，
+        全分辨率数据不保留。尺寸为 ceil(宽 / 倍数) x ceil(高 / 倍数)。
+        """
+        if self._preview is None:
+            factor = self.preview_factor()
+            if factor == 1:
+                self._preview = (self.full(), 1)
+                return self._preview
+            w, h = self._size
+            size = (-(-w // factor), -(-h // factor))
+            ext = os.path.splitext(self.path)[1].lower()
+            img = None
+            if ext in (".jpg", ".jpeg"):
+                img = cv2.imread(self.path, _reduced_flag(factor))
+                if img is None:
+                    raise IOError(f"无法加载图片：{self.path}")
+            if img is None or (img.shape[1], img.shape[0]) != size:
+                # 非 JPEG 的 IMREAD_REDUCED_* 只是解码后按向下取整的尺寸缩小，这里用相同的插值自行缩小
+                full = self._full if self._full is not None else self._decode()
+                interpolation = cv2.INTER_AREA if ext == ".npy" else cv2.INTER_LINEAR_EXACT
+                img = cv2.resize(full, size, interpolation=interpolation)
+            self._preview = (img, factor)
+        return self._preview
+
+    def _map(self):
+        """尝试内存映射，返回 None 表示需要常规解码"""
+        ext = os.path.splitext(self.path)[1].lower()
+        if ext == ".npy":
+            return _corrupt_as_ioerror(np.load)(self.path, mmap_mode="r")
+        if ext in (".tif", ".tiff"):
+            layout = tiff_memmap_layout(self.path)
+            if layout is not None:
+                offset, h, w, spp = layout
+                # 条带超出文件末尾 (截断的文件) 时 memmap 抛出 ValueError
+                arr = _corrupt_as_ioerror(np.memmap)(self.path, np.uint8, "r", offset=offset, shape=(h, w, spp))
+                if spp == 1:
+                    return _as_bgr(arr)
+                # TIFF 为 RGB(A) 顺序，返回 BGR 视图 (不复制)
+                return arr[..., 2::-1]
+        return None
+
+    def _decode(self):
+        """内存映射或解码全分辨率 BGR 图像 (不缓存)"""
+        img = self._map()
+        if img is None:
+            img = cv2.imread(self.path)
+            if img is None:
+                raise IOError(f"无法加载图片：{self.path}")
+        return _as_bgr(img)
+
+    def full(self):
+        if self._full is None:
+            self._full = self._decode()
+        return self._full
+
+    def region(self, x, y, w, h):
+        """全分辨率局部区域 (内存映射时只读取该区域)"""
+        return np.ascontiguousarray(self.full()[y:y + h, x:x + w])
+
+    def release(self):
+        self._full = None
+
+    @property
+    def nbytes(self):
+        """实际驻留内存的字节数 (内存映射的数据不计入)"""
+        total = 0
+        if self._preview is not None and self._preview[0] is not self._full:
+            total += self._preview[0].nbytes
+        if self._full is not None and not self.is_mapped:
+            total += self._full.nbytes
+        return total
+
+
+def list_images(folder):
+    """文件夹中的图像文件 (按文件名排序)"""
+    names = sorted(n for n in os.listdir(folder) if n.lower().endswith(IMAGE_EXTENSIONS))
+    return [os.path.join(folder, n) for n in names]
+
+
+def _prepare_preview(path):
+    lazy = LazyImage(path)
+    lazy.preview()
+    return lazy
+
+
+class ImagePrefetcher:
+    """
+    数据集预取器：在线程池中预先解码当前位置之后的 ahead 幅图像 (以及前一幅)，
+    结果放入按字节限制的 LRU 缓存。prepare(path) 返回缓存条目，
+    默认返回已解码预览的 LazyImage；条目需提供 nbytes (或为其元组)。
+    每幅图像同时最多只有一个解码任务：查缓存与登记任务在同一把锁内完成，
+    前台 get 遇到进行中的预取时等待其结果。
+    """
+
+    def __init__(self, paths, prepare=_prepare_preview, ahead=3, workers=2,
+                 max_bytes=1024 * 1024 * 1024):
+        self.paths = list(paths)
+        self.prepare = prepare
+        self.ahead = ahead
+        self.cache = ByteLRU(max_bytes)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+        self._pending = {}          # 路径 -> 进行中的解码 (Future)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.paths)
+
+    def _claim(self, path):
+        """(缓存的条目, 进行中的解码 Future, 是否由调用方执行解码)，缓存命中时后两项为 None / False；调用时须持有锁"""
+        entry = self.cache.get(path)
+        if entry is not None:
+            return entry, None, False
+        future = self._pending.get(path)
+        if future is not None:
+            return None, future, False
+        future = self._pending[path] = Future()
+        return None, future, True
+
+    def _load(self, path, future):
+        """解码并放入缓存，结果 (或异常) 交给 future"""
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            entry = self.prepare(path)
+            self.cache.put(path, entry)
+        except BaseException as e:
+            future.set_exception(e)
+        else:
+            future.set_result(entry)
+        finally:
+            with self._lock:
+                self._pending.pop(path, None)
+
+    def get(self, index):
+        """取得第 index 幅图像的条目 (优先使用缓存或正在进行的预取)，并预取后续图像"""
+        path = self.paths[index]
+        with self._lock:
+            entry, future, owner = self._claim(path)
+        if entry is None:
+            if owner:
+                self._load(path, future)
+            try:
+                entry = future.result()
+            except CancelledError:
+                # 预取器已关闭 (切换数据集) 时未开始的解码被取消
+                raise IOError(f"图像加载已取消：{path}") from None
+        self.prefetch(index)
+        return entry
+
+    def prefetch(self, index):
+        order = list(range(index + 1, index + 1 + self.ahead)) + [index - 1]
+        with self._lock:
+            for i in order:
+                if not 0 <= i < len(self.paths):
+                    continue
+                path = self.paths[i]
+                if path in self._pending or path in self.cache:
+                    continue
+                future = self._pending[path] = Future()
+                self._pool.submit(self._load, path, future)
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        # 未开始的预取不会再执行，取消对应的 Future，避免等待者永远阻塞
+        with self._lock:
+            for future in self._pending.values():
+                future.cancel()
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+多区域半透明覆盖层的增量渲染。
+
+每个区域以多边形轮廓给出 (圆先转为多边形)，混合只在外接矩形内进行，并复用临时缓冲区；
+显示缓冲区 vis 每幅图像只复制一次，之后只重绘发生变化的区域所在的矩形。
+"""
+from app_config import lazy_import
+
+# 延迟导入：首次使用时才加载 OpenCV / NumPy
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+
+
+def bounding_rect(pts, width, height):
+    """多边形外接矩形 (x, y, w, h)，裁剪到图像范围内；完全在外时返回 None"""
+    pts = np.asarray(pts)
+    x0 = max(int(np.floor(pts[:, 0].min())), 0)
+    y0 = max(int(np.floor(pts[:, 1].min())), 0)
+    x1 = min(int(np.ceil(pts[:, 0].max())) + 1, width)
+    y1 = min(int(np.ceil(pts[:, 1].max())) + 1, height)
+    if x1 <= x0 or y1 <= y0:
+        return None
+    return x0, y0, x1 - x0, y1 - y0
+
+
+def intersect_rect(a, b):
+    """两个 (x, y, w, h) 矩形的交集，不相交时返回 None"""
+    x0, y0 = max(a[0], b[0]), max(a[1], b[1])
+    x1, y1 = min(a[0] + a[2], b[0] + b[2]), min(a[1] + a[3], b[1] + b[3])
+    if x1 <= x0 or y1 <= y0:
+        return None
+    return x0, y0, x1 - x0, y1 - y0
+
+
+def union_rect(a, b):
+    """两个 (x, y, w, h) 矩形的并集，任一为 None 时返回另一个"""
+    if a is None:
+        return b
+    if b is None:
+        return a
+    x0, y0 = min(a[0], b[0]), min(a[1], b[1])
+    x1, y1 = max(a[0] + a[2], b[0] + b[2]), max(a[1] + a[3], b[1] + b[3])
+    return x0, y0, x1 - x0, y1 - y0
+
+
+class RegionOverlay:
+    """在原图副本上绘制多个区域的半透明覆盖层，区域以任意可哈希的键标识"""
+
+    def __init__(self, alpha=0.3):
+        self.alpha = alpha
+        self.base = None      # 原图 (只读)
+        self.vis = None       # 显示缓冲区，首次渲染时从 base 复制
+        self.shapes = {}      # 键 -> (顶点 int32 数组, 颜色, 外接矩形)
+        # 一维临时缓冲区，reshape 后得到连续视图供 OpenCV 直接写入
+        self._mask_buf = np.zeros(0, np.uint8)
+        self._fill_buf = np.zeros(0, np.uint8)
+
+    def reset(self, image):
+        """切换到新的原图，丢弃旧的显示缓冲区"""
+        self.base = image
+        self.vis = None
+        self.shapes = {}
+
+    @property
+    def bbox(self):
+        """当前全部覆盖层所在矩形"""
+        rect = None
+        for _, _, bbox in self.shapes.values():
+            rect = union_rect(rect, bbox)
+        return rect
+
+    def _scratch_mask(self, h, w):
+        """返回 h x w 的可复用掩码缓冲区 (连续视图)"""
+        if self._mask_buf.size < h * w:
+            self._mask_buf = np.empty(h * w, np.uint8)
+        return self._mask_buf[:h * w].reshape(h, w)
+
+    def _scratch_fill(self, h, w):
+        """返回 h x w 的可复用填充缓冲区 (连续视图)"""
+        channels = self.base.shape[2:]
+        size = h * w * (channels[0] if channels else 1)
+        if self._fill_buf.size < size:
+            self._fill_buf = np.empty(size, np.uint8)
+        return self._fill_buf[:size].reshape((h, w) + channels)
+
+    def clear(self):
+        """移除全部覆盖层，返回需要刷新的区域"""
+        return self.render({})[1]
+
+    def render(self, shapes):
+        """
+        绘制区域 shapes={键: (轮廓 [(x, y), ...], 颜色)}，返回 (显示缓冲区, 需要刷新的区域)。
+        与上次相同的区域不重绘；只重算新增、修改、删除的区域外接矩形的并集。
+        """
+        height, width = self.base.shape[:2]
+        current, dirty = {}, None
+        for key, (pts, color) in shapes.items():
+            pts = np.round(np.asarray(pts)).astype(np.int32).reshape(-1, 2)
+            old = self.shapes.get(key)
+            if old is not None and old[1] == color and np.array_equal(old[0], pts):
+                current[key] = old
+                continue
+            bbox = bounding_rect(pts, width, height) if len(pts) else None
+            current[key] = (pts, color, bbox)
+            dirty = union_rect(dirty, bbox)
+            if old is not None:
+                dirty = union_rect(dirty, old[2])
+        for key in self.shapes.keys() - current.keys():
+            dirty = union_rect(dirty, self.shapes[key][2])
+        self.shapes = current
+
+        if self.vis is None:
+            self.vis = self.base.copy()
+        elif dirty is None:
+            return self.vis, None
+        if dirty is not None:
+            self._redraw(dirty)
+        return self.vis, dirty
+
+    def _redraw(self, rect):
+        """恢复 rect 内的原图，并重新混合与之相交的全部区域"""
+        x, y, w, h = rect
+        self.vis[y:y + h, x:x + w] = self.base[y:y + h, x:x + w]
+        for pts, color, bbox in self.shapes.values():
+            sub = intersect_rect(rect, bbox) if bbox is not None else None
+            if sub is None:
+                continue
+            # 掩码始终在区域自身的外接矩形内栅格化，
+            # 使局部重绘与整体绘制的边缘像素完全一致
+            bx, by, bw, bh = bbox
+            mask = self._scratch_mask(bh, bw)
+            mask[:] = 0
+            cv2.fillPoly(mask, [pts - np.array([bx, by], np.int32)], 255)
+
+            sx, sy, sw, sh = sub
+            inside = mask[sy - by:sy - by + sh, sx - bx:sx - bx + sw] > 0
+            region = self.vis[sy:sy + sh, sx:sx + sw]
+            fill = self._scratch_fill(sh, sw)
+            fill[:] = color if fill.ndim == 3 else color[0]
+            cv2.addWeighted(region, 1.0 - self.alpha, fill, self.alpha, 0, dst=fill)
+            np.copyto(region, fill, where=inside[..., None] if fill.ndim == 3 else inside)
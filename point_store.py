@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""
+多边形顶点存储与空间索引。
+
+顶点按顺序保存在 NumPy 数组中；均匀网格索引以 "排序后的网格键" 形式保存，
+查询时用 searchsorted 定位附近网格，只对候选顶点/边做向量化距离计算。
+拖动、追加等少量修改先记入脏集合 (查询时直接检查)，积累过多或在中间插入/删除后
+再整体重建索引，使编辑与查询都不随顶点数线性增长。
+"""
+from app_config import lazy_import
+
+# 延迟导入：首次使用时才加载 NumPy
+np = lazy_import("numpy")
+
+# 脏顶点/边超过该数量时重建索引
+DIRTY_LIMIT = 256
+# 半长超过该网格数的边单独保存，查询时逐条检查
+LONG_EDGE_CELLS = 4
+
+
+def _cell_keys(cx, cy):
+    """网格坐标 -> 可排序的 int64 键 (支持负坐标)"""
+    return (cx.astype(np.int64) << 32) + cy.astype(np.int64)
+
+
+class PointStore:
+    """
+    有序顶点列表，支持按下标访问/修改以及:
+      nearest_vertex(x, y, radius)        —— 半径内最近的顶点下标
+      nearest_edge(x, y, radius, closed)  —— 半径内最近的边及垂足
+    第 i 条边连接顶点 i 与 i+1；closed 时包含最后一个顶点到第一个顶点的闭合边。
+    """
+
+    def __init__(self, points=(), cell=32, dtype=None):
+        self.cell = float(cell)
+        # 默认保存浮点坐标，吸附得到的亚像素位置不被取整
+        self._buf = np.zeros((16, 2), dtype or np.float64)
+        self._n = 0
+        self.revision = 0    # 每次修改加一，供绘制缓存判断是否失效
+        self._stale = True
+        self._dirty_v = set()
+        self._dirty_e = set()
+        self.extend(points)
+
+    # —— 顺序容器接口
+    @property
+    def xy(self):
+        """(n, 2) 顶点数组视图"""
+        return self._buf[:self._n]
+
+    def __len__(self):
+        return self._n
+
+    def __bool__(self):
+        return self._n > 0
+
+    def __getitem__(self, i):
+        x, y = self.xy[i].tolist()
+        return x, y
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def tolist(self):
+        return [(x, y) for x, y in self.xy.tolist()]
+
+    def _reserve(self, n):
+        if n > len(self._buf):
+            buf = np.zeros((max(n, len(self._buf) * 2), 2), self._buf.dtype)
+            buf[:self._n] = self.xy
+            self._buf = buf
+
+    def append(self, x, y):
+        self._reserve(self._n + 1)
+        self._buf[self._n] = (x, y)
+        self._n += 1
+        self.revision += 1
+        # 新顶点及其前后两条边 (含闭合边) 发生变化
+        self._touch(self._n - 1, (self._n - 2, self._n - 1))
+
+    def extend(self, points):
+        pts = np.asarray(points, self._buf.dtype).reshape(-1, 2)
+        self._reserve(self._n + len(pts))
+        self._buf[self._n:self._n + len(pts)] = pts
+        self._n += len(pts)
+        self.revision += 1
+        self._stale = True
+
+    def insert(self, i, x, y):
+        """在下标 i 处插入顶点 (之后的下标后移，索引需要重建)"""
+        self._reserve(self._n + 1)
+        self._buf[i + 1:self._n + 1] = self._buf[i:self._n].copy()
+        self._buf[i] = (x, y)
+        self._n += 1
+        self.revision += 1
+        self._stale = True
+
+    def move(self, i, x, y):
+        i %= self._n
+        self._buf[i] = (x, y)
+        self.revision += 1
+        self._touch(i, (i - 1, i))
+
+    def __setitem__(self, i, pt):
+        self.move(i, *pt)
+
+    def __delitem__(self, i):
+        i %= self._n
+        self._buf[i:self._n - 1] = self._buf[i + 1:self._n].copy()
+        self._n -= 1
+        self.revision += 1
+        self._stale = True
+
+    def pop(self):
+        pt = self[self._n - 1]
+        self._n -= 1
+        self.revision += 1
+        # 删除最后一个顶点不影响其余顶点的下标，只需标记新的末尾边
+        self._touch(None, (self._n - 1,))
+        return pt
+
+    def clear(self):
+        self._n = 0
+        self.revision += 1
+        self._stale = True
+
+    # —— 空间索引
+    def _touch(self, vertex, edges):
+        if self._stale:
+            return
+        if vertex is not None:
+            self._dirty_v.add(vertex)
+        self._dirty_e.update(e % self._n for e in edges if self._n)
+        if len(self._dirty_v) + len(self._dirty_e) > DIRTY_LIMIT:
+            self._stale = True
+
+    def _rebuild(self):
+        xy = self.xy.astype(np.float64)
+        c = self.cell
+        keys = _cell_keys(np.floor(xy[:, 0] / c), np.floor(xy[:, 1] / c))
+        order = np.argsort(keys, kind="stable")
+        self._v_keys, self._v_ids = keys[order], order
+
+        # 边按中点入网格；长边单独保存
+        b = np.roll(xy, -1, axis=0)
+        mid = (xy + b) / 2
+        half = np.hypot(*(b - xy).T) / 2
+        long_edge = half > LONG_EDGE_CELLS * c
+        short = np.flatnonzero(~long_edge)
+        keys = _cell_keys(np.floor(mid[short, 0] / c), np.floor(mid[short, 1] / c))
+        order = np.argsort(keys, kind="stable")
+        self._e_keys, self._e_ids = keys[order], short[order]
+        self._e_reach = float(half[short].max()) if len(short) else 0.0
+        self._long_edges = np.flatnonzero(long_edge)
+
+        self._dirty_v.clear()
+        self._dirty_e.clear()
+        self._stale = False
+
+    def _candidates(self, keys, ids, x, y, radius, dirty):
+        """与以 (x, y) 为中心、半径 radius 的方形相交的网格中的条目 + 脏条目"""
+        c = self.cell
+        cx = np.arange(np.floor((x - radius) / c), np.floor((x + radius) / c) + 1)
+        cy = np.arange(np.floor((y - radius) / c), np.floor((y + radius) / c) + 1)
+        cells = _cell_keys(*(a.ravel() for a in np.meshgrid(cx, cy)))
+        lo = np.searchsorted(keys, cells, "left")
+        hi = np.searchsorted(keys, cells, "right")
+        parts = [ids[a:b] for a, b in zip(lo.tolist(), hi.tolist()) if b > a]
+        if dirty:
+            parts.append(np.fromiter(dirty, np.intp, len(dirty)))
+        if not parts:
+            return np.zeros(0, np.intp)
+        ids = np.unique(np.concatenate(parts))
+        # 末尾删除后索引中可能残留已不存在的下标
+        return ids[ids < self._n]
+
+    def nearest_vertex(self, x, y, radius):
+        """距离小于 radius 的最近顶点下标 (距离相同时取较小下标)，没有时返回 -1"""
+        if self._n == 0:
+            return -1
+        if self._stale:
+            self._rebuild()
+        ids = self._candidates(self._v_keys, self._v_ids, x, y, radius, self._dirty_v)
+        if not len(ids):
+            return -1
+        pts = self.xy[ids].astype(np.float64)
+        dist = np.hypot(pts[:, 0] - x, pts[:, 1] - y)
+        best = int(np.argmin(dist))
+        return int(ids[best]) if dist[best] < radius else -1
+
+    def nearest_edge(self, x, y, radius, closed=True):
+        """
+        距离小于 radius 的最近边，返回 (边下标 i, (垂足 x, 垂足 y))；
+        在 i + 1 处插入垂足即把顶点加在这条边上。没有时返回 None。
+        """
+        n = self._n
+        if n < 2:
+            return None
+        if self._stale:
+            self._rebuild()
+        ids = self._candidates(self._e_keys, self._e_ids, x, y, radius + self._e_reach, self._dirty_e)
+        ids = np.union1d(ids, self._long_edges[self._long_edges < n])
+        if not closed:
+            ids = ids[ids < n - 1]
+        if not len(ids):
+            return None
+        a = self.xy[ids].astype(np.float64)
+        d = self.xy[(ids + 1) % n].astype(np.float64) - a
+        p = np.array([x, y], np.float64)
+        length2 = np.maximum((d * d).sum(axis=1), 1e-12)
+        t = np.clip(((p - a) * d).sum(axis=1) / length2, 0.0, 1.0)
+        foot = a + t[:, None] * d
+        dist = np.hypot(*(foot - p).T)
+        best = int(np.argmin(dist))
+        if dist[best] >= radius:
+            return None
+        fx, fy = foot[best].tolist()
+        return int(ids[best]), (fx, fy)
@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+"""
+多边形标注的批量绘制。
+
+路径与顶点多边形在图像坐标系中构建，按 PointStore.revision 缓存，只有编辑后才重建；
+绘制时由 QPainter 变换映射到屏幕 (画笔为 cosmetic，线宽不随缩放变化)。
+顶点标记只取可见区域内的顶点，屏幕上重叠的标记只保留一个，
+用预先渲染的圆点图像通过一次 drawPixmapFragments 批量绘制；
+连线在大部分可见时直接绘制缓存的路径，放大后只绘制与可见区域相交的连续边段；
+可见顶点过多或缩小显示时不绘制坐标文字，连线也不做抗锯齿；这两项按整个可见视口判断，
+局部重绘 (vertex_rect 给出的脏矩形) 与整体重绘的结果一致。
+缩小显示且顶点很多时连线按细节层次 (polygon_simplify.PolygonLOD) 绘制：容差取屏幕上半个像素
+对应的图像像素 (按 2 的幂分级)，选中的顶点总是保留；拖动顶点时沿用拖动前的层次，松开后重新计算。
+"""
+from PyQt5 import QtGui, QtCore
+from PyQt5.QtCore import Qt
+
+from app_config import lazy_import
+from polygon_simplify import PolygonLOD
+
+# 延迟导入：首次使用时才加载 NumPy
+np = lazy_import("numpy")
+
+# 可见顶点不超过该数量时才绘制坐标文字
+MAX_LABELS = 200
+# 缩放比例低于该值时不绘制坐标文字
+LABEL_MIN_ZOOM = 0.5
+# 可见顶点超过该数量时连线不做抗锯齿
+AA_MAX_VERTICES = 2000
+# 坐标文字相对顶点的偏移 (屏幕像素)
+LABEL_OFFSET = (10, -8)
+# 顶点不少于该数量且缩小显示时按细节层次绘制连线
+LOD_MIN_VERTICES = 2000
+# 细节层次允许的连线偏差 (屏幕像素)
+LOD_PIXELS = 0.5
+
+
+def numpy_to_polygonf(pts):
+    """(n, 2) 数组 -> QPolygonF：直接写入 QPolygonF 的内存，不逐点创建 QPointF"""
+    n = len(pts)
+    poly = QtGui.QPolygonF(n)
+    if n:
+        ptr = poly.data()
+        ptr.setsize(n * 2 * 8)
+        np.frombuffer(ptr, np.float64).reshape(n, 2)[:] = pts
+    return poly
+
+
+def visible_indices(xy, x0, y0, x1, y1):
+    """落在图像坐标矩形 [x0, x1] x [y0, y1] 内的顶点下标"""
+    x, y = xy[:, 0], xy[:, 1]
+    return np.flatnonzero((x >= x0) & (x <= x1) & (y >= y0) & (y <= y1))
+
+
+def visible_runs(xy, closed, x0, y0, x1, y1):
+    """
+    外接矩形与 [x0, x1] x [y0, y1] 相交的边，按连续的边分组，
+    返回每组的顶点下标数组 (首尾顶点包含在内)。
+    """
+    n = len(xy)
+    a, b = xy, np.roll(xy, -1, axis=0)
+    if not closed:
+        a, b = a[:-1], b[:-1]
+    hit = ((np.minimum(a[:, 0], b[:, 0]) <= x1) & (np.maximum(a[:, 0], b[:, 0]) >= x0) &
+           (np.minimum(a[:, 1], b[:, 1]) <= y1) & (np.maximum(a[:, 1], b[:, 1]) >= y0))
+    edges = np.flatnonzero(hit)
+    runs = np.split(edges, np.flatnonzero(np.diff(edges) != 1) + 1) if len(edges) else []
+    return [np.append(run, run[-1] + 1) % n for run in runs], len(edges)
+
+
+def screen_decimate(pts, cell):
+    """屏幕坐标 pts 中每个 cell x cell 像素格只保留第一个点，返回保留的行号"""
+    keys = np.floor(pts / cell).astype(np.int64)
+    _, first = np.unique((keys[:, 0] << 32) + keys[:, 1], return_index=True)
+    first.sort()
+    return first
+
+
+def marker_glyph(color, radius):
+    """半径 radius、带 2 像素同色边框的实心圆点图像"""
+    size = 2 * radius + 4
+    glyph = QtGui.QPixmap(size, size)
+    glyph.fill(Qt.transparent)
+    painter = QtGui.QPainter(glyph)
+    painter.setRenderHint(QtGui.QPainter.Antialiasing)
+    pen = QtGui.QPen(color)
+    pen.setWidth(2)
+    painter.setPen(pen)
+    painter.setBrush(QtGui.QBrush(color))
+    painter.drawEllipse(QtCore.QPointF(size / 2, size / 2), radius, radius)
+    painter.end()
+    return glyph
+
+
+class PolygonPainter:
+    """缓存多边形的 QPainterPath / QPolygonF，并批量绘制顶点、连线与坐标文字"""
+
+    def __init__(self, point_radius=8):
+        self.point_radius = point_radius
+        self.marker = marker_glyph(QtGui.QColor(Qt.cyan), point_radius)
+        self.selected_marker = marker_glyph(QtGui.QColor(Qt.red), point_radius)
+        self.line_pen = QtGui.QPen(QtGui.QColor(0, 200, 255), 2)
+        self.line_pen.setCosmetic(True)
+        self.font = QtGui.QFont("Arial", 10)
+        self._metrics = None
+        self._key = None
+        self._xy = None
+        self._poly = None
+        self._path = None
+        self._lod = None
+        self._lod_key = None
+        self._lod_revision = None
+
+    def geometry(self, store, closed):
+        """返回 (顶点数组, QPolygonF, QPainterPath)，顶点未修改时直接使用缓存"""
+        key = (id(store), store.revision, closed)
+        if key != self._key:
+            self._xy = store.xy.astype(np.float64)
+            self._poly = numpy_to_polygonf(self._xy)
+            path = QtGui.QPainterPath()
+            if len(self._xy) > 1:
+                path.addPolygon(self._poly)
+                if closed:
+                    path.closeSubpath()
+            self._path = path
+            self._key = key
+        return self._xy, self._poly, self._path
+
+    def lod_indices(self, store, closed, zoom, selected=-1):
+        """
+        缩小显示时连线使用的顶点下标，不需要简化时返回 None。
+        顶点数不变且有选中的顶点 (拖动中) 时沿用已有的重要度，不在每次移动后重新计算。
+        """
+        n = len(store)
+        if zoom >= 1 or n < LOD_MIN_VERTICES:
+            return None
+        key = (id(store), closed, n)
+        if key != self._lod_key or (store.revision != self._lod_revision and selected < 0):
+            self._lod = PolygonLOD(store.xy, closed)
+            self._lod_key, self._lod_revision = key, store.revision
+        tolerance = LOD_PIXELS * 2.0 ** np.floor(np.log2(1 / zoom))
+        return self._lod.indices(tolerance, [selected] if 0 <= selected < n else ())
+
+    def invalidate_lod(self):
+        """丢弃细节层次 (拖动结束后调用，下次绘制时按当前顶点重新计算)"""
+        self._lod_key = None
+
+    @staticmethod
+    def label_text(i, x, y):
+        return f"P{i+1}:({x:g},{y:g})"
+
+    def image_view(self, rect, origin, zoom):
+        """屏幕矩形对应的图像坐标范围，扩展一个标记半径以免边缘的点被裁掉一半"""
+        ox, oy = origin.x(), origin.y()
+        margin = (self.point_radius + 2) / zoom
+        return ((rect.left() - ox) / zoom - margin, (rect.top() - oy) / zoom - margin,
+                (rect.right() + 1 - ox) / zoom + margin, (rect.bottom() + 1 - oy) / zoom + margin)
+
+    def vertex_rect(self, store, i, closed, origin, zoom):
+        """
+        顶点 i 的标记、坐标文字与相邻两条边在屏幕上占据的矩形 (QRect)。
+        移动顶点前后各取一次，重绘两者的并集即可。
+        """
+        xy = store.xy
+        n = len(xy)
+        ids = [i]
+        lod = self.lod_indices(store, closed, zoom, i)
+        if lod is not None:
+            # 相邻边为细节层次中的相邻顶点
+            k = int(np.searchsorted(lod, i))
+            if k > 0 or closed:
+                ids.append(lod[k - 1])
+            if k < len(lod) - 1 or closed:
+                ids.append(lod[(k + 1) % len(lod)])
+        else:
+            if i > 0 or closed:
+                ids.append((i - 1) % n)
+            if i < n - 1 or closed:
+                ids.append((i + 1) % n)
+        pts = xy[ids] * zoom + (origin.x(), origin.y())
+        (x0, y0), (x1, y1) = pts.min(axis=0).tolist(), pts.max(axis=0).tolist()
+        pad = self.point_radius + 4
+        rect = QtCore.QRectF(x0 - pad, y0 - pad, x1 - x0 + 2 * pad, y1 - y0 + 2 * pad)
+        if self._metrics is None:
+            self._metrics = QtGui.QFontMetrics(self.font)
+        x, y = pts[0].tolist()
+        text = self._metrics.boundingRect(self.label_text(i, *store[i]))
+        rect |= QtCore.QRectF(text).translated(x + LABEL_OFFSET[0], y + LABEL_OFFSET[1]).adjusted(-2, -2, 2, 2)
+        return rect.toAlignedRect()
+
+    def paint(self, painter, store, closed, selected, origin, zoom, exposed, visible=None):
+        """
+        在 painter 上绘制多边形。origin 为图像左上角的屏幕坐标 (QPoint)，
+        exposed 为需要重绘的屏幕矩形，visible 为整个可见视口 (默认与 exposed 相同)，
+        是否绘制坐标文字与抗锯齿按 visible 内的顶点数决定。
+        """
+        xy, poly, path = self.geometry(store, closed)
+        lod = self.lod_indices(store, closed, zoom, selected)
+        ox, oy = origin.x(), origin.y()
+
+        view = self.image_view(exposed, origin, zoom)
+        idx = visible_indices(xy, *view)
+        shown = len(idx)
+        if visible is not None and visible != exposed:
+            shown = len(visible_indices(xy, *self.image_view(visible, origin, zoom)))
+
+        # 绘制点 (屏幕坐标；间距小于半个标记的点只画一个)
+        if len(idx):
+            screen = xy[idx] * zoom + (ox, oy)
+            screen = screen[screen_decimate(screen, max(1, self.point_radius // 2))]
+            self.draw_markers(painter, self.marker, screen)
+        if 0 <= selected < len(xy):
+            self.draw_markers(painter, self.selected_marker, xy[selected:selected + 1] * zoom + (ox, oy))
+
+        # 绘制多边形连线
+        if len(xy) > 1:
+            painter.save()
+            painter.setRenderHint(QtGui.QPainter.Antialiasing, shown <= AA_MAX_VERTICES)
+            painter.translate(ox, oy)
+            painter.scale(zoom, zoom)
+            painter.setPen(self.line_pen)
+            painter.setBrush(Qt.NoBrush)
+            line_xy = xy if lod is None else xy[lod]
+            runs, visible_edges = visible_runs(line_xy, closed, *view)
+            if lod is not None and visible_edges * 2 > len(line_xy):
+                simplified = numpy_to_polygonf(line_xy)
+                if closed:
+                    painter.drawPolygon(simplified)
+                else:
+                    painter.drawPolyline(simplified)
+            elif visible_edges * 2 > len(line_xy):
+                painter.drawPath(path)
+            else:
+                for run in runs:
+                    painter.drawPolyline(numpy_to_polygonf(line_xy[run]))
+            painter.restore()
+
+        # 绘制点坐标 (只在顶点稀疏且未缩小显示时)
+        if zoom >= LABEL_MIN_ZOOM and shown <= MAX_LABELS:
+            painter.setPen(QtGui.QPen(Qt.yellow))
+            painter.setFont(self.font)
+            coords = store.xy[idx].tolist()
+            dx, dy = LABEL_OFFSET
+            for i, (x, y), (fx, fy) in zip(idx.tolist(), coords, xy[idx].tolist()):
+                painter.drawText(QtCore.QPointF(ox + fx * zoom + dx, oy + fy * zoom + dy), self.label_text(i, x, y))
+
+    @staticmethod
+    def draw_markers(painter, glyph, screen):
+        """以 screen 中的每个点为中心批量绘制 glyph"""
+        source = QtCore.QRectF(glyph.rect())
+        create = QtGui.QPainter.PixmapFragment.create
+        painter.drawPixmapFragments([create(QtCore.QPointF(x, y), source) for x, y in screen.tolist()], glyph)
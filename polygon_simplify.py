@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+多边形简化与细节层次 (LOD)。
+
+每个顶点先算出一个重要度 (像素)，容差为 t 的简化结果就是重要度大于 t 的顶点:
+  dp  Douglas-Peucker：顶点被选为分割点时到所在弦 (线段) 的距离，并按祖先分割点的值截断，
+      使不同容差的结果逐层嵌套 (容差越小，保留的顶点越多，且包含容差大时的全部顶点)
+  vw  Visvalingam-Whyatt：顶点被去掉时与两侧顶点构成的三角形面积 (单调化后) 的平方根，
+      即容差 t 对应面积阈值 t²
+两种算法都按轮批量处理: dp 每轮同时分割所有待处理的弦，vw 每轮同时去掉所有面积为局部最小
+(互不相邻) 的顶点，轮数约为 log(n)，每轮都是整体的数组运算。
+
+PolygonLOD 保存一次算出的重要度，绘制时按缩放比例取对应容差的顶点，不需要重新简化。
+"""
+from app_config import lazy_import
+from geometry import POLYGON
+
+# 延迟导入：首次使用时才加载 NumPy
+np = lazy_import("numpy")
+
+METHODS = ("dp", "vw")
+# 重要度低于该值 (像素) 的顶点视为共线，不再细分 (避免密集的共线顶点使轮数退化为 n)
+MIN_SIGNIFICANCE = 1e-3
+
+
+def _segment_distance(p, a, b):
+    """点 p 到线段 ab 的距离 (逐行)"""
+    ab = b - a
+    ap = p - a
+    length2 = np.einsum("ij,ij->i", ab, ab)
+    t = np.einsum("ij,ij->i", ap, ab) / np.where(length2 > 0, length2, 1.0)
+    t = np.clip(np.where(length2 > 0, t, 0.0), 0.0, 1.0)
+    d = ap - t[:, None] * ab
+    return np.hypot(d[:, 0], d[:, 1])
+
+
+def _dp(xy, closed, stop):
+    """Douglas-Peucker 重要度；弦内最大距离不超过 stop 时不再分割 (其中的顶点重要度为 0)"""
+    n = len(xy)
+    sig = np.zeros(n)
+    if closed:
+        # 以顶点 0 与离它最远的顶点把闭合多边形分为两条链，末尾补上顶点 0
+        far = int(np.argmax(np.hypot(*(xy - xy[0]).T)))
+        pts = np.vstack([xy, xy[:1]])
+        sig = np.zeros(n + 1)
+        starts, ends = np.array([0, far]), np.array([far, n])
+        sig[[0, far, n]] = np.inf
+    else:
+        pts = xy
+        starts, ends = np.array([0]), np.array([n - 1])
+        sig[[0, n - 1]] = np.inf
+    caps = np.full(len(starts), np.inf)
+    while len(starts):
+        inner = ends - starts - 1
+        keep = inner > 0
+        starts, ends, caps, inner = starts[keep], ends[keep], caps[keep], inner[keep]
+        if not len(starts):
+            break
+        # 所有弦的内部顶点展开为一个数组，逐弦求最大距离
+        seg = np.repeat(np.arange(len(starts)), inner)
+        first = np.cumsum(inner) - inner
+        idx = starts[seg] + 1 + np.arange(len(seg)) - first[seg]
+        d = _segment_distance(pts[idx], pts[starts[seg]], pts[ends[seg]])
+        dmax = np.maximum.reduceat(d, first)
+        # 每条弦取第一个最大值 (at 与 seg 都已有序)
+        at = np.flatnonzero(d == dmax[seg])
+        split = idx[at[np.r_[True, seg[at][1:] != seg[at][:-1]]]]
+        go = dmax > max(stop, MIN_SIGNIFICANCE)
+        split, value = split[go], np.minimum(dmax, caps)[go]
+        sig[split] = value
+        starts, ends = np.concatenate([starts[go], split]), np.concatenate([split, ends[go]])
+        caps = np.concatenate([value, value])
+    return sig[:n]
+
+
+def _vw(xy, closed, stop):
+    """Visvalingam-Whyatt 重要度；面积超过 stop² 的顶点不再去掉 (重要度为无穷大)"""
+    n = len(xy)
+    sig = np.full(n, np.inf)
+    alive = np.arange(n)
+    limit = stop * stop if stop > 0 else np.inf
+    floor = 0.0
+    while len(alive) > (3 if closed else 2):
+        prev, nxt = np.roll(alive, 1), np.roll(alive, -1)
+        a, b, c = xy[prev], xy[alive], xy[nxt]
+        area = 0.5 * np.abs((a[:, 0] - b[:, 0]) * (c[:, 1] - b[:, 1]) - (a[:, 1] - b[:, 1]) * (c[:, 0] - b[:, 0]))
+        if not closed:
+            area[[0, -1]] = np.inf
+        # 面积相同时按位置的奇偶区分，使一串共线顶点每轮去掉一半而不是一个
+        pos = np.arange(len(alive))
+        key = np.lexsort((pos, pos % 2, area))
+        rank = np.empty(len(alive), np.int64)
+        rank[key] = pos
+        minimum = (rank < np.roll(rank, 1)) & (rank < np.roll(rank, -1)) & (area <= limit)
+        if not closed:
+            minimum[[0, -1]] = False
+        if not minimum.any():
+            break
+        # 去掉的顶点不少于之前去掉的，重要度单调
+        removed = np.maximum(area[minimum], floor)
+        floor = removed.max()
+        sig[alive[minimum]] = np.sqrt(removed)
+        alive = alive[~minimum]
+    return sig
+
+
+def significance(xy, closed=True, method="dp", stop=0.0):
+    """每个顶点的重要度 (像素)；stop > 0 时只需区分重要度是否大于 stop，可以提前结束"""
+    xy = np.asarray(xy, np.float64).reshape(-1, 2)
+    if method not in METHODS:
+        raise ValueError(f"未知的简化方法: {method} (可选 {', '.join(METHODS)})")
+    if len(xy) <= (3 if closed else 2):
+        return np.full(len(xy), np.inf)
+    return (_dp if method == "dp" else _vw)(xy, closed, stop)
+
+
+def select(sig, tolerance, closed=True, keep=()):
+    """重要度大于 tolerance 的顶点下标 (升序)，另加 keep 中的顶点；闭合多边形至少保留 3 个"""
+    idx = np.flatnonzero(sig > tolerance)
+    minimum = min(3 if closed else 2, len(sig))
+    if len(idx) < minimum:
+        idx = np.sort(np.argsort(-sig, kind="stable")[:minimum])
+    if len(keep):
+        idx = np.union1d(idx, keep)
+    return idx
+
+
+def simplify(xy, tolerance, closed=True, method="dp"):
+    """简化后的顶点 ((m, 2) 数组)；tolerance 为允许的最大偏差 (像素，vw 为面积阈值的平方根)"""
+    xy = np.asarray(xy, np.float64).reshape(-1, 2)
+    if tolerance <= 0:
+        return xy
+    return xy[select(significance(xy, closed, method, tolerance), tolerance, closed)]
+
+
+def simplify_geometry(store, tolerance, method="dp"):
+    """
+    简化区域存储中的全部多边形 (圆不变)，返回 (新的 GeometryStore, 简化前顶点数, 简化后顶点数)。
+    tolerance <= 0 时返回原存储。
+    """
+    polygons = store.indices(POLYGON)
+    before = sum(len(store.points(i)) for i in polygons)
+    if tolerance <= 0:
+        return store, before, before
+    out = store.copy()
+    after = 0
+    for i in polygons:
+        pts = simplify(store.points(i), tolerance, True, method)
+        out.set_polygon(i, pts)
+        after += len(pts)
+    return out, before, after
+
+
+class PolygonLOD:
+    """一条折线 / 多边形的细节层次：重要度只计算一次，任意容差的顶点集合只需一次比较"""
+
+    def __init__(self, xy, closed=True, method="dp"):
+        self.closed = closed
+        self.sig = significance(xy, closed, method)
+
+    def __len__(self):
+        return len(self.sig)
+
+    def indices(self, tolerance, keep=()):
+        """容差 tolerance (像素) 下保留的顶点下标，keep 中的顶点 (如选中的顶点) 总是保留"""
+        return select(self.sig, tolerance, self.closed, keep)
@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+"""
+可配置的图像预处理流水线 (降噪 / CLAHE / 伽马校正 / 归一化)。
+
+每个阶段的结果按 (图像哈希, 之前所有阶段的参数) 缓存，
+修改某一阶段的参数只重算该阶段及之后的阶段。
+
+大图可使用分条并行模式：图像按行切成带重叠的条带在线程池中处理
+(OpenCV 调用期间释放 GIL)。降噪、伽马校正与归一化的结果与整幅调用逐像素一致；
+CLAHE 的结果最多相差 CLAHE_TILED_TOLERANCE 个灰度级 (见 apply_clahe_tiled)。
+"""
+import os
+import hashlib
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+
+from app_config import lazy_import
+from lru_cache import ByteLRU
+
+# 延迟导入：首次使用时才加载 OpenCV / NumPy
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+
+
+@lru_cache(maxsize=64)
+def gamma_lut(gamma):
+    """伽马校正查找表 (与原实现一致: (i/255)^(1/gamma)*255 截断为 uint8)"""
+    table = (np.arange(256) / 255.0) ** (1.0 / gamma) * 255
+    table = table.astype(np.uint8)
+    table.flags.writeable = False
+    return table
+
+
+@lru_cache(maxsize=16)
+def _clahe(clip, grid):
+    return cv2.createCLAHE(clipLimit=clip, tileGridSize=(grid, grid))
+
+
+def image_digest(img):
+    """图像内容哈希 (形状 + 像素)"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr((img.shape, img.dtype.str)).encode())
+    h.update(np.ascontiguousarray(img).data)
+    return h.hexdigest()
+
+
+def apply_denoise(img, strength):
+    if img.ndim == 2:
+        return cv2.fastNlMeansDenoising(img, None, strength, 7, 21)
+    return cv2.fastNlMeansDenoisingColored(img, None, strength, strength, 7, 21)
+
+
+def apply_clahe(img, clip, grid):
+    """在 LAB 的 L 通道上做 CLAHE"""
+    clahe = _clahe(clip, grid)
+    if img.ndim == 2:
+        return clahe.apply(img)
+    lab = cv2.cvtColor(img, cv2.COLOR_BGR2LAB)
+    l, a, b = cv2.split(lab)
+    return cv2.cvtColor(cv2.merge((clahe.apply(l), a, b)), cv2.COLOR_LAB2BGR)
+
+
+def apply_gamma(img, gamma):
+    return cv2.LUT(img, gamma_lut(gamma))
+
+
+def apply_normalize(img):
+    return cv2.normalize(img, None, 0, 255, cv2.NORM_MINMAX)
+
+
+# —— 分条并行实现
+# 非局部均值降噪的影响半径: templateWindowSize // 2 + searchWindowSize // 2
+DENOISE_HALO = 7 // 2 + 21 // 2
+
+
+def _row_spans(height, parts, align=1):
+    """把 [0, height) 切成最多 parts 段，段边界对齐到 align 的倍数"""
+    units = -(-height // align)
+    parts = max(1, min(parts, units))
+    bounds = [round(i * units / parts) * align for i in range(parts + 1)]
+    bounds[-1] = height
+    return [(a, b) for a, b in zip(bounds, bounds[1:]) if b > a]
+
+
+# 分条 CLAHE 与整幅 CLAHE 每个通道的最大差异 (灰度级)：
+# 灰度图 / L 通道最多差 1，彩色图经 LAB -> BGR 换算后最多差 2
+CLAHE_TILED_TOLERANCE = 2
+
+
+def _clahe_padding(height, width, grid):
+    """与 OpenCV CLAHE 内部一致的补边量 (不能整除时两个方向都补)"""
+    if height % grid == 0 and width % grid == 0:
+        return 0, 0
+    return grid - height % grid, grid - width % grid
+
+
+def apply_clahe_tiled(img, clip, grid, pool, parts):
+    """
+    分条 CLAHE。条带边界对齐到 CLAHE 网格行，并向上下各扩展一行网格，
+    使每个条带内部的直方图 (查找表) 与插值用到的网格都和整幅计算相同。
+    OpenCV 以单精度浮点按条带内的行号计算插值权重，行号不同导致的舍入差异
+    会使少数像素相差 1 个灰度级 (彩色图换算回 BGR 后最多 2)，见 CLAHE_TILED_TOLERANCE。
+    """
+    h, w = img.shape[:2]
+    pad_h, pad_w = _clahe_padding(h, w, grid)
+    tile_h = (h + pad_h) // grid
+    out = np.empty_like(img)
+
+    def work(r0, r1):
+        e0, e1 = max(0, r0 - 1), min(grid, r1 + 1)
+        y0, y1 = e0 * tile_h, min(e1 * tile_h, h)
+        strip = img[y0:y1]
+        lab = cv2.cvtColor(strip, cv2.COLOR_BGR2LAB) if img.ndim == 3 else None
+        l = lab[..., 0] if lab is not None else strip
+        pad_bottom = e1 * tile_h - y1
+        if pad_bottom or pad_w:
+            l = cv2.copyMakeBorder(l, 0, pad_bottom, 0, pad_w, cv2.BORDER_REFLECT_101)
+        cl = cv2.createCLAHE(clipLimit=clip, tileGridSize=(grid, e1 - e0)).apply(l)
+
+        a, b = r0 * tile_h, min(r1 * tile_h, h)
+        cl = cl[a - y0:b - y0, :w]
+        if lab is None:
+            out[a:b] = cl
+        else:
+            lab = lab[a - y0:b - y0]
+            lab[..., 0] = cl
+            cv2.cvtColor(lab, cv2.COLOR_LAB2BGR, dst=out[a:b])
+
+    list(pool.map(lambda span: work(*span), _row_spans(grid, parts)))
+    return out
+
+
+def apply_tiled(fn, img, pool, parts, halo=0):
+    """把逐像素或局部 (影响半径 halo 行) 的操作分条并行执行"""
+    h = img.shape[0]
+    out = np.empty_like(img)
+
+    def work(a, b):
+        y0, y1 = max(0, a - halo), min(h, b + halo)
+        out[a:b] = fn(img[y0:y1])[a - y0:b - y0]
+
+    list(pool.map(lambda span: work(*span), _row_spans(h, parts)))
+    return out
+
+
+class PreprocessPipeline:
+    """
+    预处理流水线。参数:
+      denoise     降噪强度 (0 关闭)
+      clahe_clip  CLAHE 限幅 (0 关闭)，clahe_grid 网格数
+      gamma       伽马值 (1.0 关闭)
+      normalize   是否做 0~255 线性拉伸
+    """
+
+    DEFAULTS = {
+        "denoise": 0.0,
+        "clahe_clip": 2.0,
+        "clahe_grid": 8,
+        "gamma": 0.8,
+        "normalize": False,
+    }
+
+    def __init__(self, cache_bytes=512 * 1024 * 1024, workers=None, tile_min_pixels=8_000_000, **params):
+        self.params = dict(self.DEFAULTS)
+        self.configure(**params)
+        self.cache = ByteLRU(cache_bytes)
+        # 分条并行: 像素数不少于 tile_min_pixels 时启用；workers=1 表示始终整幅调用
+        self.workers = workers or os.cpu_count() or 1
+        self.tile_min_pixels = tile_min_pixels
+        self._pool = None
+        self._digests = {}   # id -> (图像, 哈希)，避免同一图像重复计算哈希
+
+    def configure(self, **params):
+        unknown = set(params) - set(self.DEFAULTS)
+        if unknown:
+            raise ValueError(f"未知的预处理参数: {', '.join(sorted(unknown))}")
+        self.params.update(params)
+
+    def stages(self):
+        """当前启用的阶段列表 [(名称, 参数元组), ...]"""
+        p = self.params
+        stages = []
+        if p["denoise"] > 0:
+            stages.append(("denoise", (float(p["denoise"]),)))
+        if p["clahe_clip"] > 0:
+            stages.append(("clahe", (float(p["clahe_clip"]), int(p["clahe_grid"]))))
+        if p["gamma"] != 1.0:
+            stages.append(("gamma", (float(p["gamma"]),)))
+        if p["normalize"]:
+            stages.append(("normalize", ()))
+        return stages
+
+    def describe(self):
+        """用于状态栏的简短描述"""
+        names = {"denoise": "降噪", "clahe": "CLAHE", "gamma": "伽马校正", "normalize": "归一化"}
+        return " + ".join(names[name] for name, _ in self.stages()) or "无"
+
+    def digest(self, img):
+        entry = self._digests.get(id(img))
+        if entry is None or entry[0] is not img:
+            entry = (img, image_digest(img))
+            self._digests[id(img)] = entry
+            if len(self._digests) > 4:
+                del self._digests[next(iter(self._digests))]
+        return entry[1]
+
+    def use_tiles(self, img):
+        return self.workers > 1 and img.shape[0] * img.shape[1] >= self.tile_min_pixels
+
+    def run_stage(self, name, img, params):
+        if self.use_tiles(img):
+            return self.run_stage_tiled(name, img, params)
+        if name == "denoise":
+            return apply_denoise(img, *params)
+        if name == "clahe":
+            return apply_clahe(img, *params)
+        if name == "gamma":
+            return apply_gamma(img, *params)
+        return apply_normalize(img)
+
+    def run_stage_tiled(self, name, img, params):
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="preprocess")
+        parts = self.workers * 2
+        if name == "denoise":
+            return apply_tiled(lambda s: apply_denoise(s, *params), img, self._pool, parts, DENOISE_HALO)
+        if name == "clahe":
+            return apply_clahe_tiled(img, *params, self._pool, parts)
+        if name == "gamma":
+            return apply_tiled(lambda s: apply_gamma(s, *params), img, self._pool, parts)
+        # 归一化需要全图的最小/最大值，先求全局范围再分条线性变换
+        lo, hi = float(img.min()), float(img.max())
+        scale = 255.0 * (1.0 / (hi - lo)) if hi > lo else 0.0
+        return apply_tiled(lambda s: cv2.convertScaleAbs(s, alpha=scale, beta=-lo * scale),
+                           img, self._pool, parts)
+
+    def run(self, img):
+        """执行流水线，返回只读结果数组 (可能来自缓存)"""
+        key = self.digest(img)
+        out = img
+        for name, params in self.stages():
+            key = (key, name, params)
+            cached = self.cache.get(key)
+            if cached is None:
+                cached = self.run_stage(name, out, params)
+                cached.flags.writeable = False
+                self.cache.put(key, cached)
+            out = cached
+        return out
+
+    def preview(self, img, max_side=1024):
+        """在缩小的图像上执行流水线，用于即时预览"""
+        scale = max_side / max(img.shape[:2])
+        if scale < 1.0:
+            key = ("preview", self.digest(img), max_side)
+            small = self.cache.get(key)
+            if small is None:
+                small = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+                small.flags.writeable = False
+                self.cache.put(key, small)
+            img = small
+        return self.run(img)
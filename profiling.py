@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+"""
+轻量级性能计时 (span)。
+
+    with profiling.span("preprocess.run", size="2048x1536"):
+        ...
+
+    @profiling.timed("render_overlay")
+    def render_overlay(self): ...
+
+默认关闭：span() 直接返回共用的空上下文，timed 包装的函数只多一次布尔判断。
+开启: 配置 profile / 环境变量 HALCON_PROFILE=1，或调用 enable()。
+
+开启后记录:
+  - 每个阶段的次数、总耗时、最大耗时与对数分桶的耗时直方图 (用于估计 p50 / p95 / p99)
+  - 进程内存峰值 (峰值 RSS)：每个阶段结束时的峰值，以及该阶段使峰值上升的总量
+  - 最近 MAX_EVENTS 个 span 事件 (含线程号与参数)
+export() 写出 Chrome trace 格式的 JSON (chrome://tracing 或 Perfetto 打开)，
+各阶段的汇总统计放在同一文件的 "stages" 键中。
+"""
+import os
+import sys
+import json
+import time
+import bisect
+import functools
+import threading
+from collections import deque
+
+# 保留的 span 事件数 (循环缓冲)
+MAX_EVENTS = 200000
+# 直方图分桶上界 (毫秒)，最后一桶为 > 最大上界
+BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+_enabled = False
+
+
+# —— 进程内存峰值
+def _peak_rss_unix():
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024   # Linux 单位为 KB
+
+
+def _peak_rss_windows():
+    import ctypes
+    from ctypes import wintypes
+
+    class Counters(ctypes.Structure):
+        _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + [
+            (name, ctypes.c_size_t) for name in (
+                "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage",
+                "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage")]
+
+    counters = Counters()
+    counters.cb = ctypes.sizeof(Counters)
+    process = ctypes.windll.kernel32.GetCurrentProcess()
+    ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb)
+    return counters.PeakWorkingSetSize
+
+
+_peak_rss = None
+
+
+def peak_rss():
+    """进程内存峰值 (字节)；平台不支持时为 0"""
+    global _peak_rss
+    if _peak_rss is None:
+        _peak_rss = _peak_rss_windows if os.name == "nt" else _peak_rss_unix
+        try:
+            _peak_rss()
+        except Exception:
+            _peak_rss = lambda: 0
+    return _peak_rss()
+
+
+# —— 统计
+class StageStats:
+    """一个阶段的耗时与内存统计"""
+
+    __slots__ = ("count", "total_ms", "max_ms", "buckets", "peak_rss", "rss_growth")
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+        self.peak_rss = 0       # 最近一次结束时的进程内存峰值
+        self.rss_growth = 0     # 该阶段执行期间内存峰值上升的总量
+
+    def add(self, ms, peak_before, peak_after):
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        self.buckets[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.peak_rss = peak_after
+        self.rss_growth += max(0, peak_after - peak_before)
+
+    def percentile(self, q):
+        """由直方图估计的分位数 (所在分桶的上界，最后一桶用最大值)"""
+        if not self.count:
+            return 0.0
+        rank = q / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= rank:
+                return min(BUCKETS_MS[i], self.max_ms) if i < len(BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+    def histogram(self):
+        """{分桶上界 (毫秒): 次数}，只含非空分桶"""
+        labels = ["%g" % b for b in BUCKETS_MS] + ["inf"]
+        return {label: n for label, n in zip(labels, self.buckets) if n}
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "total_ms": self.total_ms,
+            "mean_ms": self.total_ms / self.count if self.count else 0.0,
+            "max_ms": self.max_ms,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+            "histogram": self.histogram(),
+            "peak_rss_mb": self.peak_rss / 1048576,
+            "rss_growth_mb": self.rss_growth / 1048576,
+        }
+
+
+class Profiler:
+    """各阶段统计与最近的 span 事件；可在多个线程中同时记录"""
+
+    def __init__(self, max_events=MAX_EVENTS):
+        self.stages = {}
+        self.events = deque(maxlen=max_events)
+        self.origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def record(self, name, start, end, peak_before, peak_after, args=None):
+        ms = (end - start) * 1e3
+        event = (name, start, end, threading.get_ident(), args)
+        with self._lock:
+            stats = self.stages.get(name)
+            if stats is None:
+                stats = self.stages[name] = StageStats()
+            stats.add(ms, peak_before, peak_after)
+            self.events.append(event)
+
+    def reset(self):
+        with self._lock:
+            self.stages.clear()
+            self.events.clear()
+            self.origin = time.perf_counter()
+
+    def snapshot(self):
+        """{阶段名: 统计字典}，按总耗时从大到小排列"""
+        with self._lock:
+            items = [(name, stats.to_dict()) for name, stats in self.stages.items()]
+        items.sort(key=lambda item: -item[1]["total_ms"])
+        return dict(items)
+
+    def chrome_trace(self):
+        """Chrome trace (JSON Object Format)：每个 span 为一个完整事件 ("ph": "X")"""
+        with self._lock:
+            events = list(self.events)
+        pid = os.getpid()
+        trace = [{"name": "process_name", "ph": "M", "pid": pid, "args": {"name": "TemplateMaker"}}]
+        for name, start, end, tid, args in events:
+            event = {"name": name, "ph": "X", "pid": pid, "tid": tid,
+                     "ts": (start - self.origin) * 1e6, "dur": (end - start) * 1e6}
+            if args:
+                event["args"] = args
+            trace.append(event)
+        return {"traceEvents": trace, "displayTimeUnit": "ms",
+                "stages": self.snapshot(), "peak_rss_mb": peak_rss() / 1048576}
+
+    def export(self, path):
+        """写出 Chrome trace 与汇总统计，返回事件数"""
+        data = self.chrome_trace()
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, default=str)
+        return len(data["traceEvents"]) - 1
+
+    def format_table(self, limit=12):
+        """调试覆盖层用的文字表格"""
+        lines = [f"{'阶段':<24}{'次数':>6}{'p50':>9}{'p95':>9}{'最大':>9}{'内存峰值':>10}"]
+        for name, s in list(self.snapshot().items())[:limit]:
+            lines.append(f"{name[:24]:<24}{s['count']:>6}{s['p50_ms']:>9.2f}{s['p95_ms']:>9.2f}"
+                         f"{s['max_ms']:>9.1f}{s['peak_rss_mb']:>8.0f}MB")
+        lines.append(f"进程内存峰值 {peak_rss() / 1048576:.0f} MB  (耗时单位 ms)")
+        return "\n".join(lines)
+
+
+profiler = Profiler()
+
+
+# —— span
+class _NullSpan:
+    """关闭时使用的空上下文"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("name", "args", "start", "peak")
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.peak = peak_rss()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        profiler.record(self.name, self.start, end, self.peak, peak_rss(), self.args)
+        return False
+
+
+def span(name, **args):
+    """计时一段代码；args 作为参数写入 trace 事件"""
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, args or None)
+
+
+def timed(name=None):
+    """
+    装饰器：计时整个函数 (默认名称为函数的限定名)。
+    注意包装后的函数接受任意参数，不要直接连接到会传递额外参数的 Qt 信号 (如 clicked)。
+    """
+    def decorate(func):
+        label = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _Span(label, None):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def enabled():
+    return _enabled
+
+
+def enable(on=True):
+    global _enabled
+    _enabled = bool(on)
+
+
+def export_at_exit(path):
+    """程序退出时写出 trace (用于 profile_trace 配置)"""
+    import atexit
+    atexit.register(lambda: profiler.export(path))
@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+"""
+项目文件 (.hproj)：保存标注会话 (图像列表、各图像的区域、预处理参数)。
+
+分块二进制格式，只追加写入:
+  文件头   b"HPRJ" + uint32 版本
+  块       4 字节类型 + uint32 头长度 + uint64 数据长度 + JSON 头 (补齐到 8 字节) + 数据
+    META   JSON 头: {"images": [{"path", "mtime"}, ...], "params": 预处理参数}
+    ROIS   JSON 头: {"image": 图像路径, "rois": 区域数, "coords": 坐标数}
+           数据: GeometryStore 区域表 (结构化数组) + float64 坐标，原样写入
+    INDX   JSON 头: {"meta": META 块偏移, "rois": {图像路径: ROIS 块偏移}, "current": 当前图像}
+  文件尾   每个 INDX 块之后写 uint64 INDX 偏移 + b"HEND"
+
+保存时只追加发生变化的块和新的索引，旧块成为废弃数据，废弃过多时整体重写。
+打开时通过内存映射只读取文件尾、索引与 META，各图像的区域在切换到该图像时才读取。
+图像路径在项目目录下时保存为相对路径。显示金字塔不写入项目，打开后由预览重新构建。
+"""
+import os
+import json
+import mmap
+import struct
+
+from app_config import lazy_import
+from geometry import GeometryStore, roi_dtype
+
+# 延迟导入：首次使用时才加载 NumPy
+np = lazy_import("numpy")
+
+MAGIC = b"HPRJ"
+VERSION = 1
+FOOTER_MAGIC = b"HEND"
+_HEAD = struct.Struct("<4sI")
+_CHUNK = struct.Struct("<4sIQ")
+_FOOTER = struct.Struct("<Q4s")
+
+
+def _pad8(n):
+    return -n % 8
+
+
+def _chunk(tag, header, data=b""):
+    """编码一个块；头与数据都补齐到 8 字节，使数据可以直接映射为数组"""
+    head = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    head += b" " * _pad8(len(head))
+    data += b"\0" * _pad8(len(data))
+    return _CHUNK.pack(tag, len(head), len(data)) + head + data
+
+
+class ProjectFile:
+    """打开已有的项目文件 (不存在时抛出 FileNotFoundError)；新建项目用 ProjectFile.create"""
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self.root = os.path.dirname(self.path)
+        self.images = []          # 图像路径 (绝对路径)
+        self.current = -1         # 当前图像下标
+        self.params = {}          # 预处理参数
+        self._index = {}          # 图像引用 -> ROIS 块偏移
+        self._sizes = {}          # 有效块的偏移 -> 字节数 (用于统计废弃数据)
+        self._meta_offset = -1
+        self._meta_written = None  # 最近写入的 META 头 (JSON 文本)
+        self._image_items = ((), [])   # (图像路径, 图像引用列表)，图像列表不变时不重新读取修改时间
+        self._end = 0             # 最后一个完整文件尾之后的位置
+        self._index_size = 0      # 当前索引块与文件尾的字节数
+        self._saved_current = -1
+        self._map = None
+        self._stores = {}         # 图像引用 -> 已交给调用方的 GeometryStore
+        self._written = {}        # 图像引用 -> 写入时的 (id(store), revision)
+        if not os.path.exists(self.path):
+            raise FileNotFoundError(f"项目文件不存在: {self.path}")
+        self._load()
+
+    @classmethod
+    def create(cls, path):
+        """新建项目文件 (覆盖已有文件)"""
+        if os.path.exists(path):
+            os.remove(path)
+        with open(path, "wb") as f:
+            f.write(_HEAD.pack(MAGIC, VERSION))
+        return cls(path)
+
+    # —— 路径
+    def _ref(self, path):
+        """项目中保存的图像引用：项目目录下的图像为相对路径"""
+        path = os.path.abspath(path)
+        try:
+            rel = os.path.relpath(path, self.root)
+        except ValueError:   # 不同驱动器
+            return path.replace(os.sep, "/")
+        return (path if rel.startswith("..") else rel).replace(os.sep, "/")
+
+    def _resolve(self, ref):
+        return os.path.normpath(os.path.join(self.root, ref))
+
+    # —— 读取
+    def _open_map(self):
+        with open(self.path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _close_map(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def _read_chunk(self, offset):
+        """返回 (类型, JSON 头, 数据起始偏移, 块结束偏移)"""
+        tag, head_len, data_len = _CHUNK.unpack_from(self._map, offset)
+        head_start = offset + _CHUNK.size
+        header = json.loads(bytes(self._map[head_start:head_start + head_len]).decode("utf-8"))
+        data_start = head_start + head_len
+        return tag, header, data_start, data_start + data_len
+
+    def _last_commit(self):
+        """文件尾有效时直接返回 INDX 偏移；否则 (保存中断) 从头扫描最后一个完整的索引"""
+        size = len(self._map)
+        if size >= _HEAD.size + _FOOTER.size:
+            offset, magic = _FOOTER.unpack_from(self._map, size - _FOOTER.size)
+            if magic == FOOTER_MAGIC and offset + _CHUNK.size <= size \
+                    and self._map[offset:offset + 4] == b"INDX":
+                return offset, size
+        found, pos = None, _HEAD.size
+        while pos + _CHUNK.size <= size:
+            tag, head_len, data_len = _CHUNK.unpack_from(self._map, pos)
+            end = pos + _CHUNK.size + head_len + data_len
+            if end + (_FOOTER.size if tag == b"INDX" else 0) > size:
+                break
+            if tag == b"INDX":
+                if _FOOTER.unpack_from(self._map, end) != (pos, FOOTER_MAGIC):
+                    break
+                found = (pos, end + _FOOTER.size)
+                end += _FOOTER.size
+            pos = end
+        return found or (None, _HEAD.size)
+
+    def _load(self):
+        self._open_map()
+        if len(self._map) < _HEAD.size:
+            self._close_map()
+            raise ValueError(f"不是项目文件: {self.path}")
+        magic, version = _HEAD.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self._close_map()
+            raise ValueError(f"不是项目文件: {self.path}")
+        if version != VERSION:
+            self._close_map()
+            raise ValueError(f"不支持的项目文件版本: {version}")
+
+        index_offset, self._end = self._last_commit()
+        if index_offset is None:
+            return
+        _, index, _, _ = self._read_chunk(index_offset)
+        self._index_size = self._end - index_offset
+        self._index = {ref: int(off) for ref, off in index["rois"].items()}
+        self._meta_offset = int(index["meta"])
+        self.current = self._saved_current = int(index.get("current", -1))
+        for offset in [self._meta_offset, *self._index.values()]:
+            if offset >= 0:
+                _, head_len, data_len = _CHUNK.unpack_from(self._map, offset)
+                self._sizes[offset] = _CHUNK.size + head_len + data_len
+        if self._meta_offset >= 0:
+            _, meta, _, _ = self._read_chunk(self._meta_offset)
+            items = meta.get("images", [])
+            self.images = [self._resolve(item["path"]) for item in items]
+            self.params = dict(meta.get("params", {}))
+            self._image_items = (tuple(self.images), items)
+            self._meta_written = self._meta_header(items)
+
+    def annotated(self):
+        """项目中保存了区域的图像路径"""
+        return [self._resolve(ref) for ref in self._index]
+
+    def arrays(self, path):
+        """
+        文件中保存的 (区域表, (m, 2) 坐标)：直接映射文件的只读视图，不复制数据；
+        项目中没有时返回 None。视图在下次 save() 之前使用完毕 (保存时会重新映射文件)。
+        """
+        offset = self._index.get(self._ref(path))
+        if offset is None:
+            return None
+        _, header, start, _ = self._read_chunk(offset)
+        dtype = roi_dtype()
+        n, m = header["rois"], header["coords"]
+        rois = np.frombuffer(self._map, dtype, n, start)
+        coords = np.frombuffer(self._map, np.float64, m * 2, start + n * dtype.itemsize + _pad8(n * dtype.itemsize))
+        return rois, coords.reshape(m, 2)
+
+    def geometry(self, path):
+        """图像的区域存储 (可编辑的副本)；项目中没有时返回 None"""
+        ref = self._ref(path)
+        store = self._stores.get(ref)
+        if store is not None:
+            return store
+        arrays = self.arrays(path)
+        if arrays is None:
+            return None
+        store = GeometryStore.from_arrays(*arrays)
+        self._stores[ref] = store
+        self._written[ref] = (id(store), store.revision)
+        return store
+
+    # —— 写入
+    def set_geometry(self, path, store):
+        """登记图像的区域存储；save() 时只写入登记后发生过修改的存储"""
+        self._stores[self._ref(path)] = store
+
+    def _meta_header(self, images):
+        return json.dumps({"images": images, "params": self.params},
+                          ensure_ascii=False, sort_keys=True)
+
+    def _image_refs(self):
+        """[{"path": 图像引用, "mtime": 修改时间}, ...]；图像列表不变时使用上次的结果"""
+        paths, items = self._image_items
+        if paths != tuple(self.images):
+            items = []
+            for path in self.images:
+                try:
+                    mtime = os.path.getmtime(path)
+                except OSError:
+                    mtime = None
+                items.append({"path": self._ref(path), "mtime": mtime})
+            self._image_items = (tuple(self.images), items)
+        return items
+
+    def dirty(self):
+        """需要写入的图像引用列表"""
+        refs = []
+        for ref, store in self._stores.items():
+            if self._written.get(ref) == (id(store), store.revision):
+                continue
+            if not len(store) and ref not in self._index:
+                continue   # 从未保存过的空标注不写入
+            refs.append(ref)
+        return refs
+
+    @property
+    def garbage(self):
+        """被新块取代的字节数 (含旧的索引)"""
+        return self._end - _HEAD.size - sum(self._sizes.values()) - self._index_size
+
+    def save(self):
+        """增量保存：只追加修改过的区域与元数据，返回追加的字节数"""
+        refs = self.dirty()
+        meta = self._meta_header(self._image_refs())
+        if not refs and meta == self._meta_written and self.current == self._saved_current:
+            return 0
+
+        self._close_map()
+        start = self._end
+        with open(self.path, "r+b") as f:
+            f.seek(start)
+            f.truncate()   # 丢弃上次中断的保存留下的不完整数据
+            pos = start
+            blocks = []
+            for ref in refs:
+                store = self._stores[ref]
+                rois, coords = store.packed()
+                data = rois.tobytes()
+                data += b"\0" * _pad8(len(data)) + np.ascontiguousarray(coords, np.float64).tobytes()
+                blocks.append(_chunk(b"ROIS", {"image": ref, "rois": len(rois), "coords": len(coords)}, data))
+                self._sizes.pop(self._index.get(ref), None)
+                self._index[ref] = pos
+                self._sizes[pos] = len(blocks[-1])
+                self._written[ref] = (id(store), store.revision)
+                pos += len(blocks[-1])
+            if meta != self._meta_written:
+                blocks.append(_chunk(b"META", json.loads(meta)))
+                self._sizes.pop(self._meta_offset, None)
+                self._meta_offset = pos
+                self._sizes[pos] = len(blocks[-1])
+                self._meta_written = meta
+                pos += len(blocks[-1])
+            blocks.append(_chunk(b"INDX", {"meta": self._meta_offset, "rois": self._index, "current": self.current}))
+            self._saved_current = self.current
+            blocks.append(_FOOTER.pack(pos, FOOTER_MAGIC))
+            self._index_size = len(blocks[-2]) + _FOOTER.size
+            f.write(b"".join(blocks))
+            f.flush()
+            self._end = f.tell()
+        self._open_map()
+        written = self._end - start
+        if self.garbage * 2 > self._end:
+            self.compact()
+        return written
+
+    def compact(self):
+        """重写文件，只保留当前的区域与元数据 (调用方持有的区域存储保持有效)"""
+        for ref in list(self._index):
+            if ref not in self._stores:
+                self.geometry(self._resolve(ref))
+        stores = self._stores
+        tmp = self.path + ".tmp"
+        other = ProjectFile.create(tmp)
+        other.images, other.current, other.params = self.images, self.current, self.params
+        for ref, store in stores.items():
+            if len(store):
+                other.set_geometry(self._resolve(ref), store)
+        other.save()
+        other.close()
+        self.close()
+        os.replace(tmp, self.path)
+        self.__init__(self.path)
+        self._stores = stores
+        self._written = {ref: (id(store), store.revision) for ref, store in stores.items()}
+
+    def close(self):
+        self._close_map()
+
+    @property
+    def nbytes(self):
+        return self._end
@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""
+模板结果缓存。
+
+缓存键由以下内容的哈希组成 (与输出路径无关):
+  - 图像文件内容 (按 路径 + 大小 + 修改时间 记住已算过的哈希，不重复读取文件)
+  - 规范化的区域集合 (GeometryStore.packed() 的区域表与坐标)
+  - CreateTemplate 的其余参数 (坐标数组按 float64 原始字节) 与引擎参数 (TemplateEngine.cache_params)
+命中时把缓存的模型文件复制到新的输出前缀下，不再调用引擎。
+因此引擎生成的文件不能包含图像路径或输出路径 (内容相同、路径不同的请求共用一个条目)。
+
+目录结构: <root>/<键前两位>/<键>/ 下保存 entry.json 与按序号命名的文件，
+总大小超过上限时按最近使用时间 (条目目录的修改时间) 淘汰。
+多个进程可以共用同一目录：条目先写入临时目录再整体改名；总大小每次都按目录中的文件统计，
+其他进程写入的条目同样计入。
+"""
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import threading
+
+from app_config import lazy_import
+from template_engine import TemplateEngine
+
+np = lazy_import("numpy")
+
+ENTRY_FILE = "entry.json"
+
+# (绝对路径, 大小, 修改时间) -> 文件内容哈希
+_file_digests = {}
+
+
+def file_digest(path):
+    """图像文件内容哈希；文件未变化时直接使用上次的结果"""
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    key = (path, st.st_size, st.st_mtime_ns)
+    digest = _file_digests.get(key)
+    if digest is None:
+        h = hashlib.blake2b(digest_size=16)
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        digest = h.hexdigest()
+        _file_digests[key] = digest
+    return digest
+
+
+def request_key(request, engine):
+    """请求在 engine 上的缓存键"""
+    h = hashlib.blake2b(digest_size=20)
+    # 去掉图像路径与输出前缀，其余为 CreateTemplate 的参数
+    args = request.invoke_args()[2:]
+    params = {
+        "engine": engine.name,
+        "engine_params": engine.cache_params(),
+        "args": [a for a in args if not isinstance(a, np.ndarray)],
+        "lengths": [len(a) for a in args if isinstance(a, np.ndarray)],
+    }
+    h.update(json.dumps(params, sort_keys=True).encode("utf-8"))
+    for a in args:
+        if isinstance(a, np.ndarray):
+            h.update((a + 0.0).tobytes())
+    h.update(file_digest(request.image_path).encode("ascii"))
+    rois, coords = request.regions().packed()
+    h.update(rois.tobytes())
+    h.update((coords + 0.0).tobytes())   # 统一 -0.0 与 0.0
+    return h.hexdigest()
+
+
+class TemplateCache:
+    """按内容寻址的模型文件缓存，容量按字节数限制"""
+
+    def __init__(self, root, max_bytes=2 * 1024 * 1024 * 1024):
+        self.root = os.path.abspath(root)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.saved_seconds = 0.0   # 命中时省下的引擎耗时
+        self._lock = threading.Lock()
+
+    def _entry_dir(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def _scan(self):
+        """扫描缓存目录，返回 键 -> (字节数, 最近使用时间)；包括其他进程写入的条目"""
+        entries = {}
+        try:
+            shards = [s for s in os.scandir(self.root) if len(s.name) == 2 and s.is_dir()]
+        except OSError:
+            return entries
+        for shard in shards:
+            try:
+                items = list(os.scandir(shard.path))
+            except OSError:
+                continue
+            for item in items:
+                try:
+                    size = sum(f.stat().st_size for f in os.scandir(item.path) if f.is_file())
+                    entries[item.name] = (size, item.stat().st_mtime)
+                except OSError:
+                    continue   # 正被其他进程淘汰
+        return entries
+
+    @property
+    def bytes(self):
+        return sum(size for size, _ in self._scan().values())
+
+    def __len__(self):
+        return len(self._scan())
+
+    def get(self, key, output_prefix):
+        """命中时把模型文件复制到 output_prefix 下并返回文件列表，否则返回 None"""
+        entry_dir = self._entry_dir(key)
+        try:
+            with open(os.path.join(entry_dir, ENTRY_FILE), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            out_dir = os.path.dirname(output_prefix)
+            if out_dir:
+                os.makedirs(out_dir, exist_ok=True)
+            artifacts = []
+            for i, suffix in enumerate(entry["suffixes"]):
+                target = output_prefix + suffix
+                shutil.copyfile(os.path.join(entry_dir, str(i)), target)
+                artifacts.append(target)
+            os.utime(entry_dir)   # 记录最近使用时间
+        except (OSError, ValueError, KeyError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+            self.saved_seconds += entry.get("seconds", 0.0)
+        return artifacts
+
+    def put(self, key, output_prefix, artifacts, seconds=0.0):
+        """保存引擎生成的文件；文件不都以 output_prefix 开头时不缓存"""
+        if not artifacts or not all(a.startswith(output_prefix) for a in artifacts):
+            return False
+        entry_dir = self._entry_dir(key)
+        tmp = os.path.join(self.root, f"tmp-{os.getpid()}-{uuid.uuid4().hex}")
+        try:
+            os.makedirs(tmp)
+            size = 0
+            for i, path in enumerate(artifacts):
+                shutil.copyfile(path, os.path.join(tmp, str(i)))
+                size += os.path.getsize(path)
+            entry = {"suffixes": [a[len(output_prefix):] for a in artifacts],
+                     "bytes": size, "seconds": seconds, "created": time.time()}
+            with open(os.path.join(tmp, ENTRY_FILE), "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.makedirs(os.path.dirname(entry_dir), exist_ok=True)
+            os.rename(tmp, entry_dir)
+        except OSError:
+            # 其他进程已写入同一条目，或磁盘错误：缓存失败不影响模板生成
+            shutil.rmtree(tmp, ignore_errors=True)
+            return False
+        with self._lock:
+            self.stores += 1
+            self._evict(keep=key)
+        return True
+
+    def _evict(self, keep=None):
+        """按最近使用时间淘汰，直到目录中的总大小不超过上限 (刚写入的条目 keep 不淘汰)"""
+        entries = self._scan()
+        total = sum(size for size, _ in entries.values())
+        if total <= self.max_bytes:
+            return
+        for key in sorted(entries, key=lambda k: entries[k][1]):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+            total -= entries[key][0]
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            shutil.rmtree(self.root, ignore_errors=True)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "entries": len(self),
+            "bytes": self.bytes,
+            "saved_seconds": self.saved_seconds,
+        }
+
+
+class CachedTemplateEngine(TemplateEngine):
+    """带结果缓存的引擎包装；其余属性 (load / available 等) 转发给被包装的引擎"""
+
+    def __init__(self, engine, cache):
+        self.engine = engine
+        self.cache = cache
+        self.name = engine.name
+        self.fixed_regions = engine.fixed_regions
+        self.last_hit = False
+
+    def __getattr__(self, attr):
+        return getattr(self.engine, attr)
+
+    def cache_params(self):
+        return self.engine.cache_params()
+
+    def create_template(self, request):
+        key = request_key(request, self.engine)
+        artifacts = self.cache.get(key, request.output_prefix)
+        self.last_hit = artifacts is not None
+        if artifacts is None:
+            start = time.perf_counter()
+            artifacts = self.engine.create_template(request)
+            self.cache.put(key, request.output_prefix, artifacts, time.perf_counter() - start)
+        return artifacts
@@ -0,0 +1,463 @@
+# -*- coding: utf-8 -*-
+"""
+模板生成引擎后端。
+
+与 GUI 无关：不导入 PyQt5，也不在导入时加载 clr 或 numpy，
+可以在进程池的工作进程中直接使用。
+"""
+import os
+import glob
+import json
+import time
+import importlib
+import importlib.util
+
+from app_config import DEFAULT_HALCON_ROOT, DEFAULT_HALCON_DOTNET, DEFAULT_ENGINE_DLL, lazy_import
+from geometry import GeometryStore, POLYGON, CIRCLE, INCLUDE, EXCLUDE
+from polygon_simplify import simplify, simplify_geometry
+
+np = lazy_import("numpy")
+
+# —— 一、默认参数 (与原 save_template 中的硬编码参数一致)
+DEFAULT_CIRCLE = (172, 197)
+DEFAULT_RADIUS = (1.0, 10.0)
+DEFAULT_CONTOUR1 = ([103, 289, 266, 139, 103],
+                    [88, 83, 253, 258, 88])
+DEFAULT_CONTOUR2 = ([593, 945, 948, 947, 956, 1310, 1320, 599, 597, 593, 593],
+                    [292, 287, 499, 517, 592, 593, 875, 882, 538, 471, 292])
+
+
+def _coords(values):
+    """坐标序列 -> 连续的 float64 一维数组 (整块传给引擎，不逐元素转换)"""
+    return np.ascontiguousarray(values, np.float64).ravel()
+
+
+class TemplateRequest:
+    """
+    一次 CreateTemplate 调用的全部参数。
+    坐标保存为 float64 连续数组 (亚像素)，由引擎按方法签名转换为整数或浮点数组。
+    geometry 为完整的区域集合 (GeometryStore)，支持任意区域的引擎直接使用；
+    CreateTemplate 的固定参数由其中的区域映射而来，见 from_geometry。
+    """
+
+    def __init__(self, image_path, output_prefix, corner_rows, corner_cols,
+                 circle=DEFAULT_CIRCLE, radius=DEFAULT_RADIUS,
+                 contour1=DEFAULT_CONTOUR1, contour2=DEFAULT_CONTOUR2, geometry=None):
+        corner_rows, corner_cols = _coords(corner_rows), _coords(corner_cols)
+        if len(corner_rows) != len(corner_cols) or len(corner_rows) < 3:
+            raise ValueError("多边形至少需要3个点，且行列坐标数量一致")
+        self.image_path = str(image_path)
+        self.output_prefix = str(output_prefix)
+        self.corner_rows = corner_rows
+        self.corner_cols = corner_cols
+        self.circle_row, self.circle_col = (float(v) for v in circle)
+        self.radius_min, self.radius_max = (float(v) for v in radius)
+        self.contour1X, self.contour1Y = (_coords(c) for c in contour1)
+        self.contour2X, self.contour2Y = (_coords(c) for c in contour2)
+        self.geometry = geometry
+
+    @classmethod
+    def from_polygon(cls, image_path, output_prefix, points, **kwargs):
+        """由 [(x, y), ...] 或 (n, 2) 数组形式的多边形构造请求"""
+        pts = np.asarray(points, np.float64).reshape(-1, 2)
+        return cls(image_path, output_prefix, pts[:, 1], pts[:, 0], **kwargs)
+
+    @classmethod
+    def from_geometry(cls, image_path, output_prefix, geometry):
+        """
+        由区域集合构造请求。映射到 CreateTemplate 的参数:
+          第一个模板多边形 -> 角点 (cornerRows / cornerCols)
+          第一个圆         -> circleRow / circleCol / radiusMin / radiusMax
+          前两个排除多边形 -> contour1 / contour2
+        没有对应区域时使用默认参数；超出 CreateTemplate 能表达的区域
+        只有支持完整区域集合的引擎才会使用 (.NET 引擎会拒绝该请求)。
+        """
+        polygons = geometry.indices(POLYGON, INCLUDE)
+        if not len(polygons):
+            raise ValueError("至少需要一个模板多边形区域")
+        kwargs = {}
+        circles = geometry.indices(CIRCLE)
+        if len(circles):
+            cx, cy, r0, r1 = geometry.circle(circles[0])
+            kwargs.update(circle=(cy, cx), radius=(r0, r1))
+        for name, i in zip(("contour1", "contour2"), geometry.indices(POLYGON, EXCLUDE)):
+            # 闭合轮廓 (首尾相同)，与默认参数格式一致
+            pts = np.vstack([geometry.points(i), geometry.points(i)[:1]])
+            kwargs[name] = (pts[:, 0], pts[:, 1])
+        corners = geometry.points(polygons[0])
+        return cls.from_polygon(image_path, output_prefix, corners, geometry=geometry, **kwargs)
+
+    def _user_contours(self):
+        """用户给出的排除轮廓 [(X 属性名, Y 属性名), ...]；CreateTemplate 的默认轮廓不计数也不简化"""
+        names = []
+        for xs, ys, default in (("contour1X", "contour1Y", DEFAULT_CONTOUR1),
+                                ("contour2X", "contour2Y", DEFAULT_CONTOUR2)):
+            if not (np.array_equal(getattr(self, xs), default[0]) and np.array_equal(getattr(self, ys), default[1])):
+                names.append((xs, ys))
+        return names
+
+    def vertex_count(self):
+        """
+        用户多边形的顶点总数：有 geometry 时为其中全部多边形区域，
+        否则为角点与用户给出的排除轮廓 (不含默认参数)。
+        """
+        if self.geometry is not None:
+            return sum(len(self.geometry.points(i)) for i in self.geometry.indices(POLYGON))
+        return len(self.corner_rows) + sum(len(getattr(self, xs)) for xs, _ in self._user_contours())
+
+    def simplify(self, tolerance, method="vw"):
+        """
+        在调用引擎之前简化多边形 (原地修改)：角点、用户给出的排除轮廓与 geometry 中的多边形区域，
+        最大偏差 tolerance 像素 (方法见 polygon_simplify)。返回 (简化前, 简化后) 的 vertex_count()；
+        tolerance <= 0 时不做修改。默认 vw：dp 的简化本身更慢，在小容差 (如 0.5px) 下
+        省下的引擎耗时抵不过简化耗时 (benchmarks/bench_simplify.py)。
+        """
+        before = self.vertex_count()
+        if tolerance <= 0:
+            return before, before
+        pts = simplify(np.stack([self.corner_cols, self.corner_rows], axis=1), tolerance, True, method)
+        self.corner_cols, self.corner_rows = _coords(pts[:, 0]), _coords(pts[:, 1])
+        for xs, ys in self._user_contours():
+            pts = np.stack([getattr(self, xs), getattr(self, ys)], axis=1)
+            # 轮廓首尾相同：去掉重复的末点按闭合多边形简化，再补上
+            repeated = len(pts) > 3 and np.array_equal(pts[0], pts[-1])
+            pts = simplify(pts[:-1] if repeated else pts, tolerance, True, method)
+            if repeated:
+                pts = np.vstack([pts, pts[:1]])
+            setattr(self, xs, _coords(pts[:, 0]))
+            setattr(self, ys, _coords(pts[:, 1]))
+        if self.geometry is not None:
+            self.geometry = simplify_geometry(self.geometry, tolerance, method)[0]
+        return before, self.vertex_count()
+
+    def regions(self):
+        """完整区域集合；由旧式参数构造的请求只含角点多边形"""
+        if self.geometry is None:
+            geometry = GeometryStore()
+            geometry.add_polygon(list(zip(self.corner_cols, self.corner_rows)))
+            return geometry
+        return self.geometry
+
+    def unsupported_regions(self):
+        """CreateTemplate 固定参数无法表达的区域说明，全部可表达时返回空列表"""
+        if self.geometry is None:
+            return []
+        g = self.geometry
+        problems = []
+        if len(g.indices(POLYGON, INCLUDE)) > 1:
+            problems.append("多个模板多边形")
+        if len(g.indices(CIRCLE)) > 1:
+            problems.append("多个圆")
+        if len(g.indices(CIRCLE, EXCLUDE)):
+            problems.append("圆形排除区域")
+        if len(g.indices(POLYGON, EXCLUDE)) > 2:
+            problems.append("超过两个排除多边形")
+        return problems
+
+    @classmethod
+    def from_dict(cls, item, base_dir=""):
+        """
+        由清单条目构造请求，字段:
+          image, output, polygon: [[x, y], ...],
+          circle: {row, col, radius_min, radius_max},
+          contour1 / contour2: [[x, y], ...]
+        或者用 regions 给出完整区域集合 (格式见 GeometryStore.to_list)，
+        此时忽略 polygon / circle / contour 字段。
+        相对路径以 base_dir 为基准。
+        """
+        def resolve(p):
+            return p if os.path.isabs(p) else os.path.join(base_dir, p)
+
+        if item.get("regions"):
+            return cls.from_geometry(resolve(item["image"]), resolve(item["output"]),
+                                     GeometryStore.from_list(item["regions"]))
+
+        def xy(points, default):
+            if points is None:
+                return default
+            return [p[0] for p in points], [p[1] for p in points]
+
+        circle = item.get("circle") or {}
+        return cls.from_polygon(
+            resolve(item["image"]),
+            resolve(item["output"]),
+            item["polygon"],
+            circle=(circle.get("row", DEFAULT_CIRCLE[0]), circle.get("col", DEFAULT_CIRCLE[1])),
+            radius=(circle.get("radius_min", DEFAULT_RADIUS[0]), circle.get("radius_max", DEFAULT_RADIUS[1])),
+            contour1=xy(item.get("contour1"), DEFAULT_CONTOUR1),
+            contour2=xy(item.get("contour2"), DEFAULT_CONTOUR2),
+        )
+
+    def invoke_args(self):
+        """按 CreateTemplate 的参数顺序返回参数列表 (坐标为 float64 数组，标量为 float)"""
+        return [
+            self.image_path,
+            self.output_prefix,
+            self.circle_row,
+            self.circle_col,
+            self.radius_min,
+            self.radius_max,
+            self.contour1X,
+            self.contour1Y,
+            self.contour2X,
+            self.contour2Y,
+            self.corner_rows,
+            self.corner_cols,
+        ]
+
+
+# —— 二、引擎后端
+class TemplateEngine:
+    """模板引擎接口，create_template 返回生成的文件列表"""
+    name = ""
+    # 只接受 CreateTemplate 固定参数能表达的区域 (见 TemplateRequest.unsupported_regions)
+    fixed_regions = False
+
+    def create_template(self, request):
+        raise NotImplementedError
+
+    def cache_params(self):
+        """影响生成结果的引擎参数 (JSON 可序列化)，作为模板缓存键的一部分"""
+        return {}
+
+
+def file_stamp(path):
+    """(大小, 修改时间)；文件不存在时为 None"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+def resolve_create_template(engine_assembly):
+    """
+    通过反射获取 CreateTemplate 方法，失败时抛出 RuntimeError。
+    程序集提供 CreateTemplateSubpixel (坐标为 double[] / double) 时优先使用它。
+    """
+    template_engine_type = None
+    for type_name in ("TemplateEngineProj.LoadImages+TemplateEngine",
+                      "TemplateEngineProj.TemplateEngine"):
+        template_engine_type = engine_assembly.GetType(type_name)
+        if template_engine_type is not None:
+            break
+    if template_engine_type is None:
+        all_types = "\n".join([t.FullName for t in engine_assembly.GetTypes()])
+        raise RuntimeError(f"未找到类型: {type_name}\n程序集中的类型:\n{all_types}")
+
+    method = (template_engine_type.GetMethod("CreateTemplateSubpixel")
+              or template_engine_type.GetMethod("CreateTemplate")
+              or template_engine_type.GetMethod("create_template"))
+    if method is None:
+        methods = "\n".join([m.Name for m in template_engine_type.GetMethods()])
+        raise RuntimeError(f"未找到 CreateTemplate 方法\n类型中的方法:\n{methods}")
+    return method
+
+
+# CLR 数组参数类型 -> (NumPy 类型, CLR 元素类型名)
+_CLR_ARRAYS = {
+    "System.Int32[]": ("int32", "Int32"),
+    "System.Double[]": ("float64", "Double"),
+}
+
+
+class DotNetTemplateEngine(TemplateEngine):
+    """
+    通过 pythonnet 调用 TemplateEngineProj.dll 中的 CreateTemplate。
+    参数按方法签名转换：坐标数组由 NumPy 缓冲区经 Marshal.Copy 整块复制到 CLR 数组，
+    int[] 参数四舍五入，double[] 参数保留亚像素坐标。
+    """
+    name = "dotnet"
+    fixed_regions = True
+
+    def __init__(self, halcon_dll=DEFAULT_HALCON_DOTNET, engine_dll=DEFAULT_ENGINE_DLL,
+                 halcon_root=DEFAULT_HALCON_ROOT):
+        self.halcon_dll = halcon_dll
+        self.engine_dll = engine_dll
+        self.halcon_root = halcon_root
+        self._clr = None
+        self._method = None
+        self._param_types = []   # CreateTemplate 各参数的 CLR 类型名
+
+    @staticmethod
+    def available(halcon_dll=DEFAULT_HALCON_DOTNET, engine_dll=DEFAULT_ENGINE_DLL):
+        """检查 pythonnet 与 DLL 是否可用 (不加载 CLR)"""
+        if importlib.util.find_spec("clr") is None:
+            return False
+        return os.path.exists(halcon_dll) and os.path.exists(engine_dll)
+
+    def cache_params(self):
+        # DLL 重新编译或升级后缓存的模板失效
+        return {"halcon_dll": file_stamp(self.halcon_dll), "engine_dll": file_stamp(self.engine_dll)}
+
+    def load(self):
+        """加载 DLL 并解析 CreateTemplate，只执行一次"""
+        if self._method is not None:
+            return self._method
+        for path in (self.halcon_dll, self.engine_dll):
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"找不到DLL文件: {path}")
+
+        os.environ['HALCONROOT'] = self.halcon_root
+        os.environ['PATH'] = os.path.join(self.halcon_root, "bin") + ";" + os.environ.get('PATH', '')
+        import clr
+
+        clr.AddReference(self.halcon_dll)
+        clr.AddReference(self.engine_dll)
+        assemblies = clr.System.AppDomain.CurrentDomain.GetAssemblies()
+        engine_assembly = next((a for a in assemblies if a.GetName().Name == "TemplateEngineProj"), None)
+        if engine_assembly is None:
+            engine_assembly = clr.System.Reflection.Assembly.LoadFrom(self.engine_dll)
+
+        self._clr = clr
+        self._method = resolve_create_template(engine_assembly)
+        self._param_types = [p.ParameterType.FullName for p in self._method.GetParameters()]
+        return self._method
+
+    @property
+    def subpixel(self):
+        """已加载的方法以 double[] 接收坐标"""
+        return "System.Double[]" in self._param_types
+
+    def _marshal(self, value, type_name):
+        """把一个参数转换为 type_name 对应的 CLR 值"""
+        System = self._clr.System
+        if type_name in _CLR_ARRAYS:
+            dtype, element = _CLR_ARRAYS[type_name]
+            data = np.asarray(value, np.float64)
+            data = np.ascontiguousarray(np.rint(data) if dtype == "int32" else data, dtype)
+            array = System.Array.CreateInstance(getattr(System, element), len(data))
+            if len(data):
+                pointer = System.IntPtr.__overloads__[System.Int64](data.ctypes.data)
+                System.Runtime.InteropServices.Marshal.Copy(pointer, array, 0, len(data))
+            return array
+        if type_name == "System.Int32":
+            return int(round(value))
+        if type_name == "System.Double":
+            return float(value)
+        return value
+
+    def create_template(self, request):
+        problems = request.unsupported_regions()
+        if problems:
+            raise ValueError(f"CreateTemplate 不支持: {'、'.join(problems)}")
+        method = self.load()
+        args = [self._marshal(v, t) for v, t in zip(request.invoke_args(), self._param_types)]
+        start = time.time()
+        method.Invoke(None, args)
+        return collect_artifacts(request.output_prefix, start)
+
+
+class OpenCVTemplateEngine(TemplateEngine):
+    """
+    纯 OpenCV/NumPy 替代引擎，用于没有 .NET/HALCON 的环境 (如 Linux)。
+    输出 <prefix>_model.npz (多分辨率模板 + 掩码 + 参数) 和 <prefix>_template.png。
+    """
+    name = "opencv"
+
+    def __init__(self, num_levels=4):
+        self.num_levels = num_levels
+
+    def cache_params(self):
+        return {"num_levels": self.num_levels}
+
+    def create_template(self, request):
+        import cv2
+
+        img = cv2.imread(request.image_path, cv2.IMREAD_GRAYSCALE)
+        if img is None:
+            raise RuntimeError(f"无法加载图片：{request.image_path}")
+
+        # 全部模板区域的并集减去排除区域，只在模板区域外接矩形内栅格化
+        regions = request.regions()
+        x, y, w, h = regions.union_bbox(regions.indices(role=INCLUDE))
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + w, img.shape[1]), min(y + h, img.shape[0])
+        if x1 <= x0 or y1 <= y0:
+            raise ValueError("多边形位于图像范围之外")
+
+        template = img[y0:y1, x0:x1].copy()
+        mask = regions.combined_mask((x0, y0, x1 - x0, y1 - y0))[2]
+
+        arrays = {}
+        level_img, level_mask = template, mask
+        for level in range(self.num_levels):
+            arrays[f"level{level}_image"] = level_img
+            arrays[f"level{level}_mask"] = level_mask
+            if min(level_img.shape) < 16:
+                break
+            level_img = cv2.pyrDown(level_img)
+            level_mask = cv2.resize(level_mask, (level_img.shape[1], level_img.shape[0]),
+                                    interpolation=cv2.INTER_NEAREST)
+
+        # 不写入图像路径：结果按内容缓存 (template_cache)，路径不同的相同请求共用模型文件
+        meta = {
+            "origin": [x0, y0],
+            "levels": len(arrays) // 2,
+            "circle": [request.circle_row, request.circle_col],
+            "radius": [request.radius_min, request.radius_max],
+            "contour1": [request.contour1X.tolist(), request.contour1Y.tolist()],
+            "contour2": [request.contour2X.tolist(), request.contour2Y.tolist()],
+            "regions": regions.to_list(),
+        }
+        out_dir = os.path.dirname(request.output_prefix)
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+        model_path = request.output_prefix + "_model.npz"
+        preview_path = request.output_prefix + "_template.png"
+        np.savez_compressed(model_path, meta=np.array(json.dumps(meta)), **arrays)
+        cv2.imwrite(preview_path, cv2.bitwise_and(template, template, mask=mask))
+        return [model_path, preview_path]
+
+
+def collect_artifacts(output_prefix, since):
+    """收集以 output_prefix 开头、在 since 之后写入的文件"""
+    return sorted(p for p in glob.glob(glob.escape(output_prefix) + "*")
+                  if os.path.isfile(p) and os.path.getmtime(p) >= since - 1)
+
+
+# —— 三、后端注册 (值可以是类，也可以是延迟导入的 "module:Class")
+ENGINES = {
+    DotNetTemplateEngine.name: DotNetTemplateEngine,
+    OpenCVTemplateEngine.name: OpenCVTemplateEngine,
+    "remote": "engine_service:RemoteTemplateEngine",
+}
+
+
+def _import_engine(spec):
+    module_name, cls_name = spec.split(":", 1)
+    return getattr(importlib.import_module(module_name), cls_name)
+
+
+def config_kwargs(name, config):
+    """AppConfig (halcon_config.json / 环境变量) 中与引擎 name 相关的构造参数"""
+    if name == DotNetTemplateEngine.name:
+        return {"halcon_dll": config.halcon_dotnet, "engine_dll": config.engine_dll,
+                "halcon_root": config.halcon_root}
+    if name == "remote" and config.service_address:
+        return {"address": config.service_address}
+    return {}
+
+
+def create_engine(name="auto", config=None, **kwargs):
+    """
+    按名称创建引擎:
+      "auto"          —— .NET 引擎可用时使用 .NET，否则使用 OpenCV 替代引擎
+      "dotnet"/"opencv"
+      "remote"        —— 常驻引擎服务 (engine_service.py)
+      "pkg.module:Class" —— 自定义后端
+    config 为 app_config.AppConfig 时由它补充 DLL 路径与服务地址，kwargs 优先。
+    """
+    if name == "auto":
+        paths = {**(config_kwargs(DotNetTemplateEngine.name, config) if config else {}), **kwargs}
+        usable = DotNetTemplateEngine.available(paths.get("halcon_dll", DEFAULT_HALCON_DOTNET),
+                                               paths.get("engine_dll", DEFAULT_ENGINE_DLL))
+        name = "dotnet" if usable else "opencv"
+    cls = ENGINES.get(name, name)
+    if isinstance(cls, str):
+        if ":" not in cls:
+            raise ValueError(f"未知的模板引擎: {name}")
+        cls = _import_engine(cls)
+    if config is not None:
+        kwargs = {**config_kwargs(name, config), **kwargs}
+    return cls(**kwargs)
@@ -0,0 +1,317 @@
+# -*- coding: utf-8 -*-
+"""
+模板验证：在样本图像上试运行模板匹配，部署前发现匹配不稳定或速度不足的模板。
+
+匹配器与模板引擎无关：由源图像与区域 (模板区域并集减去排除区域) 构建，
+也可以直接读取 OpenCV 引擎生成的 *_model.npz。匹配方法为带掩码的归一化互相关
+(TM_CCOEFF_NORMED)，图像金字塔由粗到精:
+  - 最顶层整幅搜索，取若干个局部极大值作为候选
+  - 逐层放大到下一层，只在候选位置附近的小窗口内重新匹配
+  - 最底层对得分沿 x / y 做抛物线拟合得到亚像素位置
+报告每幅样本的得分、位置与耗时，以及耗时分位数 (p50 / p95 / p99)。
+
+    python template_verify.py samples/ --model out/a_model.npz --min-score 0.7 --max-ms 50
+    python template_verify.py samples/ --image a.png --regions regions.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+from app_config import lazy_import
+from geometry import GeometryStore, INCLUDE
+from image_io import list_images
+
+# 延迟导入：首次使用时才加载 OpenCV / NumPy
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+
+# 金字塔顶层模板的最短边不小于该值
+MIN_TEMPLATE_SIDE = 16
+# 顶层得分阈值相对于 min_score 的比例 (缩小后的得分偏低)
+COARSE_RATIO = 0.8
+# 逐层细化时在候选位置周围搜索的半径 (像素)
+REFINE_RADIUS = 2
+
+
+def _gray(img):
+    return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+
+
+def _scores(image, template, mask):
+    """带掩码的 NCC 得分图 (mask 为 None 时不用掩码)；平坦区域的无效值记为 -1"""
+    res = cv2.matchTemplate(image, template, cv2.TM_CCOEFF_NORMED, mask=mask)
+    return np.nan_to_num(res, nan=-1.0, posinf=-1.0, neginf=-1.0)
+
+
+def _peaks(res, threshold, count):
+    """得分图中不低于 threshold 的局部极大值，按得分从高到低取 count 个，返回 [(x, y), ...]"""
+    local_max = res >= cv2.dilate(res, np.ones((3, 3), np.uint8))
+    ys, xs = np.nonzero(local_max & (res >= threshold))
+    order = np.argsort(res[ys, xs])[::-1][:count]
+    return list(zip(xs[order].tolist(), ys[order].tolist()))
+
+
+def _subpixel(res, x, y):
+    """在 (x, y) 的 3x3 邻域内分别沿 x / y 做抛物线拟合"""
+    h, w = res.shape
+    dx = dy = 0.0
+    if 0 < x < w - 1:
+        l, c, r = res[y, x - 1], res[y, x], res[y, x + 1]
+        denom = l - 2 * c + r
+        if denom < 0:
+            dx = float(np.clip(0.5 * (l - r) / denom, -0.5, 0.5))
+    if 0 < y < h - 1:
+        t, c, b = res[y - 1, x], res[y, x], res[y + 1, x]
+        denom = t - 2 * c + b
+        if denom < 0:
+            dy = float(np.clip(0.5 * (t - b) / denom, -0.5, 0.5))
+    return x + dx, y + dy
+
+
+class TemplateMatcher:
+    """
+    平移不变的模板匹配器。origin 为模板左上角在源图像中的位置，
+    match() 返回的 dx / dy 即样本中的目标相对源图像的偏移。
+    """
+
+    def __init__(self, template, mask=None, origin=(0, 0), max_levels=6):
+        template = _gray(template)
+        if mask is None:
+            mask = np.full(template.shape, 255, np.uint8)
+        self.origin = tuple(int(v) for v in origin)
+        self.levels = [(template, mask)]
+        while len(self.levels) < max_levels:
+            t, m = self.levels[-1]
+            if min(t.shape) < 2 * MIN_TEMPLATE_SIDE or not m.any():
+                break
+            t = cv2.pyrDown(t)
+            m = cv2.resize(m, (t.shape[1], t.shape[0]), interpolation=cv2.INTER_NEAREST)
+            self.levels.append((t, m))
+        # 全部有效的掩码不传给 matchTemplate (带掩码的匹配慢得多)
+        self.levels = [(t, None if m.all() else m) for t, m in self.levels]
+
+    @property
+    def size(self):
+        h, w = self.levels[0][0].shape
+        return w, h
+
+    @classmethod
+    def from_geometry(cls, image, geometry, **kwargs):
+        """由源图像与区域集合构建：模板区域的外接矩形内，模板区域并集减去排除区域"""
+        x, y, w, h = geometry.union_bbox(geometry.indices(role=INCLUDE))
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + w, image.shape[1]), min(y + h, image.shape[0])
+        if x1 <= x0 or y1 <= y0:
+            raise ValueError("模板区域位于图像范围之外")
+        mask = geometry.combined_mask((x0, y0, x1 - x0, y1 - y0))[2]
+        return cls(image[y0:y1, x0:x1], mask, (x0, y0), **kwargs)
+
+    @classmethod
+    def from_request(cls, request, **kwargs):
+        """由模板请求 (源图像路径 + 区域) 构建，与生成模板使用的引擎无关"""
+        image = cv2.imread(request.image_path, cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            raise RuntimeError(f"无法加载图片：{request.image_path}")
+        return cls.from_geometry(image, request.regions(), **kwargs)
+
+    @classmethod
+    def from_model(cls, path, **kwargs):
+        """读取 OpenCV 引擎生成的 *_model.npz"""
+        with np.load(path) as model:
+            meta = json.loads(str(model["meta"]))
+            return cls(model["level0_image"], model["level0_mask"], meta["origin"], **kwargs)
+
+    def match(self, image, min_score=0.5, candidates=5):
+        """
+        在 image 中查找模板，返回 {"score", "x", "y", "dx", "dy"} (x / y 为模板左上角)；
+        得分低于 min_score 时 score 仍然返回，便于统计。
+        """
+        image = _gray(image)
+        pyramid = [image]
+        for _ in range(len(self.levels) - 1):
+            pyramid.append(cv2.pyrDown(pyramid[-1]))
+
+        # 顶层整幅搜索 (图像比模板还小的层跳过)
+        top = len(self.levels) - 1
+        while top > 0 and any(a < b for a, b in zip(pyramid[top].shape, self.levels[top][0].shape)):
+            top -= 1
+        tmpl, mask = self.levels[top]
+        if any(a < b for a, b in zip(pyramid[top].shape, tmpl.shape)):
+            return None
+        res = _scores(pyramid[top], tmpl, mask)
+        found = _peaks(res, min_score * COARSE_RATIO, candidates) or _peaks(res, -1.0, 1)
+
+        best = None
+        for x, y in found:
+            # 逐层细化：level 层的位置乘 2 即下一层的初始位置
+            local, ox, oy, lx, ly = res, 0, 0, x, y
+            for level in range(top - 1, -1, -1):
+                refined = self._refine(pyramid[level], level, 2 * (ox + lx), 2 * (oy + ly))
+                if refined is None:
+                    break
+                local, ox, oy, lx, ly = refined
+            else:
+                score = float(local[ly, lx])
+                if best is None or score > best["score"]:
+                    sx, sy = _subpixel(local, lx, ly)
+                    best = {"score": score, "x": ox + sx, "y": oy + sy}
+        if best is None:
+            return None
+        best["dx"] = best["x"] - self.origin[0]
+        best["dy"] = best["y"] - self.origin[1]
+        return best
+
+    def _refine(self, image, level, x, y, max_steps=3):
+        """
+        在 (x, y) 附近 REFINE_RADIUS 范围内匹配第 level 层模板；最大值落在窗口边上时
+        以它为中心重新搜索。返回 (局部得分图, 窗口 x0, 窗口 y0, 局部 x, 局部 y)，越界时返回 None。
+        """
+        tmpl, mask = self.levels[level]
+        th, tw = tmpl.shape
+        r = REFINE_RADIUS
+        for _ in range(max_steps):
+            x0, y0 = max(0, x - r), max(0, y - r)
+            x1, y1 = min(image.shape[1] - tw, x + r), min(image.shape[0] - th, y + r)
+            if x1 < x0 or y1 < y0:
+                return None
+            local = _scores(image[y0:y1 + th, x0:x1 + tw], tmpl, mask)
+            ly, lx = np.unravel_index(int(np.argmax(local)), local.shape)
+            nx, ny = x0 + int(lx), y0 + int(ly)
+            on_edge = (lx == 0 and x0 > 0) or (ly == 0 and y0 > 0) or \
+                      (lx == local.shape[1] - 1 and x1 < image.shape[1] - tw) or \
+                      (ly == local.shape[0] - 1 and y1 < image.shape[0] - th)
+            if not on_edge or (nx, ny) == (x, y):
+                break
+            x, y = nx, ny
+        return local, x0, y0, int(lx), int(ly)
+
+
+def percentiles(values, qs=(50, 95, 99)):
+    """{"p50": ..., "p95": ..., "p99": ...}；values 为空时全部为 0"""
+    if not len(values):
+        return {f"p{q}": 0.0 for q in qs}
+    return {f"p{q}": float(v) for q, v in zip(qs, np.percentile(values, qs))}
+
+
+def verify(matcher, paths, min_score=0.7, max_ms=None, min_rate=1.0, on_result=None):
+    """
+    在样本图像上逐幅匹配，返回 {"summary": 汇总, "results": 逐幅结果}。
+    得分不低于 min_score 的样本比例不低于 min_rate，且 (给出 max_ms 时) 匹配耗时 p95
+    不超过 max_ms 才算通过。耗时只统计匹配本身，不含读取图像；第一次匹配作为预热不计入。
+    """
+    results = []
+    warmed = False
+    for path in paths:
+        result = {"image": path}
+        start = time.perf_counter()
+        img = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        result["load_ms"] = (time.perf_counter() - start) * 1e3
+        if img is None:
+            result.update(ok=False, error="无法加载图片")
+        else:
+            if not warmed:
+                matcher.match(img, min_score)
+                warmed = True
+            start = time.perf_counter()
+            found = matcher.match(img, min_score)
+            result["match_ms"] = (time.perf_counter() - start) * 1e3
+            if found is None:
+                result.update(ok=False, error="样本小于模板", score=-1.0)
+            else:
+                result.update(found)
+                result["ok"] = found["score"] >= min_score
+        results.append(result)
+        if on_result:
+            on_result(result)
+    return {"summary": summarize(results, min_score, max_ms, min_rate), "results": results}
+
+
+def summarize(results, min_score, max_ms=None, min_rate=1.0):
+    times = [r["match_ms"] for r in results if "match_ms" in r]
+    scores = [r["score"] for r in results if "score" in r]
+    matched = sum(1 for r in results if r["ok"])
+    rate = matched / len(results) if results else 0.0
+    latency = percentiles(times)
+    latency["max"] = max(times) if times else 0.0
+    reasons = []
+    if not results:
+        reasons.append("没有样本图像")
+    elif rate < min_rate:
+        reasons.append(f"匹配率 {rate:.0%} 低于要求 {min_rate:.0%} (得分阈值 {min_score:g})")
+    if max_ms is not None and latency["p95"] > max_ms:
+        reasons.append(f"p95 耗时 {latency['p95']:.1f} ms 超过上限 {max_ms:g} ms")
+    return {
+        "images": len(results),
+        "matched": matched,
+        "match_rate": rate,
+        "score_min": min(scores) if scores else 0.0,
+        "score_mean": float(np.mean(scores)) if scores else 0.0,
+        "latency_ms": latency,
+        "images_per_second": 1e3 / np.mean(times) if times else 0.0,
+        "passed": not reasons,
+        "reasons": reasons,
+    }
+
+
+def format_summary(summary):
+    """多行文字汇总 (命令行与界面共用)"""
+    lat = summary["latency_ms"]
+    lines = [
+        f"样本 {summary['images']} 幅，匹配 {summary['matched']} 幅 ({summary['match_rate']:.0%})",
+        f"得分: 最低 {summary['score_min']:.3f}  平均 {summary['score_mean']:.3f}",
+        f"耗时: p50 {lat['p50']:.1f} ms  p95 {lat['p95']:.1f} ms  p99 {lat['p99']:.1f} ms  "
+        f"最大 {lat['max']:.1f} ms  ({summary['images_per_second']:.1f} 幅/秒)",
+        "结果: 通过" if summary["passed"] else "结果: 未通过 —— " + "；".join(summary["reasons"]),
+    ]
+    return "\n".join(lines)
+
+
+def sample_paths(source):
+    """样本文件夹中的图像，或单个图像文件"""
+    return list_images(source) if os.path.isdir(source) else [source]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="在样本图像上验证模板")
+    parser.add_argument("samples", help="样本图像文件夹 (或单个图像)")
+    parser.add_argument("--model", help="OpenCV 引擎生成的 *_model.npz")
+    parser.add_argument("--image", help="制作模板的源图像 (与 --regions 一起使用)")
+    parser.add_argument("--regions", help="区域 JSON 文件 (GeometryStore.to_list 格式)")
+    parser.add_argument("--min-score", type=float, default=0.7)
+    parser.add_argument("--min-rate", type=float, default=1.0, help="要求的匹配率 (0~1)")
+    parser.add_argument("--max-ms", type=float, help="匹配耗时 p95 上限 (毫秒)")
+    parser.add_argument("--report", help="把逐幅结果与汇总写入 JSON 文件")
+    args = parser.parse_args(argv)
+
+    if args.model:
+        matcher = TemplateMatcher.from_model(args.model)
+    elif args.image and args.regions:
+        with open(args.regions, 'r', encoding='utf-8') as f:
+            geometry = GeometryStore.from_list(json.load(f))
+        image = cv2.imread(args.image, cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            parser.error(f"无法加载图片：{args.image}")
+        matcher = TemplateMatcher.from_geometry(image, geometry)
+    else:
+        parser.error("需要 --model，或同时给出 --image 与 --regions")
+
+    def on_result(r):
+        if "error" in r:
+            print(f"[FAIL] {r['image']}  -> {r['error']}", flush=True)
+            return
+        status = "OK  " if r["ok"] else "WEAK"
+        print(f"[{status}] {r['match_ms']:7.1f} ms  得分 {r['score']:.3f}  "
+              f"位置 ({r['x']:.2f}, {r['y']:.2f})  {r['image']}", flush=True)
+
+    report = verify(matcher, sample_paths(args.samples), args.min_score, args.max_ms, args.min_rate, on_result)
+    print(format_summary(report["summary"]))
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0 if report["summary"]["passed"] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())